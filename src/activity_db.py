@@ -0,0 +1,169 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Path to the activities database (relative paths resolve against the working directory)
+DB_PATH = os.getenv('ACTIVITIES_DB_PATH', 'activities.db')
+
+# Pragmas applied once to every pooled connection
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=134217728',
+)
+
+
+class ConnectionPool:
+    """Thread-safe pool of long-lived SQLite connections to a single database file.
+
+    Connections are opened lazily up to ``size`` and handed out exclusively, so a
+    connection is never used by two threads at once. Each connection keeps its own
+    prepared-statement cache, which survives across Streamlit reruns because the
+    pool lives at module level. A thread that already holds a connection gets the
+    same one back when it asks again, so helpers can call each other freely.
+    """
+
+    def __init__(self, path, size=4, cached_statements=256):
+        self.path = path
+        self.size = size
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=5,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if not can_create:
+            return self._idle.get()
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the ``with`` block."""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection and commit on success or roll back on error.
+
+        A transaction opened inside another one on the same thread joins the
+        outer transaction instead of committing early.
+        """
+        with self.connection() as conn:
+            if getattr(self._local, 'in_transaction', False):
+                yield conn
+                return
+            self._local.in_transaction = True
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._local.in_transaction = False
+
+    def close(self):
+        """Close every idle connection in the pool."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=None):
+    """Return the process-wide pool for ``path`` (defaults to the activities database)."""
+    path = os.path.abspath(path or DB_PATH)
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
+
+
+def connection(path=None):
+    return get_pool(path).connection()
+
+
+def transaction(path=None):
+    return get_pool(path).transaction()
+
+
+def fetch_all(query, params=()):
+    with connection() as conn:
+        return conn.execute(query, params).fetchall()
+
+
+def fetch_one(query, params=()):
+    with connection() as conn:
+        return conn.execute(query, params).fetchone()
+
+
+def execute(query, params=()):
+    """Run a single write statement in its own transaction and return the cursor."""
+    with transaction() as conn:
+        return conn.execute(query, params)
+
+
+def executemany(query, seq_of_params):
+    with transaction() as conn:
+        return conn.executemany(query, seq_of_params)
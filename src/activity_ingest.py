@@ -0,0 +1,118 @@
+from activity_db import transaction
+from embeddings import activity_text, content_hash, get_embedding_client
+from vector_index import get_vector_store
+from vector_sync import acknowledge, record_content_hashes
+
+# Vectors sent per upsert request (Pinecone recommends batches of about 100)
+UPSERT_BATCH_SIZE = 100
+
+REQUIRED_FIELDS = ('title', 'type', 'description', 'supplies', 'instructions')
+
+INSERT_ACTIVITY = """
+INSERT INTO activities (title, type, description, supplies, instructions, to_do, source,
+                        development_age_group, development_group_justification, adaptations)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _field(activity, *keys, default=None):
+    for key in keys:
+        if key in activity:
+            return activity[key]
+    return default
+
+
+def _join(value, separator):
+    if isinstance(value, (list, tuple)):
+        return separator.join(str(item) for item in value)
+    return value or ''
+
+
+def activity_row(activity):
+    """Normalize a generated activity ("Activity Title", list supplies) or a parsed one ("title", plain text).
+
+    Raises ValueError when a required field is missing.
+    """
+    row = {
+        'title': _field(activity, 'Activity Title', 'title'),
+        'type': _field(activity, 'Type', 'type'),
+        'description': _field(activity, 'Description', 'description'),
+        'supplies': _field(activity, 'Supplies', 'supplies'),
+        'instructions': _field(activity, 'Instructions', 'instructions'),
+    }
+    missing = [field for field in REQUIRED_FIELDS if row[field] is None]
+    if missing:
+        raise ValueError(f"Activity is missing required fields: {', '.join(missing)}")
+    row['supplies'] = _join(row['supplies'], ', ')
+    row['instructions'] = _join(row['instructions'], '\n')
+    # Embed exactly what is stored so the outbox worker's content hash matches
+    row['text'] = activity_text(row['title'], row['description'], row['supplies'], row['instructions'])
+    row['development_age_group'] = _field(activity, 'Development Age Group', 'development_age_group',
+                                          default='Not specified')
+    row['development_group_justification'] = _field(
+        activity, 'Development Group Justification', 'development_group_justification', default='')
+    row['adaptations'] = _field(activity, 'Adaptations', 'adaptations', default='')
+    return row
+
+
+def ingest_rows(rows, vector_store=None, embedding_client=None, source="AI", to_do=True):
+    """Insert normalized rows, embed them and index them as one unit; returns the new ids in order.
+
+    Every text is embedded in one batched call before anything is written, so
+    an embedding failure leaves nothing behind. The rows are then inserted with
+    one executemany under a write lock and the vectors are upserted in chunks
+    of UPSERT_BATCH_SIZE before the transaction commits. If an upsert or the
+    commit fails, the vectors already upserted are deleted again and the
+    inserts roll back, so SQLite and the vector store never disagree. The
+    outbox entries the inserts queue are acknowledged in the same transaction.
+    """
+    if not rows:
+        return []
+    if vector_store is None:
+        vector_store = get_vector_store()
+    if embedding_client is None:
+        embedding_client = get_embedding_client()
+    embeddings = embedding_client.embed_many([row['text'] for row in rows])
+
+    upserted = []
+    try:
+        with transaction() as conn:
+            if not conn.in_transaction:
+                # Take the write lock now so the ids read below stay ours until commit
+                conn.execute('BEGIN IMMEDIATE')
+            last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM activities').fetchone()[0]
+            conn.executemany(INSERT_ACTIVITY, [
+                (row['title'], row['type'], row['description'], row['supplies'], row['instructions'], to_do,
+                 source, row['development_age_group'], row['development_group_justification'],
+                 row['adaptations'])
+                for row in rows
+            ])
+            # AUTOINCREMENT ids only grow, so everything past the old maximum is this batch, in insert order
+            ids = [row[0] for row in conn.execute(
+                'SELECT id FROM activities WHERE id > ? ORDER BY id', (last_id,))]
+            if len(ids) != len(rows):
+                raise RuntimeError(f"Expected {len(rows)} new activity ids, found {len(ids)}")
+
+            vectors = [
+                {"id": str(activity_id), "values": embedding, "metadata": {"type": row['type'], "to_do": to_do}}
+                for activity_id, row, embedding in zip(ids, rows, embeddings)
+            ]
+            with vector_store.batch():
+                for start in range(0, len(vectors), UPSERT_BATCH_SIZE):
+                    chunk = vectors[start:start + UPSERT_BATCH_SIZE]
+                    vector_store.upsert(chunk)
+                    upserted.extend(vector['id'] for vector in chunk)
+            acknowledge(conn, ids)
+            record_content_hashes(conn, [(activity_id, content_hash(row['text']))
+                                         for activity_id, row in zip(ids, rows)])
+    except BaseException:
+        if upserted:
+            vector_store.delete(upserted)
+        raise
+    return ids
+
+
+def ingest_activities(activities, vector_store=None, embedding_client=None, source="AI", to_do=True):
+    """Validate and ingest ``activities`` in one batch; raises ValueError before writing if any is invalid."""
+    rows = [activity_row(activity) for activity in activities]
+    return ingest_rows(rows, vector_store, embedding_client, source, to_do)
@@ -0,0 +1,104 @@
+import re
+
+from activity_db import fetch_all
+from embeddings import get_embedding_client
+from vector_index import get_vector_store, matches_filter
+
+# Columns indexed for keyword search and their BM25 weights: a hit in the title or supplies counts most
+FTS_COLUMNS = ('title', 'description', 'supplies', 'instructions')
+BM25_WEIGHTS = (10.0, 2.0, 5.0, 1.0)
+
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper
+RRF_K = 60
+
+SEARCH_MODES = ('hybrid', 'keyword', 'vector')
+
+
+def fts_query(text, match_all=True, columns=None):
+    """Turn free text into a safe FTS5 query: every word quoted, joined with AND (or OR), optionally column-scoped."""
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    query = (' AND ' if match_all else ' OR ').join(f'"{word}"' for word in words)
+    if columns:
+        query = f"{{{' '.join(columns)}}} : ({query})"
+    return query
+
+
+def keyword_search(text, top_k=20, match_all=True, columns=None, filter=None):
+    """Return [(id, type, bm25 score)] for ``text``, best first, without an embedding call.
+
+    ``top_k=None`` returns every match. ``filter`` is a Pinecone-style filter
+    on type and to_do, so keyword and vector results can be restricted the
+    same way.
+    """
+    query = fts_query(text, match_all, columns)
+    if query is None:
+        return []
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    rows = fetch_all(f'''
+        SELECT a.id, a.type, a.to_do, bm25(activities_fts, {weights}) AS score
+        FROM activities_fts JOIN activities a ON a.id = activities_fts.rowid
+        WHERE activities_fts MATCH ?
+        ORDER BY score
+        LIMIT ?
+    ''', (query, -1 if top_k is None or filter else top_k))
+    matches = [(id, type, -score) for id, type, to_do, score in rows
+               if matches_filter({'type': type, 'to_do': bool(to_do)}, filter)]
+    return matches[:top_k]
+
+
+def keyword_search_by_type(text, activity_types, top_k=4, match_all=False, filter=None):
+    """Return {type: [ids]} with the top_k BM25 matches of each type from one FTS query."""
+    groups = {activity_type: [] for activity_type in activity_types}
+    for id, activity_type, _ in keyword_search(text, top_k=None, match_all=match_all, filter=filter):
+        if activity_type in groups and len(groups[activity_type]) < top_k:
+            groups[activity_type].append(str(id))
+    return groups
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse several best-first id lists into one: each id scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, id in enumerate(ranking, start=1):
+            scores[id] = scores.get(id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda id: scores[id], reverse=True)
+
+
+def hybrid_search(text, top_k=20, filter=None, candidates=50):
+    """Return up to top_k activity ids ranked by fusing BM25 and vector similarity."""
+    keyword_ids = [str(id) for id, _, _ in keyword_search(text, candidates, match_all=False, filter=filter)]
+    embedding = get_embedding_client().embed(text)
+    vector_ids = [match['id'] for match in get_vector_store().query(embedding, top_k=candidates, filter=filter)]
+    return reciprocal_rank_fusion([keyword_ids, vector_ids])[:top_k]
+
+
+def get_activity_types():
+    """Distinct activity types present in the database, alphabetically."""
+    rows = fetch_all("SELECT DISTINCT type FROM activities WHERE type IS NOT NULL AND type != '' ORDER BY type")
+    return [row[0] for row in rows]
+
+
+def search_by_type(text, top_k=4, activity_types=None, filter=None, mode='vector'):
+    """Return {type: [activity ids]} with the best top_k matches per type.
+
+    ``mode`` is 'vector' (one embedding, one grouped vector query), 'keyword'
+    (one BM25 query, no embedding call) or 'hybrid' (both, fused per type with
+    reciprocal rank fusion over a deeper candidate list).
+    """
+    if activity_types is None:
+        activity_types = get_activity_types()
+    if mode == 'keyword':
+        return keyword_search_by_type(text, activity_types, top_k=top_k, filter=filter)
+    depth = top_k * 3 if mode == 'hybrid' else top_k
+    embedding = get_embedding_client().embed(text)
+    grouped = get_vector_store().query_by_group(embedding, 'type', activity_types, top_k=depth, filter=filter)
+    vector_groups = {activity_type: [match['id'] for match in matches] for activity_type, matches in grouped.items()}
+    if mode != 'hybrid':
+        return vector_groups
+    keyword_groups = keyword_search_by_type(text, activity_types, top_k=depth, filter=filter)
+    return {
+        activity_type: reciprocal_rank_fusion([keyword_groups[activity_type], vector_groups[activity_type]])[:top_k]
+        for activity_type in activity_types
+    }
@@ -0,0 +1,2 @@
+# HTTP status codes worth retrying, for the embedding client and the LLM engine alike
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
@@ -0,0 +1,275 @@
+import os
+import re
+import zlib
+from itertools import combinations
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+SIMILARITY_THRESHOLD = 0.8
+
+# Rows x columns compared per matrix multiply; 2048 x 8192 float32 scores is 64 MB
+ROW_BLOCK_SIZE = 2048
+COLUMN_BLOCK_SIZE = 8192
+
+# Above this many vectors switch to approximate nearest-neighbour search (when hnswlib is installed)
+DEDUP_ANN_THRESHOLD = int(os.getenv('DEDUP_ANN_THRESHOLD', '50000'))
+ANN_NEIGHBOURS = 50
+
+# MinHash signatures of 128 values split into 32 LSH bands of 4 rows: pairs
+# with Jaccard similarity around 0.4 and above become candidates
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 32
+MAX_BUCKET_SIZE = 50
+_MINHASH_PRIME = (1 << 31) - 1
+
+# Weights of the per-field lexical similarities
+FIELD_WEIGHTS = {'title': 0.5, 'description': 0.3, 'supplies': 0.2}
+
+
+def normalize_texts(nlp, texts, batch_size=1000):
+    """Lowercase and strip punctuation with spaCy's tokenizer, batched with pipe()."""
+    return [
+        " ".join(token.text.lower() for token in doc if not token.is_punct)
+        for doc in nlp.tokenizer.pipe((text or '' for text in texts), batch_size=batch_size)
+    ]
+
+
+def text_vectors(nlp, texts, batch_size=1000):
+    """Stack the spaCy document vectors of ``texts`` into one float32 matrix.
+
+    Only the tokenizer runs: document vectors come from the static word vectors,
+    so the tagger, parser and NER are not needed. Texts without vectors get a
+    zero row, which never matches anything.
+    """
+    vectors = np.zeros((len(texts), nlp.vocab.vectors_length), dtype=np.float32)
+    for row, doc in enumerate(nlp.tokenizer.pipe(texts, batch_size=batch_size)):
+        if doc.vector_norm > 0:
+            vectors[row] = doc.vector
+    return vectors
+
+
+def normalize_rows(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def find_similar_pairs(ids, vectors, threshold=SIMILARITY_THRESHOLD, ann_threshold=DEDUP_ANN_THRESHOLD,
+                       row_block_size=ROW_BLOCK_SIZE, column_block_size=COLUMN_BLOCK_SIZE, progress=None):
+    """Return [(id1, id2, similarity)] for every pair whose cosine similarity is at least ``threshold``.
+
+    id1 comes before id2 in ``ids``. Small corpora are compared exactly with
+    blocked matrix multiplies; past ``ann_threshold`` vectors each row is only
+    compared with its nearest neighbours from an HNSW index. ``progress`` is
+    called with (rows done, total rows).
+    """
+    matrix = normalize_rows(vectors)
+    if hnswlib is not None and len(matrix) >= ann_threshold:
+        rows1, rows2, scores = _approximate_pairs(matrix, threshold, progress)
+    else:
+        rows1, rows2, scores = _exact_pairs(matrix, threshold, row_block_size, column_block_size, progress)
+    order = np.lexsort((rows2, rows1))
+    return [(ids[row1], ids[row2], float(score))
+            for row1, row2, score in zip(rows1[order], rows2[order], scores[order])]
+
+
+def find_similar_pairs_for(query_ids, ids, vectors, threshold=SIMILARITY_THRESHOLD,
+                           row_block_size=ROW_BLOCK_SIZE, column_block_size=COLUMN_BLOCK_SIZE, progress=None):
+    """Like find_similar_pairs, but only pairs involving at least one of ``query_ids``.
+
+    Each query row is compared against every row, so the cost grows with the
+    number of changed activities rather than with the square of the corpus.
+    """
+    matrix = normalize_rows(vectors)
+    positions = {activity_id: row for row, activity_id in enumerate(ids)}
+    query_rows = np.array(sorted(positions[activity_id] for activity_id in query_ids if activity_id in positions),
+                          dtype=np.int64)
+    is_query = np.zeros(len(ids), dtype=bool)
+    is_query[query_rows] = True
+    found_rows1, found_rows2, found_scores = [], [], []
+    for block_start in range(0, len(query_rows), row_block_size):
+        block_rows = query_rows[block_start:block_start + row_block_size]
+        block = matrix[block_rows]
+        for column_start in range(0, len(ids), column_block_size):
+            column_end = min(column_start + column_block_size, len(ids))
+            scores = block @ matrix[column_start:column_end].T
+            rows, columns = np.nonzero(scores >= threshold)
+            rows1 = block_rows[rows]
+            rows2 = columns + column_start
+            # Pairs of two query rows are found from both sides; keep one
+            keep = (rows1 != rows2) & (~is_query[rows2] | (rows1 < rows2))
+            found_rows1.append(np.minimum(rows1, rows2)[keep])
+            found_rows2.append(np.maximum(rows1, rows2)[keep])
+            found_scores.append(scores[rows[keep], columns[keep]])
+        if progress:
+            progress(min(block_start + row_block_size, len(query_rows)), len(query_rows))
+    rows1, rows2, scores = _concatenate(found_rows1, found_rows2, found_scores)
+    order = np.lexsort((rows2, rows1))
+    return [(ids[row1], ids[row2], float(score))
+            for row1, row2, score in zip(rows1[order], rows2[order], scores[order])]
+
+
+def _exact_pairs(matrix, threshold, row_block_size, column_block_size, progress):
+    count = len(matrix)
+    found_rows1, found_rows2, found_scores = [], [], []
+    for row_start in range(0, count, row_block_size):
+        row_end = min(row_start + row_block_size, count)
+        block = matrix[row_start:row_end]
+        # Only the upper triangle is needed, so columns start at this block
+        for column_start in range(row_start, count, column_block_size):
+            column_end = min(column_start + column_block_size, count)
+            scores = block @ matrix[column_start:column_end].T
+            rows, columns = np.nonzero(scores >= threshold)
+            rows1 = rows + row_start
+            rows2 = columns + column_start
+            upper = rows1 < rows2
+            found_rows1.append(rows1[upper])
+            found_rows2.append(rows2[upper])
+            found_scores.append(scores[rows[upper], columns[upper]])
+        if progress:
+            progress(row_end, count)
+    return _concatenate(found_rows1, found_rows2, found_scores)
+
+
+def _approximate_pairs(matrix, threshold, progress):
+    count, dimension = matrix.shape
+    index = hnswlib.Index(space='ip', dim=dimension)
+    index.init_index(max_elements=count, ef_construction=200, M=16)
+    index.add_items(matrix, np.arange(count))
+    neighbours = min(ANN_NEIGHBOURS + 1, count)
+    index.set_ef(max(neighbours, 128))
+    found_rows1, found_rows2, found_scores = [], [], []
+    for row_start in range(0, count, ROW_BLOCK_SIZE):
+        row_end = min(row_start + ROW_BLOCK_SIZE, count)
+        labels, distances = index.knn_query(matrix[row_start:row_end], k=neighbours)
+        # hnswlib reports inner-product distance as 1 - similarity
+        scores = 1.0 - distances
+        rows1 = np.repeat(np.arange(row_start, row_end), neighbours)
+        rows2 = labels.ravel().astype(np.int64)
+        scores = scores.ravel()
+        keep = (scores >= threshold) & (rows1 < rows2)
+        found_rows1.append(rows1[keep])
+        found_rows2.append(rows2[keep])
+        found_scores.append(scores[keep])
+        if progress:
+            progress(row_end, count)
+    return _concatenate(found_rows1, found_rows2, found_scores)
+
+
+def _concatenate(rows1, rows2, scores):
+    if not rows1:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return np.concatenate(rows1), np.concatenate(rows2), np.concatenate(scores)
+
+
+def related_ids_by_activity(pairs):
+    """Group pairs into {id1: "id2,id3,..."} for the related_ids column."""
+    related = {}
+    for id1, id2, _ in pairs:
+        related.setdefault(id1, []).append(str(id2))
+    return {activity_id: ",".join(duplicates) for activity_id, duplicates in related.items()}
+
+
+def merge_related_ids(existing, changed_ids, new_pairs):
+    """Update {id1: "id2,..."} after re-comparing ``changed_ids`` against everything.
+
+    Relations that involve a changed activity are dropped and replaced by
+    ``new_pairs``; all other relations are kept, except those pointing at ids
+    that are no longer in ``existing`` (deleted activities never show up as
+    changed). Returns only the entries that differ from ``existing`` (an empty
+    string clears the column).
+    """
+    changed = {str(activity_id) for activity_id in changed_ids}
+    remaining = {str(activity_id) for activity_id in existing}
+    merged = {}
+    for activity_id, related in existing.items():
+        if str(activity_id) in changed:
+            merged[activity_id] = []
+        else:
+            merged[activity_id] = [dup_id for dup_id in (related or '').split(',')
+                                   if dup_id in remaining and dup_id not in changed]
+    for id1, id2, _ in new_pairs:
+        merged.setdefault(id1, []).append(str(id2))
+    updates = {}
+    for activity_id, duplicates in merged.items():
+        value = ",".join(dict.fromkeys(duplicates))
+        if value != (existing.get(activity_id) or ''):
+            updates[activity_id] = value
+    return updates
+
+
+def words(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def shingles(text, size=2):
+    """Set of overlapping word n-grams; short texts fall back to their words."""
+    tokens = words(text)
+    if len(tokens) < size:
+        return set(tokens)
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def supply_items(supplies):
+    """Set of normalized supply names from a comma, semicolon or newline separated list."""
+    return {' '.join(words(item)) for item in re.split(r'[,;\n]', supplies or '') if words(item)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures over sets of strings using universal hashing."""
+
+    def __init__(self, num_perm=MINHASH_PERMUTATIONS, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _MINHASH_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MINHASH_PRIME, num_perm, dtype=np.uint64)
+
+    def signature(self, tokens):
+        if not tokens:
+            return np.full(self.num_perm, _MINHASH_PRIME, dtype=np.uint64)
+        hashes = np.fromiter((zlib.crc32(token.encode('utf-8')) % _MINHASH_PRIME for token in tokens),
+                             dtype=np.uint64, count=len(tokens))
+        return ((np.outer(hashes, self.a) + self.b) % _MINHASH_PRIME).min(axis=0)
+
+
+def lsh_candidates(signatures, bands=LSH_BANDS, max_bucket_size=MAX_BUCKET_SIZE):
+    """Return the set of (row1, row2) pairs sharing at least one LSH band.
+
+    Buckets larger than ``max_bucket_size`` (boilerplate shared by many rows)
+    are skipped so a single common phrase cannot bring back the O(n^2) blowup.
+    """
+    signatures = np.asarray(signatures)
+    rows_per_band = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = {}
+        band_values = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        for row, values in enumerate(band_values):
+            if values[0] == _MINHASH_PRIME:
+                continue
+            buckets.setdefault(values.tobytes(), []).append(row)
+        for rows in buckets.values():
+            if 1 < len(rows) <= max_bucket_size:
+                pairs.update(combinations(rows, 2))
+    return pairs
+
+
+def field_similarity(activity1, activity2):
+    """Weighted lexical similarity over title, description and supplies."""
+    return (
+        FIELD_WEIGHTS['title'] * jaccard(set(words(activity1['title'])), set(words(activity2['title'])))
+        + FIELD_WEIGHTS['description'] * jaccard(shingles(activity1['description']), shingles(activity2['description']))
+        + FIELD_WEIGHTS['supplies'] * jaccard(supply_items(activity1['supplies']), supply_items(activity2['supplies']))
+    )
@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+
+from activity_db import execute, fetch_all, fetch_one, transaction
+from embeddings import content_hash
+
+# Vectors for the title-based spaCy dedup, shared by find_duplicates.py and dedupe_sqlite_python.py
+SPACY_TITLE_KIND = 'spacy_title'
+
+
+def current_change_seq():
+    return fetch_one('SELECT COALESCE(MAX(change_seq), 0) FROM activity_changes')[0]
+
+
+def get_watermark(consumer):
+    row = fetch_one('SELECT change_seq FROM dedup_watermarks WHERE consumer = ?', (consumer,))
+    return row[0] if row else 0
+
+
+def set_watermark(consumer, change_seq):
+    execute('INSERT OR REPLACE INTO dedup_watermarks (consumer, change_seq) VALUES (?, ?)', (consumer, change_seq))
+
+
+def dirty_activity_ids(consumer, kind, full=False):
+    """Ids changed since ``consumer`` last ran, plus any activity with no stored vector of ``kind``."""
+    if full:
+        return [row[0] for row in fetch_all('SELECT id FROM activities ORDER BY id')]
+    rows = fetch_all('''
+    SELECT a.id
+    FROM activities a
+    LEFT JOIN activity_changes c ON c.activity_id = a.id
+    LEFT JOIN activity_vectors v ON v.activity_id = a.id AND v.kind = ?
+    WHERE v.activity_id IS NULL OR c.change_seq > ?
+    ORDER BY a.id
+    ''', (kind, get_watermark(consumer)))
+    return [row[0] for row in rows]
+
+
+def stored_hashes(kind, activity_ids):
+    hashes = {}
+    for start in range(0, len(activity_ids), 500):
+        chunk = activity_ids[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        rows = fetch_all(f'''
+        SELECT activity_id, content_hash FROM activity_vectors
+        WHERE kind = ? AND activity_id IN ({placeholders})
+        ''', [kind] + list(chunk))
+        hashes.update(rows)
+    return hashes
+
+
+def store_vectors(kind, activity_ids, hashes, vectors):
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany('''
+        INSERT OR REPLACE INTO activity_vectors (activity_id, kind, content_hash, vector, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (activity_id, kind, text_hash, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for activity_id, text_hash, vector in zip(activity_ids, hashes, vectors)
+        ])
+
+
+def load_vectors(kind):
+    """Return (ids, matrix) with every stored vector of ``kind`` for activities that still exist."""
+    rows = fetch_all('''
+    SELECT v.activity_id, v.vector FROM activity_vectors v
+    JOIN activities a ON a.id = v.activity_id
+    WHERE v.kind = ?
+    ORDER BY v.activity_id
+    ''', (kind,))
+    ids = [row[0] for row in rows]
+    if not rows:
+        return ids, np.zeros((0, 0), dtype=np.float32)
+    return ids, np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+
+
+def refresh_vectors(kind, texts_by_id, vectorize):
+    """Store vectors for the texts whose hash changed; ``vectorize`` maps a list of texts to a matrix.
+
+    Edits that leave the text alone (or that another script already picked up)
+    reuse the stored vector. Returns the ids whose vectors were recomputed.
+    """
+    activity_ids = list(texts_by_id)
+    previous = stored_hashes(kind, activity_ids)
+    changed = [activity_id for activity_id in activity_ids
+               if previous.get(activity_id) != content_hash(texts_by_id[activity_id])]
+    if changed:
+        texts = [texts_by_id[activity_id] for activity_id in changed]
+        store_vectors(kind, changed, [content_hash(text) for text in texts], vectorize(texts))
+    return changed
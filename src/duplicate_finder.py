@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+from activity_db import fetch_all, transaction
+from dedup import (MinHasher, field_similarity, find_similar_pairs, lsh_candidates, normalize_rows, shingles,
+                   supply_items)
+from embeddings import activity_text, get_embedding_client
+from llm_cache import cached_completion
+
+# Pairs scoring at least DUPLICATE_SCORE are duplicates outright; pairs between
+# AMBIGUOUS_SCORE and DUPLICATE_SCORE are sent to the LLM; the rest are unique
+DUPLICATE_SCORE = 0.85
+AMBIGUOUS_SCORE = 0.55
+
+# Embedding blocking: pairs this close in embedding space are candidates even
+# when they share little wording
+EMBEDDING_BLOCK_THRESHOLD = 0.85
+
+ADJUDICATION_MODEL = os.getenv('DEDUP_LLM_MODEL', 'gpt-3.5-turbo')
+ADJUDICATION_BATCH_SIZE = 10
+
+
+def fetch_activities():
+    rows = fetch_all("SELECT id, title, description, supplies FROM activities ORDER BY id")
+    return [
+        {'id': row[0], 'title': row[1], 'description': row[2], 'supplies': row[3]}
+        for row in rows
+    ]
+
+
+def pair_hash(activity1, activity2):
+    """Hash of both activities' compared fields; a cached verdict is reused only while it matches."""
+    content = json.dumps([[activity[field] for field in ('title', 'description', 'supplies')]
+                          for activity in (activity1, activity2)])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def activity_vectors(activities):
+    """Embeddings of the activities (served from the embedding cache after the first run)."""
+    texts = [activity_text(activity['title'], activity['description'], activity['supplies'], '')
+             for activity in activities]
+    return get_embedding_client().embed_many(texts)
+
+
+def candidate_pairs(activities, vectors=None):
+    """Rows (i, j) worth scoring: MinHash/LSH over the text plus embedding neighbours."""
+    hasher = MinHasher()
+    signatures = [
+        hasher.signature(shingles(activity['title'], size=1) | shingles(activity['description'])
+                         | supply_items(activity['supplies']))
+        for activity in activities
+    ]
+    pairs = lsh_candidates(signatures)
+    if vectors is not None:
+        rows = list(range(len(activities)))
+        pairs.update((row1, row2) for row1, row2, _ in find_similar_pairs(rows, vectors, EMBEDDING_BLOCK_THRESHOLD))
+    return pairs
+
+
+def score_pairs(activities, pairs, vectors=None):
+    """Return [(row1, row2, lexical, vector, score)] combining field overlap with embedding similarity."""
+    if vectors is not None:
+        matrix = normalize_rows(vectors)
+    scored = []
+    for row1, row2 in sorted(pairs):
+        lexical = field_similarity(activities[row1], activities[row2])
+        if vectors is None:
+            vector, score = None, lexical
+        else:
+            vector = float(matrix[row1] @ matrix[row2])
+            score = (lexical + max(vector, 0.0)) / 2
+        scored.append((row1, row2, lexical, vector, score))
+    return scored
+
+
+class LLMAdjudicator:
+    """Ask a chat model whether pairs of activities are duplicates, several pairs per request."""
+
+    def __init__(self, client=None, model=ADJUDICATION_MODEL, batch_size=ADJUDICATION_BATCH_SIZE):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.client = client
+        self.model = model
+        self.batch_size = batch_size
+
+    def adjudicate(self, pairs):
+        """Return one verdict ('duplicate' or 'unique') per (activity1, activity2) pair."""
+        verdicts = []
+        for start in range(0, len(pairs), self.batch_size):
+            verdicts.extend(self._adjudicate_batch(pairs[start:start + self.batch_size]))
+        return verdicts
+
+    def _adjudicate_batch(self, pairs):
+        sections = []
+        for number, (activity1, activity2) in enumerate(pairs, start=1):
+            sections.append(f"""
+    Pair {number}:
+    Activity A: {activity1['title']} | {activity1['description']} | Supplies: {activity1['supplies']}
+    Activity B: {activity2['title']} | {activity2['description']} | Supplies: {activity2['supplies']}""")
+        prompt = f"""
+    For each numbered pair below, decide whether the two activities are duplicates
+    (the same activity, possibly worded differently) or unique.
+    {''.join(sections)}
+
+    Respond with only a JSON array of {len(pairs)} strings, "Duplicate" or "Unique", in pair order.
+    """
+        def call():
+            response = self.client.chat.completions.create(
+                model=self.model,
+                temperature=0,
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt},
+                ],
+            )
+            return response.choices[0].message.content
+
+        # An answer without one verdict per pair is not cached, so the next scan asks again
+        content = cached_completion(
+            "openai", self.model, prompt, call, temperature=0, system="You are a helpful assistant.",
+            validate=lambda answer: parse_verdicts(answer, len(pairs)) is not None).strip()
+        verdicts = parse_verdicts(content, len(pairs))
+        if verdicts is None:
+            print(f"Unexpected adjudication response, leaving {len(pairs)} pair(s) ambiguous: {content}")
+            return ['ambiguous'] * len(pairs)
+        return verdicts
+
+
+def parse_verdicts(content, count):
+    """The 'duplicate'/'unique' verdicts in an adjudication answer, or None unless it holds exactly ``count``."""
+    match = re.search(r'\[.*\]', content or '', re.DOTALL)
+    try:
+        answers = json.loads(match.group(0)) if match else None
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(answers, list) or len(answers) != count:
+        return None
+    return ['duplicate' if str(answer).strip().lower() == 'duplicate' else 'unique' for answer in answers]
+
+
+def find_duplicate_candidates(adjudicator=None, use_embeddings=True, progress=print):
+    """Run the staged pipeline over every activity and persist the results.
+
+    Candidates come from MinHash/LSH and embedding blocking, are scored on
+    title, description and supplies, and only the ambiguous band is sent to
+    ``adjudicator``. Verdicts from earlier runs are reused while both
+    activities are unchanged. Returns the number of pairs stored.
+    """
+    activities = fetch_activities()
+    progress(f"Loaded {len(activities)} activities")
+
+    vectors = activity_vectors(activities) if use_embeddings else None
+    pairs = candidate_pairs(activities, vectors)
+    progress(f"{len(pairs)} candidate pair(s) from blocking")
+
+    scored = [pair for pair in score_pairs(activities, pairs, vectors) if pair[4] >= AMBIGUOUS_SCORE]
+
+    cached = {
+        (row[0], row[1]): (row[2], row[3])
+        for row in fetch_all("SELECT id1, id2, pair_hash, verdict FROM duplicate_candidates WHERE verdict_source = 'llm'")
+    }
+    now = time.time()
+    results = []
+    to_adjudicate = []
+    for row1, row2, lexical, vector, score in scored:
+        activity1, activity2 = activities[row1], activities[row2]
+        content_hash = pair_hash(activity1, activity2)
+        result = [activity1['id'], activity2['id'], lexical, vector, score, 'duplicate', 'score', content_hash, now]
+        if score < DUPLICATE_SCORE:
+            previous = cached.get((activity1['id'], activity2['id']))
+            if previous and previous[0] == content_hash:
+                result[5:7] = [previous[1], 'llm']
+            else:
+                result[5:7] = ['ambiguous', 'score']
+                to_adjudicate.append(result)
+        results.append(result)
+
+    if to_adjudicate and adjudicator is not None:
+        progress(f"Asking the LLM about {len(to_adjudicate)} ambiguous pair(s)")
+        by_id = {activity['id']: activity for activity in activities}
+        verdicts = adjudicator.adjudicate([(by_id[result[0]], by_id[result[1]]) for result in to_adjudicate])
+        for result, verdict in zip(to_adjudicate, verdicts):
+            if verdict != 'ambiguous':
+                result[5:7] = [verdict, 'llm']
+
+    with transaction() as conn:
+        conn.execute("DELETE FROM duplicate_candidates")
+        conn.executemany('''
+        INSERT INTO duplicate_candidates (id1, id2, lexical_score, vector_score, score, verdict, verdict_source, pair_hash, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', results)
+    progress(f"Stored {len(results)} scored pair(s)")
+    return len(results)
+
+
+def load_duplicate_candidates(verdicts=('duplicate', 'ambiguous')):
+    """Persisted pairs with both activities' fields, highest score first."""
+    placeholders = ', '.join('?' for _ in verdicts)
+    rows = fetch_all(f'''
+    SELECT d.score, d.verdict, d.verdict_source,
+           a1.id, a1.title, a1.description, a1.supplies,
+           a2.id, a2.title, a2.description, a2.supplies
+    FROM duplicate_candidates d
+    JOIN activities a1 ON a1.id = d.id1
+    JOIN activities a2 ON a2.id = d.id2
+    WHERE d.verdict IN ({placeholders})
+    ORDER BY d.score DESC
+    ''', list(verdicts))
+    return [
+        {
+            'score': row[0], 'verdict': row[1], 'verdict_source': row[2],
+            'activity1': {'id': row[3], 'title': row[4], 'description': row[5], 'supplies': row[6]},
+            'activity2': {'id': row[7], 'title': row[8], 'description': row[9], 'supplies': row[10]},
+        }
+        for row in rows
+    ]
+
+
+def delete_activities(activity_ids):
+    with transaction() as conn:
+        params = [(activity_id,) for activity_id in activity_ids]
+        conn.executemany("DELETE FROM activities WHERE id = ?", params)
+        conn.executemany("DELETE FROM duplicate_candidates WHERE id1 = ? OR id2 = ?",
+                         [(activity_id, activity_id) for activity_id in activity_ids])
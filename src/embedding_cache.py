@@ -0,0 +1,107 @@
+import hashlib
+import os
+import time
+from array import array
+
+from activity_db import DB_PATH, get_pool
+
+# The cache lives in its own database next to activities.db
+EMBEDDING_CACHE_PATH = os.getenv(
+    'EMBEDDING_CACHE_PATH', os.path.join(os.path.dirname(DB_PATH), 'embedding_cache.db'))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '50000'))
+# A hit only rewrites last_used when it is older than this, so most lookups are reads that take no write lock
+EMBEDDING_CACHE_TOUCH_SECONDS = float(os.getenv('EMBEDDING_CACHE_TOUCH_SECONDS', '3600'))
+
+# SQLite limits the number of host parameters in a single statement
+LOOKUP_CHUNK_SIZE = 500
+
+
+def cache_key(model, text):
+    """Content address of an embedding: sha256 of the model name and the text."""
+    return hashlib.sha256(f"{model}\x00{text}".encode('utf-8')).hexdigest()
+
+
+def encode_vector(vector):
+    return array('f', vector).tobytes()
+
+
+def decode_vector(blob):
+    vector = array('f')
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """Persistent float32 embedding cache keyed by text hash and model, with LRU eviction."""
+
+    def __init__(self, path=None, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, touch_interval=EMBEDDING_CACHE_TOUCH_SECONDS):
+        self.pool = get_pool(path or EMBEDDING_CACHE_PATH)
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dimension INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache (last_used)')
+
+    def get_many(self, model, texts):
+        """Return {text: vector} for every text already cached for ``model``.
+
+        The lookup is a plain read. Only hits whose last_used is older than
+        ``touch_interval`` are refreshed, in one transaction afterwards.
+        """
+        keys = {cache_key(model, text): text for text in texts}
+        found = {}
+        stale = []
+        key_list = list(keys)
+        now = time.time()
+        with self.pool.connection() as conn:
+            for start in range(0, len(key_list), LOOKUP_CHUNK_SIZE):
+                chunk = key_list[start:start + LOOKUP_CHUNK_SIZE]
+                placeholders = ', '.join('?' for _ in chunk)
+                rows = conn.execute(
+                    f'SELECT key, vector, last_used FROM embedding_cache WHERE key IN ({placeholders})', chunk).fetchall()
+                for key, blob, last_used in rows:
+                    found[keys[key]] = decode_vector(blob)
+                    if last_used <= now - self.touch_interval:
+                        stale.append(key)
+        if stale:
+            with self.pool.transaction() as conn:
+                for start in range(0, len(stale), LOOKUP_CHUNK_SIZE):
+                    chunk = stale[start:start + LOOKUP_CHUNK_SIZE]
+                    placeholders = ', '.join('?' for _ in chunk)
+                    conn.execute(f'UPDATE embedding_cache SET last_used = ? WHERE key IN ({placeholders})',
+                                 [now] + chunk)
+        return found
+
+    def put_many(self, model, texts, vectors):
+        now = time.time()
+        rows = [
+            (cache_key(model, text), model, len(vector), encode_vector(vector), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self.pool.transaction() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO embedding_cache (key, model, dimension, vector, last_used)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            self._evict(conn)
+
+    def _evict(self, conn):
+        count = conn.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute('''
+                DELETE FROM embedding_cache WHERE key IN (
+                    SELECT key FROM embedding_cache ORDER BY last_used LIMIT ?
+                )
+            ''', (count - self.max_entries,))
+
+    def clear(self):
+        with self.pool.transaction() as conn:
+            conn.execute('DELETE FROM embedding_cache')
@@ -0,0 +1,217 @@
+import hashlib
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api_retry import RETRY_STATUS_CODES
+from embedding_cache import EmbeddingCache
+
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-large')
+EMBEDDING_DIMENSIONS = {
+    'text-embedding-3-large': 3072,
+    'text-embedding-3-small': 1536,
+    'text-embedding-ada-002': 1536,
+}
+
+# OpenAI limits: 8191 tokens per input and 300k tokens summed over one request.
+# We stay well under the request limit and cap the inputs per request so a
+# corpus is split into several batches that can be sent concurrently.
+MAX_TOKENS_PER_INPUT = 8191
+MAX_TOKENS_PER_REQUEST = 250000
+MAX_INPUTS_PER_REQUEST = 256
+
+
+def activity_text(title, description, supplies, instructions):
+    """Build the text embedded for an activity."""
+    return (
+        f"Title: {title}\n"
+        f"Description: {description}\n"
+        f"Supplies: {supplies}\n"
+        f"Instructions: {instructions}"
+    )
+
+
+def content_hash(text):
+    """sha256 of the text a vector was built from, to tell whether it needs rebuilding."""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+class TokenCounter:
+    """Count and truncate tokens with tiktoken, or estimate when it is unavailable."""
+
+    def __init__(self, encoding_name='cl100k_base'):
+        try:
+            import tiktoken
+            self.encoding = tiktoken.get_encoding(encoding_name)
+        except Exception:
+            # tiktoken missing or its encoding could not be downloaded (offline)
+            self.encoding = None
+
+    def count(self, text):
+        if self.encoding is None:
+            # Conservative estimate: English averages ~4 characters per token
+            return len(text) // 3 + 1
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        if self.encoding is None:
+            return text[:max_tokens * 3]
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens])
+
+
+class OpenAIEmbeddingBackend:
+    """Send batches of texts to the OpenAI embeddings endpoint."""
+
+    def __init__(self, client=None, model=EMBEDDING_MODEL):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.client = client
+        self.model = model
+
+    def embed_batch(self, texts):
+        response = self.client.embeddings.create(input=texts, model=self.model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class FakeEmbeddingBackend:
+    """Deterministic offline backend for tests and local development.
+
+    Words are hashed into a fixed number of buckets, so texts sharing words get
+    similar vectors without any network access.
+    """
+
+    def __init__(self, model=EMBEDDING_MODEL, dimension=None):
+        self.model = model
+        self.dimension = dimension or EMBEDDING_DIMENSIONS.get(model, 3072)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def embed_batch(self, texts):
+        with self._lock:
+            self.requests += 1
+        return [self._embed(text) for text in texts]
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimension
+        for word in re.findall(r'\w+', text.lower()):
+            digest = hashlib.sha1(word.encode('utf-8')).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+
+def _is_retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status in RETRY_STATUS_CODES:
+        return True
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError', 'RateLimitError')
+
+
+class EmbeddingClient:
+    """Embed many texts with as few requests as possible.
+
+    Texts are packed into batches that respect the per-request token and input
+    limits, batches are sent concurrently, and transient failures are retried
+    with jittered exponential backoff. Results keep the order of the input.
+    With a cache attached, only texts never embedded with this model before
+    reach the backend.
+    """
+
+    def __init__(self, backend, cache=None, max_workers=4, max_retries=5, base_delay=1.0, max_delay=30.0,
+                 max_tokens_per_request=MAX_TOKENS_PER_REQUEST, max_inputs_per_request=MAX_INPUTS_PER_REQUEST):
+        self.backend = backend
+        self.cache = cache
+        self.model = backend.model
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_inputs_per_request = max_inputs_per_request
+        self.tokens = TokenCounter()
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts):
+        if not texts:
+            return []
+        known = self.cache.get_many(self.model, texts) if self.cache else {}
+        # Each distinct uncached text is sent once
+        missing = [text for text in dict.fromkeys(texts) if text not in known]
+        if missing:
+            fresh = self._embed_uncached(missing)
+            if self.cache:
+                self.cache.put_many(self.model, missing, fresh)
+            known.update(zip(missing, fresh))
+        return [known[text] for text in texts]
+
+    def _embed_uncached(self, texts):
+        batches = self._make_batches(texts)
+        embeddings = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            batch_texts = [[text for _, text in batch] for batch in batches]
+            for batch, vectors in zip(batches, executor.map(self._embed_with_retry, batch_texts)):
+                for (position, _), vector in zip(batch, vectors):
+                    embeddings[position] = vector
+        return embeddings
+
+    def _make_batches(self, texts):
+        batches = []
+        current = []
+        current_tokens = 0
+        for position, text in enumerate(texts):
+            # The API rejects empty strings
+            text = self.tokens.truncate(text or ' ', MAX_TOKENS_PER_INPUT)
+            tokens = self.tokens.count(text)
+            if current and (current_tokens + tokens > self.max_tokens_per_request
+                            or len(current) >= self.max_inputs_per_request):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append((position, text))
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_with_retry(self, texts):
+        for attempt in range(self.max_retries):
+            try:
+                return self.backend.embed_batch(texts)
+            except Exception as e:
+                if attempt == self.max_retries - 1 or not _is_retryable(e):
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_embedding_client():
+    """Return the shared client; set EMBEDDING_BACKEND=fake to work offline.
+
+    Embeddings are cached on disk unless EMBEDDING_CACHE=off.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            model = os.getenv('EMBEDDING_MODEL', EMBEDDING_MODEL)
+            if os.getenv('EMBEDDING_BACKEND', 'openai') == 'fake':
+                backend = FakeEmbeddingBackend(model=model)
+            else:
+                backend = OpenAIEmbeddingBackend(model=model)
+            cache = None if os.getenv('EMBEDDING_CACHE', 'on') == 'off' else EmbeddingCache()
+            _default_client = EmbeddingClient(backend, cache=cache)
+        return _default_client
@@ -0,0 +1,251 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from activity_db import fetch_all, fetch_one, transaction
+
+# Batches processed at once by a job's worker pool
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+# Tries per batch before its items are marked failed, with jittered exponential backoff in between
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '4'))
+JOB_BACKOFF_SECONDS = float(os.getenv('JOB_BACKOFF_SECONDS', '2'))
+JOB_MAX_BACKOFF_SECONDS = 60.0
+# The runner refreshes heartbeat_at this often; a running job silent for JOB_STALE_SECONDS was interrupted
+HEARTBEAT_SECONDS = 10.0
+JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', '60'))
+
+ACTIVE_STATUSES = ('running', 'cancelling')
+
+
+class RateLimiter:
+    """Spaces calls evenly so that at most ``per_minute`` start in any minute, across all threads."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class PartialBatchError(Exception):
+    """Raised by a job's ``process`` when only ``failed`` items of its batch failed; the others count as done."""
+
+    def __init__(self, failed, message):
+        super().__init__(message)
+        self.failed = list(failed)
+
+
+def job_status(job):
+    """A job row's status, reporting a running job whose runner stopped heartbeating as 'interrupted'."""
+    status, heartbeat_at = job['status'], job['heartbeat_at']
+    if status in ACTIVE_STATUSES and (heartbeat_at is None or time.time() - heartbeat_at > JOB_STALE_SECONDS):
+        return 'interrupted'
+    return status
+
+
+def _job_dict(row, columns):
+    job = dict(zip(columns, row))
+    job['status'] = job_status(job)
+    return job
+
+
+JOB_COLUMNS = ('id', 'name', 'status', 'total', 'done', 'failed', 'created_at', 'updated_at', 'heartbeat_at',
+               'finished_at', 'last_error')
+
+
+def list_jobs(limit=50):
+    rows = fetch_all(f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs ORDER BY id DESC LIMIT ?', (limit,))
+    return [_job_dict(row, JOB_COLUMNS) for row in rows]
+
+
+def get_job(job_id):
+    row = fetch_one(f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE id = ?', (job_id,))
+    return _job_dict(row, JOB_COLUMNS) if row else None
+
+
+def failed_items(job_id, limit=100):
+    return fetch_all('''
+        SELECT item_key, attempts, last_error FROM job_items WHERE job_id = ? AND status = 'failed'
+        ORDER BY updated_at DESC LIMIT ?
+    ''', (job_id, limit))
+
+
+def request_cancel(job_id):
+    """Ask a running job to stop; the runner finishes the batches in flight and marks it cancelled."""
+    with transaction() as conn:
+        conn.execute("UPDATE jobs SET status = 'cancelling', updated_at = ? WHERE id = ? AND status = 'running'",
+                     (time.time(), job_id))
+
+
+def start_job(name, item_keys, resume=True):
+    """Create or resume the job called ``name`` for ``item_keys``; returns (job_id, keys already done).
+
+    The latest unfinished job of that name is resumed: its checkpointed items
+    are skipped and its failed items are retried. Checkpoints for items no
+    longer in ``item_keys`` are dropped. A job that is still heartbeating in
+    another process is not taken over.
+    """
+    now = time.time()
+    with transaction() as conn:
+        if not conn.in_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute(f'''
+            SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE name = ? AND status != 'completed' ORDER BY id DESC LIMIT 1
+        ''', (name,)).fetchone()
+        job = _job_dict(row, JOB_COLUMNS) if row else None
+        if job and job['status'] in ACTIVE_STATUSES:
+            raise RuntimeError(f"Job '{name}' is already running (job {job['id']}).")
+        if job and resume:
+            job_id = job['id']
+            states = dict(conn.execute('SELECT item_key, status FROM job_items WHERE job_id = ?', (job_id,)))
+            wanted = set(item_keys)
+            conn.executemany('DELETE FROM job_items WHERE job_id = ? AND item_key = ?',
+                             [(job_id, key) for key in states if key not in wanted])
+            conn.execute("UPDATE job_items SET status = 'pending', attempts = 0 WHERE job_id = ? AND status = 'failed'",
+                         (job_id,))
+        else:
+            if job:
+                conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ?", (now, job['id']))
+            job_id = conn.execute('INSERT INTO jobs (name, status, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                                  (name, 'running', now, now)).lastrowid
+            states = {}
+        conn.executemany('INSERT OR IGNORE INTO job_items (job_id, item_key) VALUES (?, ?)',
+                         [(job_id, key) for key in item_keys if key not in states])
+        done_keys = {key for key in item_keys if states.get(key) == 'done'}
+        conn.execute('''
+            UPDATE jobs SET status = 'running', total = ?, done = ?, failed = 0, updated_at = ?, heartbeat_at = ?,
+                            finished_at = NULL, last_error = NULL
+            WHERE id = ?
+        ''', (len(item_keys), len(done_keys), now, now, job_id))
+    return job_id, done_keys
+
+
+def _checkpoint(job_id, done_keys, failed_keys, attempts, error):
+    """Record a finished batch; returns the job's status so the runner notices cancel requests."""
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany('''
+            UPDATE job_items SET status = ?, attempts = ?, last_error = ?, updated_at = ? WHERE job_id = ? AND item_key = ?
+        ''', [('done', attempts, None, now, job_id, key) for key in done_keys] +
+            [('failed', attempts, error, now, job_id, key) for key in failed_keys])
+        conn.execute('UPDATE jobs SET done = done + ?, failed = failed + ?, updated_at = ? WHERE id = ?',
+                     (len(done_keys), len(failed_keys), now, job_id))
+        if failed_keys:
+            conn.execute('UPDATE jobs SET last_error = ? WHERE id = ?', (error, job_id))
+        return conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+
+
+def _finish(job_id, status):
+    now = time.time()
+    with transaction() as conn:
+        conn.execute('UPDATE jobs SET status = ?, updated_at = ?, finished_at = ? WHERE id = ?',
+                     (status, now, now, job_id))
+
+
+def _with_retries(process, batch, max_attempts, backoff):
+    """Run process(batch), retrying what failed; returns (attempts, failed items, error message or None).
+
+    After a PartialBatchError only its ``failed`` items are passed to the next try.
+    """
+    pending = list(batch)
+    for attempt in range(1, max_attempts + 1):
+        try:
+            process(pending)
+            return attempt, [], None
+        except PartialBatchError as e:
+            failed = {str(item) for item in e.failed}
+            pending = [item for item in pending if str(item) in failed]
+            if not pending:
+                return attempt, [], None
+            error = f'{type(e).__name__}: {e}'
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        if attempt == max_attempts:
+            return attempt, pending, error
+        delay = min(JOB_MAX_BACKOFF_SECONDS, backoff * 2 ** (attempt - 1))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+def _heartbeat(job_id, stop):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        with transaction() as conn:
+            conn.execute('UPDATE jobs SET heartbeat_at = ? WHERE id = ?', (time.time(), job_id))
+
+
+def run_job(name, items, process, batch_size=1, workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS,
+            backoff=JOB_BACKOFF_SECONDS, resume=True):
+    """Run ``process`` over ``items`` with checkpoints, retries and a bounded worker pool.
+
+    Items are grouped into batches of ``batch_size`` and ``process(batch)`` is
+    called with each list, up to ``workers`` at a time; it should be safe to
+    repeat, since a batch that was in flight when the process died runs again.
+    Items are identified by str(item). A batch that keeps raising is retried
+    with backoff and then marked failed without stopping the job; ``process``
+    can raise PartialBatchError to have only some of its items retried and
+    marked failed. Progress is
+    kept in the jobs table (see st_jobs.py); rerunning the same job name after
+    a crash, cancel or failures resumes where it stopped.
+
+    Returns the job row as a dict.
+    """
+    by_key = {str(item): item for item in items}
+    job_id, done_keys = start_job(name, list(by_key), resume=resume)
+    pending = [item for key, item in by_key.items() if key not in done_keys]
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    if done_keys:
+        print(f"Resuming job {job_id} ({name}): {len(done_keys)}/{len(by_key)} items already done.")
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job_id, stop), daemon=True)
+    heartbeat.start()
+    status = 'running'
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            queued = iter(batches)
+            in_flight = {}
+            while True:
+                # Keep the pool busy without queueing every batch up front, so a cancel takes effect quickly
+                while status == 'running' and len(in_flight) < max(1, workers):
+                    batch = next(queued, None)
+                    if batch is None:
+                        break
+                    in_flight[executor.submit(_with_retries, process, batch, max_attempts, backoff)] = batch
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch = in_flight.pop(future)
+                    attempts, failed, error = future.result()
+                    failed_keys = {str(item) for item in failed}
+                    status = _checkpoint(job_id, [str(item) for item in batch if str(item) not in failed_keys],
+                                         failed_keys, attempts, error)
+                    if failed:
+                        print(f"{name}: {len(failed)} of a batch of {len(batch)} failed after {attempts} attempts: {error}")
+                job = get_job(job_id)
+                print(f"{name}: {job['done']}/{job['total']} done, {job['failed']} failed")
+    except BaseException:
+        # Ctrl-C or a crash in the runner itself: leave the checkpoints for the next run
+        _finish(job_id, 'interrupted')
+        raise
+    finally:
+        stop.set()
+
+    job = get_job(job_id)
+    if status == 'cancelling':
+        final = 'cancelled'
+    elif job['failed']:
+        final = 'failed'
+    else:
+        final = 'completed'
+    _finish(job_id, final)
+    print(f"{name}: job {job_id} {final} ({job['done']}/{job['total']} done, {job['failed']} failed).")
+    return get_job(job_id)
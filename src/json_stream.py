@@ -0,0 +1,84 @@
+import json
+import re
+
+# Trailing commas are the most common defect in model-written JSON
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+class JSONArrayStreamParser:
+    """Incrementally pull the objects out of a JSON array as text arrives.
+
+    Text before the opening '[' (preambles such as "Here are your
+    activities:") is ignored. ``feed`` returns every top-level object that
+    closed in the chunk, so a response cut off halfway still yields all the
+    objects that were complete.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.current = []
+        self.errors = []
+
+    def feed(self, chunk):
+        objects = []
+        for char in chunk:
+            if self.finished:
+                break
+            if not self.started:
+                if char == '[':
+                    self.started = True
+                continue
+            if self.depth == 0:
+                # Between objects: skip commas and whitespace until the next object or the end
+                if char == '{':
+                    self.depth = 1
+                    self.current = [char]
+                elif char == ']':
+                    self.finished = True
+                continue
+            self.current.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    parsed = self._parse(''.join(self.current))
+                    if parsed is not None:
+                        objects.append(parsed)
+                    self.current = []
+        return objects
+
+    def _parse(self, text):
+        try:
+            return json.loads(text, strict=False)
+        except json.JSONDecodeError:
+            pass
+        try:
+            return json.loads(_TRAILING_COMMA.sub(r'\1', text), strict=False)
+        except json.JSONDecodeError as e:
+            self.errors.append((text, str(e)))
+            return None
+
+    @property
+    def truncated(self):
+        """True when the text ended inside the array (the closing ']' never arrived)."""
+        return self.started and not self.finished
+
+
+def parse_json_objects(text):
+    """Return (objects, parser) for a complete or truncated JSON array held in ``text``."""
+    parser = JSONArrayStreamParser()
+    return parser.feed(text), parser
@@ -0,0 +1,301 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+
+from api_retry import RETRY_STATUS_CODES
+from llm_cache import cache_key, get_llm_cache
+
+# Available AI models (using direct API access)
+AVAILABLE_MODELS = {
+    "Claude 4.5 Haiku": {
+        "id": "claude-haiku-4-5",
+        "provider": "anthropic",
+        "max_tokens": 4000,
+        "description": "Fast and cost-effective - great for activity generation"
+    },
+    "GPT-5-nano": {
+        "id": "gpt-5-nano",
+        "provider": "openai",
+        "max_tokens": 4000,
+        "description": "OpenAI GPT-5-nano - ultra-cheap and fast for simple generation"
+    },
+    "Kimi K2.5": {
+        "id": "kimi-k2.5",
+        "provider": "kimi",
+        "max_tokens": 4000,
+        "description": "Moonshot's Kimi K2.5 - fast and capable"
+    }
+}
+DEFAULT_MODEL = "Claude 4.5 Haiku"
+
+# Concurrent requests allowed per provider (LLM_CONCURRENCY_<PROVIDER> overrides)
+PROVIDER_CONCURRENCY = {
+    provider: int(os.getenv(f'LLM_CONCURRENCY_{provider.upper()}', default))
+    for provider, default in {'anthropic': 4, 'openai': 4, 'kimi': 2}.items()
+}
+
+
+def create_async_client(provider):
+    if provider == "anthropic":
+        from anthropic import AsyncAnthropic
+        return AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+    from openai import AsyncOpenAI
+    if provider == "openai":
+        return AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    if provider == "kimi":
+        # Kimi K2.5 via Moonshot API
+        return AsyncOpenAI(
+            api_key=os.getenv('KIMI_API_KEY'),
+            base_url=os.getenv("KIMI_BASE_URL", "https://api.kimi.com/coding/v1"),
+            default_headers={
+                "User-Agent": "claude-code/1.0",
+                "X-Client-Name": "claude-code"
+            }
+        )
+    raise ValueError(f"Unknown provider: {provider}")
+
+
+def finished_normally(provider, stop_reason):
+    """True unless the provider stopped early (max_tokens/length, content filter, ...)."""
+    return stop_reason == ("end_turn" if provider == "anthropic" else "stop")
+
+
+def is_retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status in RETRY_STATUS_CODES or status == 529:
+        return True
+    return type(error).__name__ in (
+        'APIConnectionError', 'APITimeoutError', 'RateLimitError', 'InternalServerError', 'OverloadedError')
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait (retry-after / retry-after-ms headers), if any."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class AsyncGenerationEngine:
+    """Run LLM calls concurrently on a background event loop.
+
+    Each provider gets its own semaphore, so a multi-model comparison costs
+    the slowest call rather than the sum of them, while a burst of requests to
+    one provider stays under its concurrency limit. Transient errors are
+    retried with jittered exponential backoff, waiting at least as long as the
+    provider's retry-after header asks. Only responses the provider finished
+    normally are cached, so a truncated answer is not replayed.
+
+    The loop lives on a daemon thread so the async clients and semaphores stay
+    bound to one loop across Streamlit reruns; the synchronous methods block
+    until their coroutine finishes. With a cache attached, repeated requests
+    are answered from it unless ``regenerate`` is set.
+    """
+
+    def __init__(self, models=AVAILABLE_MODELS, concurrency=PROVIDER_CONCURRENCY, clients=None, cache=None,
+                 max_retries=4, base_delay=1.0, max_delay=30.0):
+        self.models = models
+        self.cache = cache
+        self.concurrency = concurrency
+        self.clients = dict(clients or {})
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._semaphores = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='llm-engine', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the background loop and wait for its thread; the engine can't be used afterwards."""
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        if not self._loop.is_closed():
+            self._loop.close()
+
+    def _client(self, provider):
+        if provider not in self.clients:
+            self.clients[provider] = create_async_client(provider)
+        return self.clients[provider]
+
+    def _semaphore(self, provider):
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(self.concurrency.get(provider, 2))
+        return self._semaphores[provider]
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def model_config(self, model_name):
+        return self.models.get(model_name, self.models[DEFAULT_MODEL])
+
+    def _cache_key(self, config, prompt, temperature):
+        return cache_key(config["provider"], config["id"], prompt, temperature)
+
+    async def complete(self, model_name, prompt, temperature=0.7, regenerate=False):
+        """Return the completion text for ``prompt`` from ``model_name``."""
+        config = self.model_config(model_name)
+        provider = config["provider"]
+        key = self._cache_key(config, prompt, temperature)
+        if self.cache is not None and not regenerate:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        for attempt in range(self.max_retries):
+            try:
+                async with self._semaphore(provider):
+                    text, stop_reason = await self._call(provider, config, prompt, temperature)
+                if self.cache is not None and text and finished_normally(provider, stop_reason):
+                    self.cache.put(key, provider, config["id"], text)
+                return text
+            except Exception as e:
+                if attempt == self.max_retries - 1 or not is_retryable(e):
+                    raise
+                # Back off outside the semaphore so other requests can use the slot
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                await asyncio.sleep(max(delay, retry_after(e) or 0))
+
+    async def _call(self, provider, config, prompt, temperature):
+        """Return (text, stop reason)."""
+        client = self._client(provider)
+        messages = [{"role": "user", "content": prompt}]
+        if provider == "anthropic":
+            response = await client.messages.create(
+                model=config["id"],
+                max_tokens=config["max_tokens"],
+                temperature=temperature,
+                messages=messages
+            )
+            return response.content[0].text, response.stop_reason
+        # GPT-5-nano uses max_completion_tokens instead of max_tokens
+        token_limit = "max_completion_tokens" if config["id"] == "gpt-5-nano" else "max_tokens"
+        response = await client.chat.completions.create(
+            model=config["id"],
+            temperature=temperature,
+            messages=messages,
+            **{token_limit: config["max_tokens"]}
+        )
+        return response.choices[0].message.content, response.choices[0].finish_reason
+
+    async def stream(self, model_name, prompt, temperature=0.7, regenerate=False):
+        """Yield the completion text for ``prompt`` piece by piece as the provider streams it.
+
+        Transient errors are retried only until the first piece arrives; after
+        that they are raised so the caller keeps what it already received. A
+        cached response is yielded in one piece.
+        """
+        config = self.model_config(model_name)
+        provider = config["provider"]
+        key = self._cache_key(config, prompt, temperature)
+        if self.cache is not None and not regenerate:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        for attempt in range(self.max_retries):
+            pieces = []
+            outcome = {}
+            try:
+                async with self._semaphore(provider):
+                    async for text in self._stream_call(provider, config, prompt, temperature, outcome):
+                        pieces.append(text)
+                        yield text
+                if self.cache is not None and pieces and finished_normally(provider, outcome.get('stop_reason')):
+                    self.cache.put(key, provider, config["id"], ''.join(pieces))
+                return
+            except Exception as e:
+                if pieces or attempt == self.max_retries - 1 or not is_retryable(e):
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                await asyncio.sleep(max(delay, retry_after(e) or 0))
+
+    async def _stream_call(self, provider, config, prompt, temperature, outcome):
+        """Yield text pieces; the stop reason is left in outcome['stop_reason'] once the stream ends."""
+        client = self._client(provider)
+        messages = [{"role": "user", "content": prompt}]
+        if provider == "anthropic":
+            async with client.messages.stream(
+                model=config["id"],
+                max_tokens=config["max_tokens"],
+                temperature=temperature,
+                messages=messages
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                outcome['stop_reason'] = (await stream.get_final_message()).stop_reason
+            return
+        token_limit = "max_completion_tokens" if config["id"] == "gpt-5-nano" else "max_tokens"
+        response = await client.chat.completions.create(
+            model=config["id"],
+            temperature=temperature,
+            messages=messages,
+            stream=True,
+            **{token_limit: config["max_tokens"]}
+        )
+        async for chunk in response:
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].finish_reason:
+                outcome['stop_reason'] = chunk.choices[0].finish_reason
+            if chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def complete_many(self, model_names, prompt, temperature=0.7, regenerate=False):
+        """Send ``prompt`` to every model at once; returns {model_name: text or exception}."""
+        results = await asyncio.gather(
+            *(self.complete(model_name, prompt, temperature, regenerate) for model_name in model_names),
+            return_exceptions=True)
+        return dict(zip(model_names, results))
+
+    def generate(self, model_name, prompt, temperature=0.7, regenerate=False):
+        return self._run(self.complete(model_name, prompt, temperature, regenerate))
+
+    def generate_many(self, model_names, prompt, temperature=0.7, regenerate=False):
+        return self._run(self.complete_many(list(model_names), prompt, temperature, regenerate))
+
+    def generate_stream(self, model_name, prompt, temperature=0.7, regenerate=False):
+        """Synchronous iterator over the streamed completion text."""
+        pieces = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for text in self.stream(model_name, prompt, temperature, regenerate):
+                    pieces.put(text)
+            except Exception as e:
+                pieces.put(e)
+            finally:
+                pieces.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = pieces.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+
+def get_generation_engine():
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = AsyncGenerationEngine(cache=get_llm_cache())
+        return _default_engine
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from activity_db import DB_PATH, get_pool
+
+# The cache lives in its own database next to activities.db
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(os.path.dirname(DB_PATH), 'llm_cache.db'))
+LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+
+
+def cache_key(provider, model, prompt, temperature, system=None):
+    """sha256 over everything that changes the response: provider, model, prompts and temperature."""
+    payload = json.dumps([provider, model, system, prompt, temperature])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """Persistent LLM response cache with a time-to-live and LRU size eviction."""
+
+    def __init__(self, path=None, ttl=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.pool = get_pool(path or LLM_CACHE_PATH)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)')
+
+    def get(self, key):
+        """Return the cached response for ``key``, or None when missing or older than the TTL."""
+        now = time.time()
+        with self.pool.transaction() as conn:
+            row = conn.execute('SELECT response, created_at FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE llm_cache SET last_used = ? WHERE key = ?', (now, key))
+            return row[0]
+
+    def put(self, key, provider, model, response):
+        now = time.time()
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO llm_cache (key, provider, model, response, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, provider, model, response, now, now))
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl,))
+        count = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute('''
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used LIMIT ?
+                )
+            ''', (count - self.max_entries,))
+
+    def clear(self):
+        with self.pool.transaction() as conn:
+            conn.execute('DELETE FROM llm_cache')
+
+
+def cached_completion(provider, model, prompt, call, temperature=0.7, system=None, regenerate=False, cache=None,
+                      validate=None):
+    """Return ``call()``'s response text, served from the cache when the same request was made before.
+
+    ``regenerate=True`` skips the lookup but still stores the fresh response.
+    ``validate(response)`` returning False keeps a truncated, malformed or
+    off-label response out of the cache; it is still returned, and a cached
+    response that fails it is asked for again.
+    """
+    cache = cache if cache is not None else get_llm_cache()
+    if cache is None:
+        return call()
+    key = cache_key(provider, model, prompt, temperature, system)
+    if not regenerate:
+        cached = cache.get(key)
+        if cached is not None and (validate is None or validate(cached)):
+            return cached
+    response = call()
+    if response and (validate is None or validate(response)):
+        cache.put(key, provider, model, response)
+    return response
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Return the shared cache, or None when LLM_CACHE=off."""
+    global _default_cache
+    if os.getenv('LLM_CACHE', 'on') == 'off':
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
@@ -0,0 +1,326 @@
+from activity_db import fetch_one, transaction
+
+
+def column_names(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info('{table}')")}
+
+
+def add_column(conn, table, column, declaration):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there (older databases grew columns ad hoc)."""
+    if column not in column_names(conn, table):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+
+def create_base_tables(conn):
+    """activities, activity_schedule, weekly_meta and available_supplies with every column the code uses."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS activities (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        type TEXT,
+        description TEXT,
+        supplies TEXT,
+        instructions TEXT,
+        source TEXT
+    )
+    ''')
+    add_column(conn, 'activities', 'to_do', 'BOOLEAN DEFAULT 0')
+    add_column(conn, 'activities', 'development_age_group', 'TEXT')
+    add_column(conn, 'activities', 'development_group_justification', 'TEXT')
+    add_column(conn, 'activities', 'adaptations', 'TEXT')
+    # Written by the duplicate review scripts
+    add_column(conn, 'activities', 'related_ids', 'TEXT')
+    add_column(conn, 'activities', 'duplicate_status', 'TEXT')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS activity_schedule (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        activity_id INTEGER,
+        scheduled_date TEXT,
+        FOREIGN KEY(activity_id) REFERENCES activities(id)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS weekly_meta (
+        week_start TEXT PRIMARY KEY,
+        week_theme TEXT
+    )
+    ''')
+    add_column(conn, 'weekly_meta', 'week_number', 'INTEGER')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS available_supplies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category TEXT,
+        item TEXT
+    )
+    ''')
+
+
+def create_lookup_indexes(conn):
+    """Indexes for the type filter, the to-do list, the weekly date range scan and schedule joins."""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_type ON activities (type)')
+    # Only the handful of rows on the to-do list are ever looked up by to_do
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_to_do ON activities (to_do) WHERE to_do = 1')
+    # Covers "scheduled_date BETWEEN ? AND ?" and hands back activity_id for the join without a table lookup
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_schedule_date ON activity_schedule (scheduled_date, activity_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_schedule_activity ON activity_schedule (activity_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_available_supplies_category ON available_supplies (category, item)')
+
+
+def create_dedup_tables(conn):
+    """Per-activity vectors, the change log the dedup scripts read, and the scored duplicate pairs.
+
+    Every insert, every edit of a text field and every delete of an activity
+    bumps a global change sequence, so rows are marked dirty whichever script
+    changed them. Each dedup script keeps its own watermark into that log.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS activity_vectors (
+        activity_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        vector BLOB NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (activity_id, kind)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS activity_changes (
+        activity_id INTEGER PRIMARY KEY,
+        change_seq INTEGER NOT NULL
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_changes_seq ON activity_changes (change_seq)')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS dedup_watermarks (
+        consumer TEXT PRIMARY KEY,
+        change_seq INTEGER NOT NULL
+    )
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_mark_dirty_insert AFTER INSERT ON activities BEGIN
+        INSERT OR REPLACE INTO activity_changes (activity_id, change_seq)
+        VALUES (new.id, (SELECT COALESCE(MAX(change_seq), 0) + 1 FROM activity_changes));
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_mark_dirty_update
+    AFTER UPDATE OF title, description, supplies, instructions ON activities BEGIN
+        INSERT OR REPLACE INTO activity_changes (activity_id, change_seq)
+        VALUES (new.id, (SELECT COALESCE(MAX(change_seq), 0) + 1 FROM activity_changes));
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_forget_vectors AFTER DELETE ON activities BEGIN
+        DELETE FROM activity_vectors WHERE activity_id = old.id;
+        DELETE FROM activity_changes WHERE activity_id = old.id;
+    END
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS duplicate_candidates (
+        id1 INTEGER NOT NULL,
+        id2 INTEGER NOT NULL,
+        lexical_score REAL NOT NULL,
+        vector_score REAL,
+        score REAL NOT NULL,
+        verdict TEXT NOT NULL,
+        verdict_source TEXT NOT NULL,
+        pair_hash TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (id1, id2)
+    )
+    ''')
+
+
+def create_vector_outbox(conn):
+    """The vector outbox and the triggers that fill it.
+
+    Inserts and edits of indexed fields queue an 'upsert' and deletes queue a
+    'delete' inside the same transaction as the change itself. Each activity
+    holds at most one entry; ``seq`` tells the worker whether the entry it
+    processed was replaced in the meantime. vector_content_hashes remembers
+    the text each indexed vector was built from.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS vector_outbox (
+        activity_id INTEGER PRIMARY KEY,
+        operation TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        queued_at REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_vector_outbox_seq ON vector_outbox (seq)')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS vector_content_hashes (
+        activity_id INTEGER PRIMARY KEY,
+        content_hash TEXT NOT NULL
+    )
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_outbox_insert AFTER INSERT ON activities BEGIN
+        INSERT OR REPLACE INTO vector_outbox (activity_id, operation, seq, queued_at)
+        VALUES (new.id, 'upsert', (SELECT COALESCE(MAX(seq), 0) + 1 FROM vector_outbox), (julianday('now') - 2440587.5) * 86400.0);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_outbox_update
+    AFTER UPDATE OF title, type, description, supplies, instructions, to_do ON activities BEGIN
+        INSERT OR REPLACE INTO vector_outbox (activity_id, operation, seq, queued_at)
+        VALUES (new.id, 'upsert', (SELECT COALESCE(MAX(seq), 0) + 1 FROM vector_outbox), (julianday('now') - 2440587.5) * 86400.0);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_outbox_delete AFTER DELETE ON activities BEGIN
+        INSERT OR REPLACE INTO vector_outbox (activity_id, operation, seq, queued_at)
+        VALUES (old.id, 'delete', (SELECT COALESCE(MAX(seq), 0) + 1 FROM vector_outbox), (julianday('now') - 2440587.5) * 86400.0);
+    END
+    ''')
+
+
+def create_fts_index(conn):
+    """External-content FTS5 index over title, description, supplies and instructions, rebuilt from the table.
+
+    The index stores only the inverted index and reads the text back from
+    activities; the triggers keep it current.
+    """
+    conn.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS activities_fts USING fts5(
+        title, description, supplies, instructions, content='activities', content_rowid='id', tokenize='porter unicode61'
+    )
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_fts_insert AFTER INSERT ON activities BEGIN
+        INSERT INTO activities_fts (rowid, title, description, supplies, instructions)
+        VALUES (new.id, new.title, new.description, new.supplies, new.instructions);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_fts_delete AFTER DELETE ON activities BEGIN
+        INSERT INTO activities_fts (activities_fts, rowid, title, description, supplies, instructions)
+        VALUES ('delete', old.id, old.title, old.description, old.supplies, old.instructions);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_fts_update
+    AFTER UPDATE OF title, description, supplies, instructions ON activities BEGIN
+        INSERT INTO activities_fts (activities_fts, rowid, title, description, supplies, instructions)
+        VALUES ('delete', old.id, old.title, old.description, old.supplies, old.instructions);
+        INSERT INTO activities_fts (rowid, title, description, supplies, instructions)
+        VALUES (new.id, new.title, new.description, new.supplies, new.instructions);
+    END
+    ''')
+    conn.execute("INSERT INTO activities_fts (activities_fts) VALUES ('rebuild')")
+
+
+def create_activity_supplies(conn):
+    """activity_supplies, the parsed form of activities.supplies, filled for every existing activity.
+
+    Parsing is Python, so the triggers only queue the ids of inserted rows and
+    rows whose supplies changed in activity_supplies_pending;
+    supplies.sync_activity_supplies() parses the queue. Deletes are applied directly.
+    """
+    from supplies import sync_activity_supplies
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS activity_supplies (
+        activity_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        supply_key TEXT NOT NULL,
+        name TEXT NOT NULL,
+        raw TEXT NOT NULL,
+        quantity TEXT,
+        PRIMARY KEY (activity_id, position)
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_supplies_key ON activity_supplies (supply_key)')
+    conn.execute('CREATE TABLE IF NOT EXISTS activity_supplies_pending (activity_id INTEGER PRIMARY KEY)')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_supplies_insert AFTER INSERT ON activities BEGIN
+        INSERT OR IGNORE INTO activity_supplies_pending (activity_id) VALUES (new.id);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_supplies_update AFTER UPDATE OF supplies ON activities
+    WHEN new.supplies IS NOT old.supplies BEGIN
+        INSERT OR IGNORE INTO activity_supplies_pending (activity_id) VALUES (new.id);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS activities_supplies_delete AFTER DELETE ON activities BEGIN
+        DELETE FROM activity_supplies WHERE activity_id = old.id;
+        DELETE FROM activity_supplies_pending WHERE activity_id = old.id;
+    END
+    ''')
+    conn.execute('INSERT OR IGNORE INTO activity_supplies_pending (activity_id) SELECT id FROM activities')
+    sync_activity_supplies()
+
+
+def create_job_tables(conn):
+    """jobs, one row per run of a batch utility, and job_items, its per-item checkpoints."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        status TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        heartbeat_at REAL,
+        finished_at REAL,
+        last_error TEXT
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_name ON jobs (name, id)')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS job_items (
+        job_id INTEGER NOT NULL,
+        item_key TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        updated_at REAL,
+        PRIMARY KEY (job_id, item_key)
+    ) WITHOUT ROWID
+    ''')
+
+
+# Append new steps at the end; a database at user_version N has run the first N and never reruns them,
+# so a schema change is always a new step (ALTER TABLE, new index, trigger rewrite, ...), never an edit to an old one
+MIGRATIONS = [
+    create_base_tables,
+    create_lookup_indexes,
+    create_dedup_tables,
+    create_vector_outbox,
+    create_fts_index,
+    create_activity_supplies,
+    create_job_tables,
+]
+
+
+def schema_version():
+    return fetch_one('PRAGMA user_version')[0]
+
+
+def migrate():
+    """Bring activities.db up to the latest schema; returns the names of the steps applied.
+
+    The version lives in PRAGMA user_version. Each step runs in its own
+    immediate transaction together with the version bump, so a failed step
+    leaves the database at the previous version, and a second process
+    starting at the same time waits and then skips the steps already done.
+    """
+    applied = []
+    if schema_version() >= len(MIGRATIONS):
+        return applied
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        with transaction() as conn:
+            if not conn.in_transaction:
+                conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+                continue
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+        applied.append(migration.__name__)
+    return applied
@@ -0,0 +1,177 @@
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+TEMPLATES_DIR = os.getenv('TEMPLATES_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates'))
+PRINT_CSS_PATH = os.path.join(TEMPLATES_DIR, 'print.css')
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', '2'))
+PDF_CACHE_MAX_ENTRIES = int(os.getenv('PDF_CACHE_MAX_ENTRIES', '64'))
+
+# Templates are compiled on first use and kept by the environment
+_env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=select_autoescape(['html']))
+
+
+def render_html(template_name, context):
+    return _env.get_template(template_name).render(**context)
+
+
+def pdf_key(template_name, context):
+    """sha256 over the template name and everything that ends up on the page."""
+    payload = json.dumps([template_name, context], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _lines(text, separator):
+    return [line.strip() for line in (text or '').split(separator) if line.strip()]
+
+
+def weekly_plan_context(week_start, week_theme, week_dates, scheduled_by_date):
+    """Template context for weekly_plan.html from week_schedule_by_date() output."""
+    days = []
+    for day in week_dates:
+        activities = []
+        for _, _, activity in scheduled_by_date[day.strftime('%Y-%m-%d')]:
+            if activity:
+                activities.append({
+                    'id': activity[0],
+                    'title': activity[1],
+                    'type': activity[2],
+                    'description': activity[3],
+                    'supplies': _lines(activity[4], ','),
+                    'instructions': _lines(activity[5], '\n'),
+                })
+        days.append({'label': day.strftime('%A, %B %d'), 'activities': activities})
+    return {'week_of': week_start.strftime('%B %d, %Y'), 'week_theme': week_theme, 'days': days}
+
+
+def supply_list_context(week_start, week_theme, scheduled_activities, categorized_supplies):
+    """Template context for supply_list.html from the Weekly Supply List page's data."""
+    activities = [{
+        'title': title,
+        'type': act_type,
+        'day': datetime.datetime.strptime(scheduled_date, '%Y-%m-%d').strftime('%A'),
+    } for _, title, act_type, _, scheduled_date in scheduled_activities]
+    categories = [{
+        'name': category,
+        'items': [{'original': item['original'], 'count': item['count']} for item in items],
+    } for category, items in categorized_supplies.items()]
+    return {
+        'week_of': week_start.strftime('%B %d, %Y'),
+        'week_theme': week_theme,
+        'activities': activities,
+        'categories': categories,
+        'total_items': sum(len(category['items']) for category in categories),
+    }
+
+
+def supply_forecast_context(start_date, end_date, weeks, categorized):
+    """Template context for supply_forecast.html from supply_forecast() output."""
+    def label(date):
+        return datetime.datetime.strptime(date, '%Y-%m-%d').strftime('%b %d')
+    categories = [{
+        'name': category,
+        'items': [{'original': item['original'], 'count': item['count'], 'weeks': item['weeks']} for item in items],
+    } for category, items in categorized.items()]
+    return {
+        'range_label': f"{datetime.datetime.strptime(start_date, '%Y-%m-%d').strftime('%B %d, %Y')} - "
+                       f"{datetime.datetime.strptime(end_date, '%Y-%m-%d').strftime('%B %d, %Y')}",
+        'weeks': [label(week) for week in weeks],
+        'categories': categories,
+    }
+
+
+# Per worker process: WeasyPrint, its font configuration and the print stylesheet are loaded once
+_font_config = None
+_stylesheet = None
+
+
+def _init_worker():
+    global _font_config, _stylesheet
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+    _font_config = FontConfiguration()
+    _stylesheet = CSS(filename=PRINT_CSS_PATH, font_config=_font_config)
+
+
+def html_to_pdf(html):
+    if _font_config is None:
+        _init_worker()
+    from weasyprint import HTML
+    return HTML(string=html, base_url=TEMPLATES_DIR).write_pdf(stylesheets=[_stylesheet], font_config=_font_config)
+
+
+class PdfRenderer:
+    """Renders printable PDFs in a process pool and keeps the results in an LRU cache.
+
+    ``submit`` returns immediately with the cache key; ``result`` returns the
+    PDF bytes once the worker has finished and None while it is still running.
+    The key hashes the full template context, so asking for the same week again
+    is served from memory and any change to the schedule renders a new PDF.
+    """
+
+    def __init__(self, max_workers=PDF_RENDER_WORKERS, max_entries=PDF_CACHE_MAX_ENTRIES):
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pdfs = OrderedDict()
+        self._pending = {}
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn rather than fork: the app process holds SQLite connections and background threads
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_worker)
+        return self._executor
+
+    def submit(self, template_name, context):
+        key = pdf_key(template_name, context)
+        with self._lock:
+            if key not in self._pdfs and key not in self._pending:
+                html = render_html(template_name, context)
+                self._pending[key] = self._get_executor().submit(html_to_pdf, html)
+        return key
+
+    def result(self, key):
+        """PDF bytes for a submitted key, None while rendering; re-raises the worker's error once."""
+        with self._lock:
+            if key in self._pdfs:
+                self._pdfs.move_to_end(key)
+                return self._pdfs[key]
+            future = self._pending[key]
+            if not future.done():
+                return None
+            del self._pending[key]
+        pdf = future.result()
+        with self._lock:
+            self._pdfs[key] = pdf
+            while len(self._pdfs) > self.max_entries:
+                self._pdfs.popitem(last=False)
+        return pdf
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self._pending.clear()
+
+
+_default_renderer = None
+_default_renderer_lock = threading.Lock()
+
+
+def get_pdf_renderer():
+    global _default_renderer
+    with _default_renderer_lock:
+        if _default_renderer is None:
+            _default_renderer = PdfRenderer()
+        return _default_renderer
@@ -0,0 +1,80 @@
+import random
+import threading
+import time
+
+from activity_db import fetch_all, fetch_one
+
+# Re-read the id lists at least this often so type edits show up on the Home page
+SAMPLER_TTL_SECONDS = 300
+
+
+class ActivitySampler:
+    """Pick random activities per type without ORDER BY RANDOM().
+
+    The ids of every type are held in memory, loaded with one scan of the type
+    index. Sampling picks ids with ``random.sample`` and the rows come back in
+    a single IN query. The id lists are reloaded when rows are added or
+    removed (count or max id changes) or after ``ttl`` seconds.
+    """
+
+    def __init__(self, ttl=SAMPLER_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ids_by_type = {}
+        self._signature = None
+        self._loaded_at = 0.0
+
+    def _current_signature(self):
+        return tuple(fetch_one('SELECT COUNT(*), MAX(id) FROM activities'))
+
+    def ids_by_type(self):
+        signature = self._current_signature()
+        with self._lock:
+            if signature != self._signature or time.time() - self._loaded_at > self.ttl:
+                ids_by_type = {}
+                for activity_type, activity_id in fetch_all(
+                        "SELECT type, id FROM activities WHERE type IS NOT NULL AND type != '' ORDER BY type"):
+                    ids_by_type.setdefault(activity_type, []).append(activity_id)
+                self._ids_by_type = ids_by_type
+                self._signature = signature
+                self._loaded_at = time.time()
+            return self._ids_by_type
+
+    def sample(self, per_type=2, activity_types=None, rng=random):
+        """Return {type: [ids]} with up to ``per_type`` random ids of each type."""
+        ids_by_type = self.ids_by_type()
+        if activity_types is None:
+            activity_types = sorted(ids_by_type)
+        sample = {}
+        for activity_type in activity_types:
+            ids = ids_by_type.get(activity_type, [])
+            sample[activity_type] = rng.sample(ids, min(per_type, len(ids)))
+        return sample
+
+
+def fetch_sample(sample):
+    """Load the rows for a {type: [ids]} sample with one query, keeping its grouping and order.
+
+    Ids that were deleted since the sample was taken are dropped.
+    """
+    all_ids = [activity_id for ids in sample.values() for activity_id in ids]
+    if not all_ids:
+        return {activity_type: [] for activity_type in sample}
+    placeholders = ', '.join('?' for _ in all_ids)
+    rows = {row[0]: row for row in fetch_all(f'SELECT * FROM activities WHERE id IN ({placeholders})', all_ids)}
+    return {
+        activity_type: [rows[activity_id] for activity_id in ids if activity_id in rows]
+        for activity_type, ids in sample.items()
+    }
+
+
+_default_sampler = None
+_default_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    global _default_sampler
+    with _default_sampler_lock:
+        if _default_sampler is None:
+            _default_sampler = ActivitySampler()
+        return _default_sampler
@@ -0,0 +1,38 @@
+import datetime
+
+from activity_db import fetch_all, fetch_one
+
+
+def week_end(start_date, days=7):
+    """The last date (YYYY-MM-DD) of the ``days``-day window starting at ``start_date``."""
+    start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
+    return (start + datetime.timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+
+def get_week_schedule(start_date, days=7):
+    """Return [(schedule_id, scheduled_date, activity_id, activity)] for the window in one joined query.
+
+    ``activity`` is the full activities row (as SELECT * returns it), or None
+    when the scheduled activity has since been deleted.
+    """
+    rows = fetch_all('''
+        SELECT s.id, s.scheduled_date, s.activity_id, a.*
+        FROM activity_schedule s
+        LEFT JOIN activities a ON a.id = s.activity_id
+        WHERE s.scheduled_date BETWEEN ? AND ?
+        ORDER BY s.scheduled_date, s.id
+    ''', (start_date, week_end(start_date, days)))
+    return [(row[0], row[1], row[2], row[3:] if row[3] is not None else None) for row in rows]
+
+
+def week_schedule_by_date(start_date, dates, days=7):
+    """Group the window's schedule into {date: [(schedule_id, activity_id, activity)]} for the given dates."""
+    by_date = {date: [] for date in dates}
+    for schedule_id, scheduled_date, activity_id, activity in get_week_schedule(start_date, days):
+        if scheduled_date in by_date:
+            by_date[scheduled_date].append((schedule_id, activity_id, activity))
+    return by_date
+
+
+def activity_exists(activity_id):
+    return fetch_one('SELECT 1 FROM activities WHERE id = ?', (activity_id,)) is not None
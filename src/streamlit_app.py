@@ -2,61 +2,36 @@ import streamlit as st
 from streamlit_option_menu import option_menu
 import sqlite3
 import os
-import json
-from anthropic import Anthropic
-from openai import OpenAI
-from pinecone import Pinecone
 from dotenv import load_dotenv
 from streamlit_extras.colored_header import colored_header
 from streamlit_extras.app_logo import add_logo
 import random
 import datetime
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
-import tempfile
+import time
+from activity_db import execute, fetch_all, fetch_one
+from activity_ingest import activity_row, ingest_activities, ingest_rows
+from activity_search import SEARCH_MODES, search_by_type
+from embeddings import get_embedding_client
+from json_stream import JSONArrayStreamParser, parse_json_objects
+from llm import AVAILABLE_MODELS, DEFAULT_MODEL, get_generation_engine
+from migrations import migrate
+from pdf_render import get_pdf_renderer, pdf_key, render_html, supply_forecast_context, supply_list_context, weekly_plan_context
+from sampling import fetch_sample, get_sampler
+from schedule import activity_exists, week_end, week_schedule_by_date
+from supplies import aggregate_supplies, forecast_csv, supplies_by_activity, supply_forecast
+from vector_index import get_vector_store
+from vector_sync import get_outbox_worker
 
 # Load environment variables
 load_dotenv()
 
-# Initialize clients
-anthropic_client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
-# Initialize Kimi client (Kimi K2.5 via Moonshot API)
-kimi_client = OpenAI(
-    api_key=os.getenv('KIMI_API_KEY'),
-    base_url=os.getenv("KIMI_BASE_URL", "https://api.kimi.com/coding/v1"),
-    default_headers={
-        "User-Agent": "claude-code/1.0",
-        "X-Client-Name": "claude-code"
-    }
-)
-
-
-pinecone_client = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
-pinecone_index = pinecone_client.Index(os.getenv('PINECONE_INDEX_NAME'))
-
-# Available AI models (using direct API access)
-AVAILABLE_MODELS = {
-    "Claude 4.5 Haiku": {
-        "id": "claude-haiku-4-5",
-        "provider": "anthropic",
-        "max_tokens": 4000,
-        "description": "Fast and cost-effective - great for activity generation"
-    },
-    "GPT-5-nano": {
-        "id": "gpt-5-nano",
-        "provider": "openai",
-        "max_tokens": 4000,
-        "description": "OpenAI GPT-5-nano - ultra-cheap and fast for simple generation"
-    },
-    "Kimi K2.5": {
-        "id": "kimi-k2.5",
-        "provider": "kimi",
-        "max_tokens": 4000,
-        "description": "Moonshot's Kimi K2.5 - fast and capable"
-    }
-}
+# LLM calls run concurrently on the engine's background event loop
+generation_engine = get_generation_engine()
+
+embedding_client = get_embedding_client()
+
+# Pinecone or the local on-disk index, depending on VECTOR_BACKEND
+vector_store = get_vector_store()
 
 # Initialize session state for generated activities
 if 'generated_activities' not in st.session_state:
@@ -68,216 +43,163 @@ if 'supplies_generated_activities' not in st.session_state:
 
 # Initialize session state for selected model
 if 'selected_model' not in st.session_state:
-    st.session_state.selected_model = "Claude 4.5 Haiku"
+    st.session_state.selected_model = DEFAULT_MODEL
 
 # Function to fetch activities that need to be done
 def get_todo_activities():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM activities WHERE to_do = 1')
-    activities = cursor.fetchall()
-    conn.close()
-    return activities
+    return fetch_all('SELECT * FROM activities WHERE to_do = 1')
 
 # Function to fetch supplies for all to-do activities
 def get_supplies_list():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT supplies FROM activities WHERE to_do = 1')
-    supplies = cursor.fetchall()
-    conn.close()
-    return supplies
+    return fetch_all('SELECT supplies FROM activities WHERE to_do = 1')
 
 # Function to fetch all activities from the database
 def get_activities():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM activities')
-    activities = cursor.fetchall()
-    conn.close()
-    return activities
+    return fetch_all('SELECT * FROM activities')
 
 # Function to get all available supplies from the database
 def get_available_supplies():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM available_supplies ORDER BY category, item')
-    supplies = cursor.fetchall()
-    conn.close()
-    return supplies
+    return fetch_all('SELECT * FROM available_supplies ORDER BY category, item')
 
 # Function to add a new supply to the database
 def add_supply(category, item):
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO available_supplies (category, item) VALUES (?, ?)', (category, item))
-    conn.commit()
-    conn.close()
+    execute('INSERT INTO available_supplies (category, item) VALUES (?, ?)', (category, item))
 
 # Function to delete a supply from the database
 def delete_supply(supply_id):
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM available_supplies WHERE id = ?', (supply_id,))
-    conn.commit()
-    conn.close()
+    execute('DELETE FROM available_supplies WHERE id = ?', (supply_id,))
 
 # Function to get supplies grouped by category
 def get_supplies_by_category():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT category, GROUP_CONCAT(item, ", ") as items FROM available_supplies GROUP BY category ORDER BY category')
-    supplies_by_category = cursor.fetchall()
-    conn.close()
-    return supplies_by_category
+    return fetch_all('SELECT category, GROUP_CONCAT(item, ", ") as items FROM available_supplies GROUP BY category ORDER BY category')
 
 # Function to add an activity to the database
 def add_activity(title, type, description, supplies, instructions, source, to_do, development_age_group, development_group_justification, adaptations):
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('''
+    execute('''
     INSERT INTO activities (title, type, description, supplies, instructions, source, to_do, development_age_group, development_group_justification, adaptations)
     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (title, type, description, supplies, instructions, source, to_do, development_age_group, development_group_justification, adaptations))
-    conn.commit()
-    conn.close()
+    # The insert trigger queued the new row for embedding
+    outbox_worker.notify()
 
 # Function to update an activity in the database
 def update_activity(id, title, type, description, supplies, instructions, source, to_do, development_age_group, development_group_justification, adaptations):
     try:
-        conn = sqlite3.connect('activities.db')
-        # Set the database connection to read-write mode
-        conn.execute('PRAGMA journal_mode=WAL')
-        cursor = conn.cursor()
-        cursor.execute('''
+        execute('''
         UPDATE activities
         SET title = ?, type = ?, description = ?, supplies = ?, instructions = ?, source = ?, to_do = ?, development_age_group = ?, development_group_justification = ?, adaptations = ?
         WHERE id = ?
         ''', (title, type, description, supplies, instructions, source, to_do, development_age_group, development_group_justification, adaptations, id))
-        conn.commit()
+        # The worker re-embeds only when the embedded text changed; a to_do toggle just updates metadata
+        outbox_worker.notify()
     except sqlite3.OperationalError as e:
         st.error(f"Database error: {str(e)}. Please check file permissions.")
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
-    finally:
-        conn.close()
 
-# Function to delete an activity from the database and Pinecone
+# Function to delete an activity from the database and the vector store
 def delete_activity(id):
-    # Delete from SQLite database
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM activities WHERE id = ?', (id,))
-    conn.commit()
-    conn.close()
-
-    # Delete from Pinecone
-    pinecone_index.delete(ids=[str(id)])
+    # The delete trigger queues the vector removal in the same transaction
+    execute('DELETE FROM activities WHERE id = ?', (id,))
+    outbox_worker.notify()
 
 # Unified function to generate activities using any supported model
-def generate_activities_with_model(prompt, model_name):
+def generate_activities_with_model(prompt, model_name, regenerate=False):
     """Generate activities using the selected AI model."""
-    model_config = AVAILABLE_MODELS.get(model_name, AVAILABLE_MODELS["Claude 4.5 Haiku"])
-    provider = model_config["provider"]
-    model_id = model_config["id"]
-    max_tokens = model_config["max_tokens"]
-    
     try:
-        if provider == "anthropic":
-            response = anthropic_client.messages.create(
-                model=model_id,
-                max_tokens=max_tokens,
-                temperature=0.7,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            api_response_content = response.content[0].text
-            
-        elif provider == "openai":
-            # GPT-5-nano uses max_completion_tokens instead of max_tokens
-            if model_id == "gpt-5-nano":
-                response = openai_client.chat.completions.create(
-                    model=model_id,
-                    max_completion_tokens=max_tokens,
-                    temperature=0.7,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-            else:
-                response = openai_client.chat.completions.create(
-                    model=model_id,
-                    max_tokens=max_tokens,
-                    temperature=0.7,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-            api_response_content = response.choices[0].message.content
-            
-        elif provider == "kimi":
-            response = kimi_client.chat.completions.create(
-                model=model_id,
-                max_tokens=max_tokens,
-                temperature=0.7,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            api_response_content = response.choices[0].message.content
-            
-        
-        else:
-            raise ValueError(f"Unknown provider: {provider}")
-        
+        api_response_content = generation_engine.generate(model_name, prompt, regenerate=regenerate)
         # Parse JSON from response
         return parse_activity_json(api_response_content)
-        
     except Exception as e:
         st.error(f"Error with {model_name}: {str(e)}")
         return None
 
+def generate_activities_with_models(prompt, model_names, regenerate=False):
+    """Send one prompt to several models in parallel and merge their activities.
+
+    Each activity is tagged with the model that produced it under "Model".
+    """
+    merged = []
+    for model_name, api_response_content in generation_engine.generate_many(model_names, prompt, regenerate=regenerate).items():
+        if isinstance(api_response_content, Exception):
+            st.error(f"Error with {model_name}: {str(api_response_content)}")
+            continue
+        activities = parse_activity_json(api_response_content)
+        for activity in activities or []:
+            activity["Model"] = model_name
+            merged.append(activity)
+    return merged
+
+REQUIRED_ACTIVITY_FIELDS = ["Activity Title", "Type", "Description", "Supplies", "Instructions"]
+
+def missing_activity_fields(activity):
+    if not isinstance(activity, dict):
+        return REQUIRED_ACTIVITY_FIELDS
+    return [field for field in REQUIRED_ACTIVITY_FIELDS if field not in activity]
+
 def parse_activity_json(api_response_content):
-    """Parse JSON activities from API response."""
-    # Find JSON content
-    json_start = api_response_content.find("[")
-    json_end = api_response_content.rfind("]") + 1
-    
-    if json_start == -1 or json_end == 0:
+    """Parse JSON activities from API response.
+
+    Objects are pulled out one at a time, so a truncated response still
+    returns every activity that was complete.
+    """
+    activities, parser = parse_json_objects(api_response_content)
+
+    if not parser.started:
         st.error("No JSON array found in the response")
         st.code(api_response_content)
         return None
-        
-    json_content = api_response_content[json_start:json_end]
-    
-    # Check if the JSON content is complete
-    if not json_content.strip().endswith("]"):
-        st.error("Response appears to be truncated. Please try again.")
-        st.code(json_content)
-        return None
-    
-    # Try to clean up common JSON issues
-    json_content = json_content.replace('\n', ' ').replace('\r', ' ')
-    json_content = json_content.replace('",}', '"}').replace(',]', ']')
-    
-    # Parse JSON
-    try:
-        activities = json.loads(json_content)
-    except json.JSONDecodeError as json_error:
+
+    for json_content, json_error in parser.errors:
         st.error(f"JSON parsing error: {json_error}")
         st.error("Raw JSON content:")
         st.code(json_content)
-        return None
-    
+
     # Validate activities structure
-    if not isinstance(activities, list):
-        st.error("Response is not a list of activities")
-        return None
-        
     for activity in activities:
-        required_fields = ["Activity Title", "Type", "Description", "Supplies", "Instructions"]
-        missing_fields = [field for field in required_fields if field not in activity]
+        missing_fields = missing_activity_fields(activity)
         if missing_fields:
             st.error(f"Activity missing required fields: {', '.join(missing_fields)}")
             return None
-            
-    return activities
+
+    if parser.truncated:
+        if not activities:
+            st.error("Response appears to be truncated. Please try again.")
+            st.code(api_response_content)
+            return None
+        st.warning(f"Response was truncated; kept the {len(activities)} complete activities.")
+
+    return activities or None
+
+def stream_activities_with_model(prompt, model_name, container, regenerate=False):
+    """Stream a generation and show each activity in ``container`` as soon as its JSON object closes."""
+    parser = JSONArrayStreamParser()
+    activities = []
+    received = []
+    try:
+        for text in generation_engine.generate_stream(model_name, prompt, regenerate=regenerate):
+            received.append(text)
+            for activity in parser.feed(text):
+                missing_fields = missing_activity_fields(activity)
+                if missing_fields:
+                    container.warning(f"Skipped an activity missing required fields: {', '.join(missing_fields)}")
+                    continue
+                activities.append(activity)
+                container.markdown(f"**{activity['Activity Title']}** ({activity['Type']}): {activity['Description']}")
+    except Exception as e:
+        # Keep whatever arrived before the stream broke
+        st.error(f"Error with {model_name}: {str(e)}")
+    if received and not parser.started:
+        st.error("No JSON array found in the response")
+        st.code(''.join(received))
+    if parser.errors:
+        st.warning(f"Skipped {len(parser.errors)} activities that could not be parsed as JSON.")
+    if parser.truncated and activities:
+        st.warning(f"Response was truncated; kept the {len(activities)} complete activities.")
+    return activities or None
 
 # New functions from other files
-def generate_activities(theme, model_name=None):
+def generate_activities(theme, model_name=None, model_names=None, stream_to=None, regenerate=False):
     if model_name is None:
         model_name = st.session_state.selected_model
         
@@ -296,21 +218,17 @@ def generate_activities(theme, model_name=None):
     Ensure the JSON is properly formatted and complete.
     """
     
-    # Add retry logic
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            return generate_activities_with_model(prompt, model_name)
-        except Exception as e:
-            if attempt < max_retries - 1:
-                st.warning(f"Attempt {attempt + 1} failed, retrying... ({str(e)})")
-                import time
-                time.sleep(2)
-            else:
-                st.error(f"All {max_retries} attempts failed. Last error: {str(e)}")
-                return None
-
-def generate_activities_from_supplies(supplies_list, theme=None, model_name=None):
+    # Transient API errors are retried with backoff inside the generation engine,
+    # and repeated prompts are answered from the LLM cache unless regenerate is set
+    if model_names and len(model_names) > 1:
+        return generate_activities_with_models(prompt, model_names, regenerate)
+    if model_names:
+        model_name = model_names[0]
+    if stream_to is not None:
+        return stream_activities_with_model(prompt, model_name, stream_to, regenerate)
+    return generate_activities_with_model(prompt, model_name, regenerate)
+
+def generate_activities_from_supplies(supplies_list, theme=None, model_name=None, model_names=None, stream_to=None, regenerate=False):
     if model_name is None:
         model_name = st.session_state.selected_model
         
@@ -352,58 +270,15 @@ def generate_activities_from_supplies(supplies_list, theme=None, model_name=None
     - Ensure the JSON is properly formatted and complete.
     """
     
-    # Add retry logic
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            return generate_activities_with_model(prompt, model_name)
-        except Exception as e:
-            if attempt < max_retries - 1:
-                st.warning(f"Attempt {attempt + 1} failed, retrying... ({str(e)})")
-                import time
-                time.sleep(2)
-            else:
-                st.error(f"All {max_retries} attempts failed. Last error: {str(e)}")
-                return None
-
-def get_embedding(text):
-    response = openai_client.embeddings.create(input=text, model="text-embedding-3-large")
-    return response.data[0].embedding
-
-def add_activity_bulk(conn, cursor, index, activity):
-    insert_query = """
-    INSERT INTO activities (title, type, description, supplies, instructions, to_do, source, development_age_group, development_group_justification, adaptations)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
-    cursor.execute(insert_query, (
-        activity['Activity Title'],
-        activity['Type'],
-        activity['Description'],
-        ', '.join(activity['Supplies']),
-        '\n'.join(activity['Instructions']),
-        True,
-        "AI",
-        activity.get('Development Age Group', 'Not specified'),
-        activity.get('Development Group Justification', ''),
-        activity.get('Adaptations', '')
-    ))
-    conn.commit()
-    activity_id = cursor.lastrowid
-    text = (
-        f"Title: {activity['Activity Title']}\n"
-        f"Description: {activity['Description']}\n"
-        f"Supplies: {', '.join(activity['Supplies'])}\n"
-        f"Instructions: {' '.join(activity['Instructions'])}"
-    )
-    embedding = get_embedding(text)
-    index.upsert(vectors=[{
-        "id": str(activity_id),
-        "values": embedding,
-        "metadata": {
-            "type": activity['Type'],
-            "to_do": True
-        }
-    }])
+    # Transient API errors are retried with backoff inside the generation engine,
+    # and repeated prompts are answered from the LLM cache unless regenerate is set
+    if model_names and len(model_names) > 1:
+        return generate_activities_with_models(prompt, model_names, regenerate)
+    if model_names:
+        model_name = model_names[0]
+    if stream_to is not None:
+        return stream_activities_with_model(prompt, model_name, stream_to, regenerate)
+    return generate_activities_with_model(prompt, model_name, regenerate)
 
 def parse_activities(text):
     activities = []
@@ -435,249 +310,90 @@ def parse_activities(text):
 
     return activities
 
-def search_activities(keyword, top_k=4):
-    embedding = get_embedding(keyword)
-    activity_types = ['Art', 'Craft', 'Science', 'Cooking', 'Physical']
-    results = {}
-    for activity_type in activity_types:
-        query_results = pinecone_index.query(vector=embedding, top_k=top_k, filter={"type": activity_type}, include_metadata=True)
-        results[activity_type] = [result['id'] for result in query_results['matches']]
-    return results
+def search_activities(keyword, top_k=4, mode='hybrid'):
+    return search_by_type(keyword, top_k=top_k, mode=mode)
 
 # Add this new function after the other database-related functions
 def get_activities_by_ids(ids):
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
     placeholders = ', '.join('?' for _ in ids)
     query = f"SELECT * FROM activities WHERE id IN ({placeholders})"
-    cursor.execute(query, ids)
-    activities = cursor.fetchall()
-    conn.close()
-    return activities
-
-# New function to get random activities for each type
-def get_random_activities():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    activity_types = ["Art", "Cooking", "Craft", "Group Game", "Physical", "Puzzle", "Science"]
-    random_activities = {}
-    for activity_type in activity_types:
-        cursor.execute('SELECT * FROM activities WHERE type = ? ORDER BY RANDOM() LIMIT 2', (activity_type,))
-        random_activities[activity_type] = cursor.fetchall()
-    conn.close()
-    return random_activities
+    # Keep the search ranking; IN returns rows in table order
+    rank = {str(id): position for position, id in enumerate(ids)}
+    return sorted(fetch_all(query, ids), key=lambda activity: rank[str(activity[0])])
+
+# Random activities for each type; the sample is kept in the session so reruns show the same ones
+def get_random_activities(shuffle=False):
+    if shuffle or 'home_sample' not in st.session_state:
+        st.session_state.home_sample = get_sampler().sample(per_type=2)
+    return fetch_sample(st.session_state.home_sample)
+
+# Schema and index migrations run once per server process, not on every rerun
+@st.cache_resource
+def run_migrations():
+    return migrate()
+
+run_migrations()
+# Background sync of activity inserts, edits and deletes into the vector store
+outbox_worker = get_outbox_worker()
+
+# Printable PDFs render in a process pool so the page stays responsive
+pdf_renderer = get_pdf_renderer()
+# How often the page reruns to check on a PDF that is still rendering
+PDF_POLL_SECONDS = 0.5
+
+def show_pdf_download(state_key, label, file_name):
+    """Show the download button for the PDF submitted under st.session_state[state_key].
+
+    Returns True while the PDF is still rendering, so the caller reruns the page to poll.
+    """
+    try:
+        pdf_bytes = pdf_renderer.result(st.session_state[state_key])
+    except Exception as e:
+        del st.session_state[state_key]
+        st.error(f"Error generating PDF: {str(e)}")
+        return False
+    if pdf_bytes is None:
+        st.info("Rendering PDF...")
+        return True
+    st.download_button(label=label, data=pdf_bytes, file_name=file_name, mime="application/pdf")
+    return False
 
 # --- Weekly Planner Scheduling Helpers ---
-def ensure_schedule_table():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS activity_schedule (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        activity_id INTEGER,
-        scheduled_date TEXT,
-        FOREIGN KEY(activity_id) REFERENCES activities(id)
-    )
-    ''')
-    conn.commit()
-    conn.close()
-
-def ensure_weekly_meta_table():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS weekly_meta (
-            week_start TEXT PRIMARY KEY,
-            week_theme TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-ensure_schedule_table()
-ensure_weekly_meta_table()
-
 def get_weekly_meta(week_start):
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT week_theme FROM weekly_meta WHERE week_start = ?', (week_start,))
-    row = cursor.fetchone()
-    conn.close()
+    row = fetch_one('SELECT week_theme FROM weekly_meta WHERE week_start = ?', (week_start,))
     if row:
         return row[0] or ''
     return ''
 
 def set_weekly_meta(week_start, week_theme):
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('''
+    execute('''
         INSERT INTO weekly_meta (week_start, week_theme)
         VALUES (?, ?)
         ON CONFLICT(week_start) DO UPDATE SET week_theme=excluded.week_theme
     ''', (week_start, week_theme))
-    conn.commit()
-    conn.close()
-
-def get_scheduled_activities_for_week(start_date):
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    end_date = (datetime.datetime.strptime(start_date, '%Y-%m-%d') + datetime.timedelta(days=6)).strftime('%Y-%m-%d')
-    cursor.execute('''
-        SELECT s.id, s.scheduled_date, a.id, a.title, a.type, a.description
-        FROM activity_schedule s
-        JOIN activities a ON s.activity_id = a.id
-        WHERE s.scheduled_date BETWEEN ? AND ?
-        ORDER BY s.scheduled_date
-    ''', (start_date, end_date))
-    results = cursor.fetchall()
-    conn.close()
-    return results
 
 def add_activity_to_schedule(activity_id, scheduled_date):
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO activity_schedule (activity_id, scheduled_date) VALUES (?, ?)', (activity_id, scheduled_date))
-    conn.commit()
-    conn.close()
+    execute('INSERT INTO activity_schedule (activity_id, scheduled_date) VALUES (?, ?)', (activity_id, scheduled_date))
 
 def remove_scheduled_activity(schedule_id):
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM activity_schedule WHERE id = ?', (schedule_id,))
-    conn.commit()
-    conn.close()
+    execute('DELETE FROM activity_schedule WHERE id = ?', (schedule_id,))
 
 def get_all_week_themes():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT week_start, week_theme FROM weekly_meta ORDER BY week_start')
-    rows = cursor.fetchall()
-    conn.close()
+    rows = fetch_all('SELECT week_start, week_theme FROM weekly_meta ORDER BY week_start')
     # Only include rows with a non-empty theme
     return [(row[0], row[1]) for row in rows if row[1]]
 
 # --- Weekly Supply List Helpers ---
 def get_scheduled_activities_with_supplies(start_date):
     """Get all activities scheduled for a week with their supplies."""
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
     end_date = (datetime.datetime.strptime(start_date, '%Y-%m-%d') + datetime.timedelta(days=6)).strftime('%Y-%m-%d')
-    cursor.execute('''
+    return fetch_all('''
         SELECT a.id, a.title, a.type, a.supplies, s.scheduled_date
         FROM activity_schedule s
         JOIN activities a ON s.activity_id = a.id
         WHERE s.scheduled_date BETWEEN ? AND ?
         ORDER BY s.scheduled_date, a.type
     ''', (start_date, end_date))
-    results = cursor.fetchall()
-    conn.close()
-    return results
-
-def normalize_supply_name(supply):
-    """Normalize a supply name for de-duplication."""
-    # Convert to lowercase, strip whitespace, remove common pluralization differences
-    normalized = supply.lower().strip()
-    # Remove trailing 's' for basic de-duplication (paper vs papers)
-    if normalized.endswith('s') and len(normalized) > 3:
-        normalized = normalized[:-1]
-    return normalized
-
-def parse_supplies(supplies_text):
-    """Parse supplies text into individual items."""
-    if not supplies_text:
-        return []
-    # Split by comma, newline, or bullet points
-    items = []
-    for separator in [',', '\n', '•', '-', '*']:
-        if separator in supplies_text:
-            items = supplies_text.split(separator)
-            break
-    else:
-        items = [supplies_text]
-    
-    # Clean up each item
-    cleaned = []
-    for item in items:
-        item = item.strip()
-        # Remove quantities in parentheses like "(10 sheets)" or "(1 bottle)"
-        if '(' in item and ')' in item:
-            item = item[:item.find('(')].strip()
-        # Remove leading bullets or numbers
-        item = item.lstrip('0123456789.-•* ').strip()
-        if item and len(item) > 1:
-            cleaned.append(item)
-    return cleaned
-
-def get_supply_category_mapping():
-    """Get a mapping of supply names to their categories."""
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT category, item FROM available_supplies')
-    supplies = cursor.fetchall()
-    conn.close()
-    
-    # Create mapping: normalized supply name -> category
-    mapping = {}
-    for category, item in supplies:
-        normalized = normalize_supply_name(item)
-        mapping[normalized] = category
-        # Also map the original
-        mapping[item.lower().strip()] = category
-    return mapping
-
-def aggregate_weekly_supplies(scheduled_activities):
-    """Aggregate supplies from scheduled activities, de-duplicate and categorize."""
-    supply_mapping = get_supply_category_mapping()
-    
-    # Track supplies: normalized_name -> {original_name, count, activities, category}
-    supplies_agg = {}
-    
-    for activity in scheduled_activities:
-        activity_id, title, act_type, supplies_text, scheduled_date = activity
-        supplies_list = parse_supplies(supplies_text)
-        
-        for supply in supplies_list:
-            normalized = normalize_supply_name(supply)
-            
-            if normalized not in supplies_agg:
-                # Try to find category from available supplies
-                category = supply_mapping.get(normalized, 'Uncategorized')
-                if category == 'Uncategorized':
-                    # Try fuzzy match
-                    for known_supply, known_category in supply_mapping.items():
-                        if normalized in known_supply or known_supply in normalized:
-                            category = known_category
-                            break
-                
-                supplies_agg[normalized] = {
-                    'original': supply,
-                    'count': 1,
-                    'activities': [title],
-                    'category': category
-                }
-            else:
-                supplies_agg[normalized]['count'] += 1
-                if title not in supplies_agg[normalized]['activities']:
-                    supplies_agg[normalized]['activities'].append(title)
-    
-    # Group by category
-    categorized = {}
-    for normalized, data in supplies_agg.items():
-        category = data['category']
-        if category not in categorized:
-            categorized[category] = []
-        categorized[category].append(data)
-    
-    # Sort within each category by count (descending) then alphabetically
-    for category in categorized:
-        categorized[category].sort(key=lambda x: (-x['count'], x['original']))
-    
-    # Sort categories: put Uncategorized last
-    sorted_categories = sorted([c for c in categorized.keys() if c != 'Uncategorized'])
-    if 'Uncategorized' in categorized:
-        sorted_categories.append('Uncategorized')
-    
-    return {cat: categorized[cat] for cat in sorted_categories}
 
 # Streamlit App
 st.set_page_config(page_title="Activity Planner", page_icon="🎨", layout="wide")
@@ -712,13 +428,13 @@ with st.sidebar:
             "Home", "Theme Search", "Generate Activities (AI)", "Generate from Supplies (AI)",
             "View To Do Activities", "View Supplies List", "Manage Supplies",
             "Bulk Add Activities", "Add Activity",
-            "Edit Activity", "View Activities", "Weekly Planner", "Weekly Supply List"
+            "Edit Activity", "View Activities", "Weekly Planner", "Weekly Supply List", "Supply Forecast"
         ],
         icons=[
             'house', 'search', 'magic', 'box-seam',
             'list-check', 'cart', 'gear',
             'file-earmark-plus', 'plus-circle',
-            'pencil', 'eye', 'calendar3', 'box'
+            'pencil', 'eye', 'calendar3', 'box', 'graph-up'
         ],
         menu_icon="cast",
         default_index=0,
@@ -727,7 +443,8 @@ with st.sidebar:
 # Main content area
 if choice == "Home":
     colored_header(label="Featured Activities", description="Random activities for each type", color_name="blue-70")
-    random_activities = get_random_activities()
+    shuffle = st.button("🔀 Shuffle")
+    random_activities = get_random_activities(shuffle=shuffle)
     for activity_type, activities in random_activities.items():
         st.subheader(f"{activity_type}")
         for activity in activities:
@@ -745,13 +462,17 @@ if choice == "Home":
 elif choice == "Theme Search":
     colored_header(label="Theme Search", description="Find activities based on a theme", color_name="blue-70")
     theme_description = st.text_input('Enter a theme description:')
+    search_mode = st.radio(
+        "Search mode:", SEARCH_MODES, horizontal=True,
+        format_func=lambda mode: {"hybrid": "Hybrid", "keyword": "Keyword (exact words)", "vector": "Semantic"}[mode]
+    )
 
     if 'theme_search_results' not in st.session_state:
         st.session_state.theme_search_results = {}
 
     if st.button('Search'):
         if theme_description:
-            st.session_state.theme_search_results = search_activities(theme_description)
+            st.session_state.theme_search_results = search_activities(theme_description, mode=search_mode)
         else:
             st.error("Please enter a theme description to search.")
 
@@ -776,19 +497,25 @@ elif choice == "Theme Search":
                 else:
                     st.info(f"No matching {activity_type} activities found in the database.")
             else:
-                st.info(f"No matching {activity_type} activities found in Pinecone.")
+                st.info(f"No matching {activity_type} activities found.")
 
 elif choice == "Generate Activities (AI)":
     colored_header(label="Generate Activities", description="Use AI to create new activities based on a theme or idea", color_name="green-70")
     st.caption(f"Using: **{st.session_state.selected_model}** 🤖")
     theme = st.text_input("Enter a theme:")
+    compare_models = st.multiselect("Compare models (optional, runs in parallel):", list(AVAILABLE_MODELS.keys()))
+    regenerate = st.checkbox("Regenerate (ignore cached results for this prompt)")
 
     if st.button("Generate Activities"):
         if theme:
-            activities = generate_activities(theme)
+            # Activities appear here one by one while the response streams in
+            preview = st.empty()
+            activities = generate_activities(theme, model_names=compare_models, stream_to=preview.container(), regenerate=regenerate)
+            preview.empty()
             if activities:
                 st.session_state.generated_activities = activities
-                st.success(f"Activities generated successfully with {st.session_state.selected_model}!")
+                used_models = ", ".join(compare_models) if len(compare_models) > 1 else st.session_state.selected_model
+                st.success(f"Activities generated successfully with {used_models}!")
             else:
                 st.error("No activities generated.")
         else:
@@ -797,6 +524,8 @@ elif choice == "Generate Activities (AI)":
     if st.session_state.generated_activities:
         for i, activity in enumerate(st.session_state.generated_activities):
             st.subheader(activity["Activity Title"])
+            if activity.get("Model"):
+                st.caption(f"Generated by {activity['Model']}")
             st.write(f"**Type**: {activity['Type']}")
             st.write(f"**Description**: {activity['Description']}")
             st.write("**Supplies**:")
@@ -812,26 +541,16 @@ elif choice == "Generate Activities (AI)":
         if st.button("Add Selected Activities"):
             selected_activities = [a for a in st.session_state.generated_activities if a.get('selected', False)]
             if selected_activities:
-                conn = sqlite3.connect('activities.db')
-                cursor = conn.cursor()
-                
-                success_count = 0
-                for activity in selected_activities:
-                    try:
-                        add_activity_bulk(conn, cursor, pinecone_index, activity)
-                        success_count += 1
-                    except Exception as e:
-                        st.error(f"Error adding activity '{activity['Activity Title']}': {str(e)}")
-                
-                conn.close()
-                
-                if success_count > 0:
-                    st.success(f'{success_count} activities added and embedded successfully!')
+                # One batched insert, embedding call and upsert for the whole selection
+                try:
+                    added_ids = ingest_activities(selected_activities, vector_store, embedding_client)
+                except Exception as e:
+                    st.error(f"Error adding activities, nothing was saved: {str(e)}")
+                else:
+                    st.success(f'{len(added_ids)} activities added and embedded successfully!')
                     # Clear the generated activities after successful addition
                     st.session_state.generated_activities = []
                     st.rerun()
-                if success_count < len(selected_activities):
-                    st.warning(f'{len(selected_activities) - success_count} activities failed to add. Please check the errors above.')
             else:
                 st.warning("No activities selected. Please select at least one activity to add.")
 
@@ -885,6 +604,8 @@ elif choice == "Generate from Supplies (AI)":
     # Theme input
     st.subheader("Theme (Optional)")
     theme_input = st.text_input("Enter a theme:", placeholder="e.g., space, ocean, dinosaurs, seasons")
+    compare_models = st.multiselect("Compare models (optional, runs in parallel):", list(AVAILABLE_MODELS.keys()))
+    regenerate = st.checkbox("Regenerate (ignore cached results for this prompt)")
     
     # Combine selected and custom supplies
     all_supplies = selected_supplies.copy()
@@ -901,7 +622,9 @@ elif choice == "Generate from Supplies (AI)":
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Generate Activities from Selected Supplies"):
-                activities = generate_activities_from_supplies(supplies_text, theme_input.strip() if theme_input.strip() else None)
+                preview = st.empty()
+                activities = generate_activities_from_supplies(supplies_text, theme_input.strip() if theme_input.strip() else None, model_names=compare_models, stream_to=preview.container(), regenerate=regenerate)
+                preview.empty()
                 if activities:
                     st.session_state.supplies_generated_activities = activities
                     theme_message = f" with theme '{theme_input}'" if theme_input.strip() else ""
@@ -915,7 +638,9 @@ elif choice == "Generate from Supplies (AI)":
                 all_available_supplies = [supply[2] for supply in available_supplies]
                 all_supplies_text = ", ".join(all_available_supplies)
                 
-                activities = generate_activities_from_supplies(all_supplies_text, theme_input.strip() if theme_input.strip() else None)
+                preview = st.empty()
+                activities = generate_activities_from_supplies(all_supplies_text, theme_input.strip() if theme_input.strip() else None, model_names=compare_models, stream_to=preview.container(), regenerate=regenerate)
+                preview.empty()
                 if activities:
                     st.session_state.supplies_generated_activities = activities
                     theme_message = f" with theme '{theme_input}'" if theme_input.strip() else ""
@@ -932,7 +657,9 @@ elif choice == "Generate from Supplies (AI)":
                 all_available_supplies = [supply[2] for supply in available_supplies]
                 all_supplies_text = ", ".join(all_available_supplies)
                 
-                activities = generate_activities_from_supplies(all_supplies_text, theme_input.strip() if theme_input.strip() else None)
+                preview = st.empty()
+                activities = generate_activities_from_supplies(all_supplies_text, theme_input.strip() if theme_input.strip() else None, model_names=compare_models, stream_to=preview.container(), regenerate=regenerate)
+                preview.empty()
                 if activities:
                     st.session_state.supplies_generated_activities = activities
                     theme_message = f" with theme '{theme_input}'" if theme_input.strip() else ""
@@ -949,7 +676,9 @@ elif choice == "Generate from Supplies (AI)":
                 random_supplies = random.sample(all_available_supplies, num_supplies)
                 random_supplies_text = ", ".join(random_supplies)
                 
-                activities = generate_activities_from_supplies(random_supplies_text, theme_input.strip() if theme_input.strip() else None)
+                preview = st.empty()
+                activities = generate_activities_from_supplies(random_supplies_text, theme_input.strip() if theme_input.strip() else None, model_names=compare_models, stream_to=preview.container(), regenerate=regenerate)
+                preview.empty()
                 if activities:
                     st.session_state.supplies_generated_activities = activities
                     theme_message = f" with theme '{theme_input}'" if theme_input.strip() else ""
@@ -963,6 +692,8 @@ elif choice == "Generate from Supplies (AI)":
         st.markdown("### Generated Activities from Your Supplies")
         for i, activity in enumerate(st.session_state.supplies_generated_activities):
             st.subheader(activity["Activity Title"])
+            if activity.get("Model"):
+                st.caption(f"Generated by {activity['Model']}")
             st.write(f"**Type**: {activity['Type']}")
             st.write(f"**Description**: {activity['Description']}")
             st.write("**Supplies**:")
@@ -978,26 +709,16 @@ elif choice == "Generate from Supplies (AI)":
         if st.button("Add Selected Activities from Supplies"):
             selected_activities = [a for a in st.session_state.supplies_generated_activities if a.get('selected', False)]
             if selected_activities:
-                conn = sqlite3.connect('activities.db')
-                cursor = conn.cursor()
-                
-                success_count = 0
-                for activity in selected_activities:
-                    try:
-                        add_activity_bulk(conn, cursor, pinecone_index, activity)
-                        success_count += 1
-                    except Exception as e:
-                        st.error(f"Error adding activity '{activity['Activity Title']}': {str(e)}")
-                
-                conn.close()
-                
-                if success_count > 0:
-                    st.success(f'{success_count} activities added and embedded successfully!')
+                # One batched insert, embedding call and upsert for the whole selection
+                try:
+                    added_ids = ingest_activities(selected_activities, vector_store, embedding_client)
+                except Exception as e:
+                    st.error(f"Error adding activities, nothing was saved: {str(e)}")
+                else:
+                    st.success(f'{len(added_ids)} activities added and embedded successfully!')
                     # Clear the supplies-generated activities after successful addition
                     st.session_state.supplies_generated_activities = []
                     st.rerun()
-                if success_count < len(selected_activities):
-                    st.warning(f'{len(selected_activities) - success_count} activities failed to add. Please check the errors above.')
             else:
                 st.warning("No activities selected. Please select at least one activity to add.")
 
@@ -1025,9 +746,10 @@ elif choice == "View Supplies List":
     st.caption("View supplies for all to-do activities")
     todo_activities = get_todo_activities()
     if todo_activities:
+        todo_supplies = supplies_by_activity([activity[0] for activity in todo_activities])
         for activity in todo_activities:
             st.markdown(f"**{activity[1]}**")
-            supplies = [supply.strip() for supply in activity[4].split(',')]
+            supplies = todo_supplies[activity[0]]
             supplies_html = "<br>".join([f"&nbsp;&nbsp;{supply}" for supply in supplies])
             st.markdown(f'<div style="line-height: 1;">{supplies_html}</div>', unsafe_allow_html=True)
             st.write("---")
@@ -1036,9 +758,8 @@ elif choice == "View Supplies List":
             printable_supplies = ''
             for activity in todo_activities:
                 printable_supplies += f"<h3>{activity[1]} (ID: {activity[0]})</h3>"
-                supplies = [supply.strip() for supply in activity[4].split(',')]
                 printable_supplies += '<div style="line-height: 1.2;">'
-                for supply in supplies:
+                for supply in todo_supplies[activity[0]]:
                     printable_supplies += f"&nbsp;&nbsp;{supply}<br>"
                 printable_supplies += "</div><hr>"
             
@@ -1139,25 +860,21 @@ elif choice == "Bulk Add Activities":
         if activities_input:
             activities = parse_activities(activities_input)
             
-            conn = sqlite3.connect('activities.db')
-            cursor = conn.cursor()
-            
-            success_count = 0
+            rows = []
             for activity in activities:
                 try:
-                    add_activity_bulk(conn, cursor, pinecone_index, activity)
-                    success_count += 1
+                    rows.append(activity_row(activity))
                 except ValueError as e:
                     st.error(f"Error adding activity: {str(e)}")
+
+            if rows:
+                try:
+                    added_ids = ingest_rows(rows, vector_store, embedding_client)
+                    st.success(f'{len(added_ids)} activities added and embedded successfully!')
                 except Exception as e:
-                    st.error(f"Unexpected error adding activity: {str(e)}")
-            
-            conn.close()
-            
-            if success_count > 0:
-                st.success(f'{success_count} activities added and embedded successfully!')
-            if success_count < len(activities):
-                st.warning(f'{len(activities) - success_count} activities failed to add. Please check the errors above.')
+                    st.error(f"Unexpected error adding activities, nothing was saved: {str(e)}")
+            if len(rows) < len(activities):
+                st.warning(f'{len(activities) - len(rows)} activities failed to add. Please check the errors above.')
         else:
             st.error('Please enter at least one activity.')
 
@@ -1260,7 +977,7 @@ elif choice == "Delete Activity":
     
     if selected_id and st.button("Delete", key="delete_button"):
         delete_activity(selected_id)
-        st.success("Activity deleted successfully from both SQLite and Pinecone!")
+        st.success("Activity deleted successfully from both SQLite and the vector store!")
 
 elif choice == "Weekly Planner":
     colored_header(label="Weekly Planner", description="Schedule activities in a weekly calendar", color_name="blue-70")
@@ -1307,12 +1024,8 @@ elif choice == "Weekly Planner":
 
     st.markdown(f"**Week Theme:** {week_theme}")
 
-    # Fetch scheduled activities for the week
-    scheduled = get_scheduled_activities_for_week(week_start.strftime('%Y-%m-%d'))
-    scheduled_by_date = {d.strftime('%Y-%m-%d'): [] for d in week_dates}
-    for sched in scheduled:
-        if sched[1] in scheduled_by_date:
-            scheduled_by_date[sched[1]].append(sched)
+    # Fetch the week's scheduled activities with their full details in one query
+    scheduled_by_date = week_schedule_by_date(week_start_str, [d.strftime('%Y-%m-%d') for d in week_dates])
 
     # Fetch only 'to do' activities for selection
     all_activities = get_todo_activities()
@@ -1324,14 +1037,7 @@ elif choice == "Weekly Planner":
         with cols[i]:
             st.markdown(f"**{day.strftime('%A')}<br>{day.strftime('%Y-%m-%d')}**", unsafe_allow_html=True)
             # List scheduled activities
-            for sched in scheduled_by_date[day.strftime('%Y-%m-%d')]:
-                # Get full activity details for the expandable section
-                conn = sqlite3.connect('activities.db')
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM activities WHERE id = ?', (sched[2],))
-                activity = cursor.fetchone()
-                conn.close()
-                
+            for schedule_id, activity_id, activity in scheduled_by_date[day.strftime('%Y-%m-%d')]:
                 if activity:
                     with st.expander(f"{activity[1]} ({activity[2]}) [ID: {activity[0]}]"):
                         st.write(f"**Description:** {activity[3]}")
@@ -1348,35 +1054,33 @@ elif choice == "Weekly Planner":
                             update_activity(activity[0], activity[1], activity[2], activity[3], activity[4], activity[5], activity[6], to_do, activity[8], activity[9], activity[10])
                             st.rerun()
                         
-                        if st.button("Remove", key=f"remove_{sched[0]}"):
-                            remove_scheduled_activity(sched[0])
+                        if st.button("Remove", key=f"remove_{schedule_id}"):
+                            remove_scheduled_activity(schedule_id)
                             st.rerun()
                 else:
-                    # Fallback if activity not found
-                    st.write(f"- {sched[3]} ({sched[4]}) [ID: {sched[2]}]")
-                    if st.button("Remove", key=f"remove_{sched[0]}"):
-                        remove_scheduled_activity(sched[0])
+                    # The activity was deleted after it was scheduled
+                    st.write(f"- Deleted activity [ID: {activity_id}]")
+                    if st.button("Remove", key=f"remove_{schedule_id}"):
+                        remove_scheduled_activity(schedule_id)
                         st.rerun()
             
             # Add new activity by entering ID or selecting from dropdown
             with st.expander("Add Activity by ID or To-Do Dropdown", expanded=False):
                 activity_id_input = st.text_input(f"Enter activity ID for {day.strftime('%A')}", key=f"idinput_{day}")
-                todo_options = {f"{a[1]} (ID: {a[0]})": a[0] for a in all_activities}
-                selected_dropdown = st.selectbox(f"Or select from To-Do List for {day.strftime('%A')}", ["-"] + list(todo_options.keys()), key=f"dropdown_{day}")
+                selected_dropdown = st.selectbox(f"Or select from To-Do List for {day.strftime('%A')}", ["-"] + list(activity_options.keys()), key=f"dropdown_{day}")
                 if st.button("Schedule", key=f"schedule_{day}"):
                     chosen_id = None
                     if activity_id_input.strip():
                         if activity_id_input.strip().isdigit():
                             activity_id = int(activity_id_input.strip())
-                            all_ids = [a[0] for a in get_activities()]
-                            if activity_id in all_ids:
+                            if activity_exists(activity_id):
                                 chosen_id = activity_id
                             else:
                                 st.error(f"Activity ID {activity_id} does not exist.")
                         else:
                             st.error("Please enter a valid numeric activity ID.")
                     elif selected_dropdown != "-":
-                        chosen_id = todo_options[selected_dropdown]
+                        chosen_id = activity_options[selected_dropdown]
                     else:
                         st.error("Please enter an activity ID or select from the to-do list.")
                     if chosen_id is not None:
@@ -1384,178 +1088,22 @@ elif choice == "Weekly Planner":
                         st.success(f"Scheduled activity ID {chosen_id} for {day.strftime('%A')}")
                         st.rerun()
 
-    # Print feature
+    # Print feature: the PDF renders in a worker process and is cached per schedule
+    plan_context = weekly_plan_context(week_start, week_theme, week_dates, scheduled_by_date)
     if st.button("Generate Printable Weekly Plan"):
-        # Get full activity details for all scheduled activities
-        conn = sqlite3.connect('activities.db')
-        cursor = conn.cursor()
-        
-        # Create HTML content for printing
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Weekly Activity Plan</title>
-            <style>
-                @page {{
-                    margin: 1cm;
-                    @top-center {{
-                        content: "Weekly Activity Plan";
-                        font-size: 10pt;
-                    }}
-                    @bottom-center {{
-                        content: counter(page);
-                        font-size: 10pt;
-                    }}
-                }}
-                body {{
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                }}
-                h1, h2, h3 {{ text-align: center; }}
-                h1 {{ color: #2c3e50; font-size: 24pt; margin-bottom: 20pt; }}
-                h2 {{ color: #34495e; font-size: 18pt; margin-bottom: 15pt; }}
-                h3 {{ color: #2c3e50; font-size: 16pt; margin-top: 20pt; }}
-                .activity {{
-                    margin-left: 20px;
-                    margin-bottom: 15px;
-                    page-break-inside: avoid;
-                }}
-                .activity h4 {{ color: #34495e; font-size: 14pt; }}
-                .supplies {{ margin-left: 20px; }}
-                .instructions {{ margin-left: 20px; }}
-                .day-section {{
-                    page-break-before: always;
-                }}
-                .day-section:first-child {{
-                    page-break-before: avoid;
-                }}
-            </style>
-        </head>
-        <body>
-            <h1>Weekly Activity Plan</h1>
-            <h2>Week of {week_start.strftime('%B %d, %Y')}</h2>
-            <h3>Theme: {week_theme}</h3>
-        """
-        
-        # Add activities by day
-        for day in week_dates:
-            day_str = day.strftime('%Y-%m-%d')
-            html_content += f"""
-            <div class="day-section">
-                <h3>{day.strftime('%A, %B %d')}</h3>
-            """
-            
-            for sched in scheduled_by_date[day_str]:
-                # Get full activity details
-                cursor.execute('SELECT * FROM activities WHERE id = ?', (sched[2],))
-                activity = cursor.fetchone()
-                
-                if activity:
-                    html_content += f"""
-                    <div class="activity">
-                        <h4>{activity[1]} ({activity[2]}) <span style="color: #999; font-size: 10pt;">[ID: {activity[0]}]</span></h4>
-                        <p><strong>Description:</strong> {activity[3]}</p>
-                        <p><strong>Supplies:</strong></p>
-                        <ul class="supplies">
-                    """
-                    
-                    # Add supplies as list items
-                    for supply in activity[4].split(','):
-                        html_content += f"<li>{supply.strip()}</li>"
-                    
-                    html_content += """
-                        </ul>
-                        <p><strong>Instructions:</strong></p>
-                        <ol class="instructions">
-                    """
-                    
-                    # Add instructions as numbered list
-                    for instruction in activity[5].split('\n'):
-                        if instruction.strip():
-                            html_content += f"<li>{instruction.strip()}</li>"
-                    
-                    html_content += """
-                        </ol>
-                    </div>
-                    """
-            
-            html_content += "</div>"
-        
-        html_content += """
-        </body>
-        </html>
-        """
-        
-        # Configure fonts
-        font_config = FontConfiguration()
-        
-        # Create PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            try:
-                # Create a temporary HTML file
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.html', mode='w', encoding='utf-8') as html_tmp:
-                    html_tmp.write(html_content)
-                    html_tmp.flush()
-                    
-                    # Generate PDF from the HTML file
-                    HTML(filename=html_tmp.name).write_pdf(
-                        tmp.name,
-                        font_config=font_config,
-                        stylesheets=[CSS(string='''
-                            @page { 
-                                margin: 1cm;
-                                size: letter;
-                            }
-                            body { 
-                                font-family: Arial, sans-serif;
-                                margin: 0;
-                                padding: 0;
-                            }
-                            .day-section {
-                                page-break-before: always;
-                                margin-top: 20px;
-                            }
-                            .day-section:first-child {
-                                page-break-before: avoid;
-                            }
-                            .activity {
-                                page-break-inside: avoid;
-                                margin-bottom: 20px;
-                            }
-                        ''')]
-                    )
-                    
-                    # Clean up the temporary HTML file
-                    os.unlink(html_tmp.name)
-                
-                # Read the PDF file
-                with open(tmp.name, 'rb') as pdf_file:
-                    pdf_bytes = pdf_file.read()
-                
-                # Clean up the temporary PDF file
-                os.unlink(tmp.name)
-                
-                # Create a download button for the PDF file
-                st.download_button(
-                    label="Download Weekly Plan PDF",
-                    data=pdf_bytes,
-                    file_name=f"weekly_plan_{week_start.strftime('%Y%m%d')}.pdf",
-                    mime="application/pdf"
-                )
-                
-            except Exception as e:
-                st.error(f"Error generating PDF: {str(e)}")
-                # Display the HTML content for debugging
-                st.markdown("### Debug: HTML Content")
-                st.code(html_content)
-        
+        st.session_state.weekly_plan_pdf = pdf_key('weekly_plan.html', plan_context)
+
+    if st.session_state.get('weekly_plan_pdf') == pdf_key('weekly_plan.html', plan_context):
+        # No-op once the PDF is cached or already rendering
+        pdf_renderer.submit('weekly_plan.html', plan_context)
+        rendering = show_pdf_download('weekly_plan_pdf', "Download Weekly Plan PDF",
+                                      f"weekly_plan_{week_start.strftime('%Y%m%d')}.pdf")
         # Display a preview of the HTML content
         st.markdown("### Preview of Weekly Plan")
-        st.markdown(html_content, unsafe_allow_html=True)
-        
-        conn.close()
+        st.markdown(render_html('weekly_plan.html', plan_context), unsafe_allow_html=True)
+        if rendering:
+            time.sleep(PDF_POLL_SECONDS)
+            st.rerun()
 
 elif choice == "Weekly Supply List":
     colored_header(label="Weekly Supply List", description="Aggregate and print supplies for all activities in a week", color_name="green-70")
@@ -1610,7 +1158,7 @@ elif choice == "Weekly Supply List":
                 st.write(f"• **{title}** ({act_type}) - {day_name}")
         
         # Aggregate supplies
-        categorized_supplies = aggregate_weekly_supplies(scheduled_activities)
+        categorized_supplies = aggregate_supplies(week_start_str, week_end(week_start_str))
         
         # Display aggregated supplies
         st.markdown("### Aggregated Supply List")
@@ -1634,159 +1182,66 @@ elif choice == "Weekly Supply List":
         st.markdown("---")
         st.markdown("### Print-Friendly Checklist")
         
+        supply_context = supply_list_context(week_start, week_theme, scheduled_activities, categorized_supplies)
         if st.button("Generate Printable Supply List"):
-            # Create HTML for printing
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>Weekly Supply List</title>
-                <style>
-                    @page {{
-                        margin: 1cm;
-                        @top-center {{
-                            content: "Weekly Supply List";
-                            font-size: 10pt;
-                        }}
-                        @bottom-center {{
-                            content: counter(page);
-                            font-size: 10pt;
-                        }}
-                    }}
-                    body {{
-                        font-family: Arial, sans-serif;
-                        line-height: 1.6;
-                        color: #333;
-                    }}
-                    h1, h2 {{ text-align: center; }}
-                    h1 {{ color: #2c3e50; font-size: 24pt; margin-bottom: 10pt; }}
-                    h2 {{ color: #34495e; font-size: 16pt; margin-bottom: 20pt; }}
-                    h3 {{ 
-                        color: #2c3e50; 
-                        font-size: 14pt; 
-                        margin-top: 20pt;
-                        border-bottom: 2px solid #3498db;
-                        padding-bottom: 5pt;
-                    }}
-                    .supply-item {{
-                        margin: 8px 0;
-                        padding: 5px;
-                        border-bottom: 1px dotted #ccc;
-                    }}
-                    .checkbox {{
-                        display: inline-block;
-                        width: 16px;
-                        height: 16px;
-                        border: 2px solid #333;
-                        margin-right: 10px;
-                        vertical-align: middle;
-                    }}
-                    .supply-name {{
-                        vertical-align: middle;
-                    }}
-                    .multi-use {{
-                        color: #e74c3c;
-                        font-size: 10pt;
-                        font-style: italic;
-                    }}
-                    .category {{
-                        page-break-inside: avoid;
-                    }}
-                    @media print {{
-                        .no-print {{ display: none; }}
-                    }}
-                </style>
-            </head>
-            <body>
-                <h1>Weekly Supply List</h1>
-                <h2>Week of {week_start.strftime('%B %d, %Y')}</h2>
-            """
-            
-            if week_theme:
-                html_content += f"""
-                <p style="text-align: center; font-style: italic; color: #7f8c8d;">Theme: {week_theme}</p>
-                """
-            
-            # Add activities summary
-            html_content += """
-                <h3>Scheduled Activities</h3>
-                <ul>
-            """
-            for activity in scheduled_activities:
-                activity_id, title, act_type, supplies_text, scheduled_date = activity
-                day_name = datetime.datetime.strptime(scheduled_date, '%Y-%m-%d').strftime('%A')
-                html_content += f"    <li><strong>{title}</strong> ({act_type}) - {day_name}</li>\n"
-            html_content += "</ul>\n"
-            
-            # Add supplies by category
-            html_content += f"""
-                <h3>Supply Checklist ({total_items} items)</h3>
-            """
-            
-            for category, items in categorized_supplies.items():
-                html_content += f"""
-                <div class="category">
-                    <h3>{category} ({len(items)} items)</h3>
-                """
-                for item in items:
-                    multi_use = f" <span class='multi-use'>(×{item['count']})</span>" if item['count'] > 1 else ""
-                    html_content += f"""
-                    <div class="supply-item">
-                        <span class="checkbox"></span>
-                        <span class="supply-name">{item['original']}{multi_use}</span>
-                    </div>
-                    """
-                html_content += "</div>\n"
-            
-            html_content += """
-            </body>
-            </html>
-            """
-            
-            # Configure fonts and generate PDF
-            font_config = FontConfiguration()
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-                try:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.html', mode='w', encoding='utf-8') as html_tmp:
-                        html_tmp.write(html_content)
-                        html_tmp.flush()
-                        
-                        HTML(filename=html_tmp.name).write_pdf(
-                            tmp.name,
-                            font_config=font_config,
-                            stylesheets=[CSS(string='''
-                                @page { 
-                                    margin: 1cm;
-                                    size: letter;
-                                }
-                                body { 
-                                    font-family: Arial, sans-serif;
-                                    margin: 0;
-                                    padding: 0;
-                                }
-                            ''')]
-                        )
-                        os.unlink(html_tmp.name)
-                    
-                    with open(tmp.name, 'rb') as pdf_file:
-                        pdf_bytes = pdf_file.read()
-                    
-                    os.unlink(tmp.name)
-                    
-                    st.download_button(
-                        label="📥 Download Supply List PDF",
-                        data=pdf_bytes,
-                        file_name=f"weekly_supplies_{week_start.strftime('%Y%m%d')}.pdf",
-                        mime="application/pdf"
-                    )
-                    
-                except Exception as e:
-                    st.error(f"Error generating PDF: {str(e)}")
-            
+            st.session_state.supply_list_pdf = pdf_key('supply_list.html', supply_context)
+
+        if st.session_state.get('supply_list_pdf') == pdf_key('supply_list.html', supply_context):
+            # No-op once the PDF is cached or already rendering
+            pdf_renderer.submit('supply_list.html', supply_context)
+            rendering = show_pdf_download('supply_list_pdf', "📥 Download Supply List PDF",
+                                          f"weekly_supplies_{week_start.strftime('%Y%m%d')}.pdf")
             # Show preview
             st.markdown("### Preview")
-            st.markdown(html_content, unsafe_allow_html=True)
+            st.markdown(render_html('supply_list.html', supply_context), unsafe_allow_html=True)
+            if rendering:
+                time.sleep(PDF_POLL_SECONDS)
+                st.rerun()
+
+elif choice == "Supply Forecast":
+    colored_header(label="Supply Forecast", description="Supplies needed across a range of weeks, for purchasing ahead", color_name="blue-70")
+    today = datetime.date.today()
+    start_of_week = today - datetime.timedelta(days=today.weekday())
+    col1, col2 = st.columns(2)
+    with col1:
+        range_start = st.date_input("From", value=start_of_week, key="forecast_start")
+    with col2:
+        range_end = st.date_input("To", value=start_of_week + datetime.timedelta(weeks=8, days=-1), key="forecast_end")
+
+    if range_end < range_start:
+        st.error("The end date must be on or after the start date.")
+    else:
+        range_start_str = range_start.strftime('%Y-%m-%d')
+        range_end_str = range_end.strftime('%Y-%m-%d')
+        weeks, forecast = supply_forecast(range_start_str, range_end_str)
+        if not forecast:
+            st.info("No supplies needed for activities scheduled in this range. Go to Weekly Planner to add activities.")
+        else:
+            total_items = sum(len(items) for items in forecast.values())
+            st.write(f"**Unique supplies:** {total_items} across {len(weeks)} weeks")
+            for category, items in forecast.items():
+                with st.expander(f"📦 {category} ({len(items)} items)", expanded=True):
+                    st.dataframe(
+                        # One column per week, headed by its Monday
+                        [dict(zip(["Supply", "Total"] + weeks, [item['original'], item['count']] + item['weeks']))
+                         for item in items],
+                        use_container_width=True
+                    )
+
+            file_stem = f"supply_forecast_{range_start.strftime('%Y%m%d')}_{range_end.strftime('%Y%m%d')}"
+            st.download_button(label="📥 Download CSV", data=forecast_csv(weeks, forecast),
+                               file_name=f"{file_stem}.csv", mime="text/csv")
+
+            forecast_context = supply_forecast_context(range_start_str, range_end_str, weeks, forecast)
+            if st.button("Generate Printable Forecast"):
+                st.session_state.supply_forecast_pdf = pdf_key('supply_forecast.html', forecast_context)
+
+            if st.session_state.get('supply_forecast_pdf') == pdf_key('supply_forecast.html', forecast_context):
+                # No-op once the PDF is cached or already rendering
+                pdf_renderer.submit('supply_forecast.html', forecast_context)
+                if show_pdf_download('supply_forecast_pdf', "📥 Download Forecast PDF", f"{file_stem}.pdf"):
+                    time.sleep(PDF_POLL_SECONDS)
+                    st.rerun()
 
 # Add a footer
 st.markdown("---")
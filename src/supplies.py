@@ -0,0 +1,315 @@
+import csv
+import datetime
+import io
+import json
+import re
+import threading
+import time
+from collections import Counter
+
+from activity_db import fetch_all, fetch_one, transaction
+
+# Rebuild the matcher at least this often even if available_supplies looks unchanged
+MATCHER_TTL_SECONDS = 300
+UNCATEGORIZED = 'Uncategorized'
+
+# Words that say nothing about what the supply is
+STOPWORDS = {'a', 'an', 'and', 'for', 'of', 'or', 'the', 'to', 'with'}
+
+
+def normalize_supply_name(supply):
+    """Normalize a supply name for de-duplication."""
+    # Convert to lowercase, strip whitespace, remove common pluralization differences
+    normalized = supply.lower().strip()
+    # Remove trailing 's' for basic de-duplication (paper vs papers)
+    if normalized.endswith('s') and len(normalized) > 3:
+        normalized = normalized[:-1]
+    return normalized
+
+
+def supply_tokens(supply):
+    """Lowercased words of a supply name, singularized the same way as normalize_supply_name."""
+    tokens = []
+    for word in re.findall(r'[a-z0-9]+', supply.lower()):
+        if word in STOPWORDS:
+            continue
+        if word.endswith('s') and len(word) > 3:
+            word = word[:-1]
+        tokens.append(word)
+    return tuple(dict.fromkeys(tokens))
+
+
+# Item separators; commas and semicolons inside parentheses ("paint (red, blue)") don't split
+SEPARATORS = ',;\n•'
+# Bullets and list numbering at the start of an item: "- glue", "* tape", "1. scissors", "2) yarn"
+LEADING_BULLET = re.compile(r'^(?:[-*•·]+|\d+[.)])\s+')
+# A count at the start of an item: "2 glue sticks", "1-2 cups flour", "10x paper plates"
+LEADING_QUANTITY = re.compile(r'^(\d+(?:\s*[-/.]\s*\d+)?)\s*(?:x\s+)?')
+PARENTHESES = re.compile(r'\([^)]*\)?')
+
+
+def split_supplies(supplies_text):
+    """Split supplies text on every separator it uses, not only the first one found."""
+    items, current, depth = [], [], 0
+    for char in supplies_text:
+        if char == '(':
+            depth += 1
+        elif char == ')' and depth:
+            depth -= 1
+        if char in SEPARATORS and (depth == 0 or char == '\n'):
+            items.append(''.join(current))
+            current = []
+            depth = 0
+        else:
+            current.append(char)
+    items.append(''.join(current))
+    return items
+
+
+def parse_supply_items(supplies_text):
+    """Parse supplies text into [(name, raw, quantity)].
+
+    ``raw`` is the item as written, ``name`` drops bullets, the leading count
+    and anything in parentheses, and ``quantity`` is the leading count or a
+    parenthesized amount such as "(10 sheets)", else None.
+    """
+    if not supplies_text:
+        return []
+    parsed = []
+    for item in split_supplies(supplies_text):
+        raw = LEADING_BULLET.sub('', item.strip()).strip()
+        quantity = None
+        match = LEADING_QUANTITY.match(raw)
+        if match:
+            quantity = match.group(1)
+            raw_name = raw[match.end():]
+        else:
+            raw_name = raw
+        for group in PARENTHESES.findall(raw_name):
+            if quantity is None and any(c.isdigit() for c in group):
+                quantity = group.strip('() ')
+        name = ' '.join(PARENTHESES.sub(' ', raw_name).split()).strip(' .:-*')
+        if len(name) > 1:
+            parsed.append((name, raw, quantity))
+    return parsed
+
+
+class SupplyMatcher:
+    """Finds the inventory category of a free-text supply name.
+
+    An exact match on the normalized name wins. Otherwise the inventory items
+    are looked up through an inverted index from token to item, so only items
+    sharing a word with the supply are considered. An item matches when its
+    words are all in the supply ("glue" for "glue sticks") or the supply's
+    words are all in the item ("marker" for "washable markers"). The item with
+    the highest share of common words wins, earlier inventory rows on ties.
+    """
+
+    def __init__(self, rows):
+        self.exact = {}
+        self.item_tokens = []
+        self.item_categories = []
+        self.postings = {}
+        for category, item in rows:
+            if not item:
+                continue
+            self.exact[normalize_supply_name(item)] = category
+            self.exact[item.lower().strip()] = category
+            tokens = supply_tokens(item)
+            if not tokens:
+                continue
+            index = len(self.item_tokens)
+            self.item_tokens.append(tokens)
+            self.item_categories.append(category)
+            for token in tokens:
+                self.postings.setdefault(token, []).append(index)
+
+    def match(self, supply):
+        category = self.exact.get(normalize_supply_name(supply))
+        if category is not None:
+            return category
+        tokens = supply_tokens(supply)
+        shared = Counter()
+        for token in tokens:
+            shared.update(self.postings.get(token, ()))
+        best, best_score = None, 0.0
+        for index, common in shared.items():
+            item_size = len(self.item_tokens[index])
+            if common != item_size and common != len(tokens):
+                continue
+            score = common / (item_size + len(tokens) - common)
+            if score > best_score or (score == best_score and index < best):
+                best, best_score = index, score
+        return self.item_categories[best] if best is not None else UNCATEGORIZED
+
+
+class SupplyMatcherCache:
+    """Keeps one SupplyMatcher per version of available_supplies (row count and max id)."""
+
+    def __init__(self, ttl=MATCHER_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._matcher = None
+        self._signature = None
+        self._loaded_at = 0.0
+
+    def matcher(self):
+        signature = tuple(fetch_one('SELECT COUNT(*), MAX(id) FROM available_supplies'))
+        with self._lock:
+            if self._matcher is None or signature != self._signature or time.time() - self._loaded_at > self.ttl:
+                self._matcher = SupplyMatcher(fetch_all('SELECT category, item FROM available_supplies ORDER BY id'))
+                self._signature = signature
+                self._loaded_at = time.time()
+            return self._matcher
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_supply_matcher():
+    """The SupplyMatcher for the current contents of available_supplies."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SupplyMatcherCache()
+    return _default_cache.matcher()
+
+
+def sync_activity_supplies():
+    """Parse the supplies of queued activities into activity_supplies; returns how many were parsed."""
+    if fetch_one('SELECT 1 FROM activity_supplies_pending LIMIT 1') is None:
+        return 0
+    with transaction() as conn:
+        if not conn.in_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+        rows = conn.execute('''
+            SELECT a.id, a.supplies FROM activity_supplies_pending p JOIN activities a ON a.id = p.activity_id
+        ''').fetchall()
+        conn.execute('''
+            DELETE FROM activity_supplies WHERE activity_id IN (SELECT activity_id FROM activity_supplies_pending)
+        ''')
+        conn.executemany(
+            'INSERT INTO activity_supplies (activity_id, position, supply_key, name, raw, quantity) VALUES (?, ?, ?, ?, ?, ?)',
+            [(activity_id, position, normalize_supply_name(name), name, raw, quantity)
+             for activity_id, supplies_text in rows
+             for position, (name, raw, quantity) in enumerate(parse_supply_items(supplies_text))])
+        conn.execute('DELETE FROM activity_supplies_pending')
+    return len(rows)
+
+
+def supplies_by_activity(activity_ids):
+    """{activity_id: [raw item, ...]} in the order the items were written."""
+    sync_activity_supplies()
+    by_activity = {activity_id: [] for activity_id in activity_ids}
+    if not by_activity:
+        return by_activity
+    placeholders = ', '.join('?' for _ in by_activity)
+    for activity_id, raw in fetch_all(f'''
+        SELECT activity_id, raw FROM activity_supplies
+        WHERE activity_id IN ({placeholders}) ORDER BY activity_id, position
+    ''', list(by_activity)):
+        by_activity[activity_id].append(raw)
+    return by_activity
+
+
+def aggregate_supplies(start_date, end_date, matcher=None):
+    """Supplies needed by the activities scheduled between two dates, de-duplicated and categorized.
+
+    Returns {category: [{'original', 'count', 'activities', 'category'}]},
+    categories alphabetical with Uncategorized last and items by count. The
+    counting is one GROUP BY over the schedule; only the distinct supplies are
+    matched against the inventory.
+    """
+    sync_activity_supplies()
+    if matcher is None:
+        matcher = get_supply_matcher()
+    rows = fetch_all('''
+        SELECT sp.supply_key, MIN(sp.name), COUNT(*), json_group_array(DISTINCT a.title)
+        FROM activity_schedule s
+        JOIN activity_supplies sp ON sp.activity_id = s.activity_id
+        JOIN activities a ON a.id = s.activity_id
+        WHERE s.scheduled_date BETWEEN ? AND ?
+        GROUP BY sp.supply_key
+    ''', (start_date, end_date))
+
+    return group_by_category([{
+        'original': name,
+        'count': count,
+        'activities': json.loads(titles),
+        'category': matcher.match(name),
+    } for supply_key, name, count, titles in rows])
+
+
+def group_by_category(items):
+    """{category: items} with categories alphabetical and Uncategorized last, items by count then name."""
+    categorized = {}
+    for item in items:
+        categorized.setdefault(item['category'], []).append(item)
+
+    # Sort within each category by count (descending) then alphabetically
+    for category in categorized:
+        categorized[category].sort(key=lambda x: (-x['count'], x['original']))
+
+    # Sort categories: put Uncategorized last
+    sorted_categories = sorted([c for c in categorized.keys() if c != UNCATEGORIZED])
+    if UNCATEGORIZED in categorized:
+        sorted_categories.append(UNCATEGORIZED)
+
+    return {cat: categorized[cat] for cat in sorted_categories}
+
+
+def week_starts(start_date, end_date):
+    """The Monday (YYYY-MM-DD) of every week that overlaps the date range."""
+    start = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
+    monday = start - datetime.timedelta(days=start.weekday())
+    weeks = []
+    while monday <= end:
+        weeks.append(monday.strftime('%Y-%m-%d'))
+        monday += datetime.timedelta(days=7)
+    return weeks
+
+
+def supply_forecast(start_date, end_date, matcher=None):
+    """Supply counts across a date range with a per-week breakdown, for purchasing ahead.
+
+    Returns (weeks, categorized): ``weeks`` lists the Monday of every week in
+    the range and ``categorized`` is shaped like aggregate_supplies() with a
+    'weeks' list of counts per item, aligned with ``weeks``. Counting is a
+    single GROUP BY over the schedule's date index, bucketed by week in SQL.
+    """
+    sync_activity_supplies()
+    if matcher is None:
+        matcher = get_supply_matcher()
+    weeks = week_starts(start_date, end_date)
+    week_index = {week: index for index, week in enumerate(weeks)}
+    items = {}
+    for supply_key, name, week, count in fetch_all('''
+        SELECT sp.supply_key, MIN(sp.name), date(s.scheduled_date, '-6 days', 'weekday 1'), COUNT(*)
+        FROM activity_schedule s
+        JOIN activity_supplies sp ON sp.activity_id = s.activity_id
+        WHERE s.scheduled_date BETWEEN ? AND ?
+        GROUP BY sp.supply_key, 3
+    ''', (start_date, end_date)):
+        item = items.get(supply_key)
+        if item is None:
+            item = items[supply_key] = {'original': name, 'count': 0, 'weeks': [0] * len(weeks)}
+        # Keep one display name per supply across weeks
+        item['original'] = min(item['original'], name)
+        item['count'] += count
+        item['weeks'][week_index[week]] += count
+    for item in items.values():
+        item['category'] = matcher.match(item['original'])
+    return weeks, group_by_category(items.values())
+
+
+def forecast_csv(weeks, categorized):
+    """CSV text of a supply_forecast() result: one row per supply with a column per week."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Category', 'Supply', 'Total'] + [f'Week of {week}' for week in weeks])
+    for category, items in categorized.items():
+        for item in items:
+            writer.writerow([category, item['original'], item['count']] + item['weeks'])
+    return output.getvalue()
@@ -0,0 +1,181 @@
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from activity_db import fetch_all
+from dedup import normalize_rows
+from embeddings import activity_text
+
+# 'tfidf' works offline; 'embedding' reuses the cached activity embeddings (new texts need the API once)
+TYPE_CLASSIFIER_FEATURES = os.getenv('TYPE_CLASSIFIER_FEATURES', 'tfidf')
+# Answers whose best class beats the runner-up by less than this cosine margin go to the LLM
+TYPE_CLASSIFIER_MARGIN = float(os.getenv('TYPE_CLASSIFIER_MARGIN', '0.05'))
+
+# Words too common in activity write-ups to say anything about the type
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'each', 'for', 'from', 'have', 'in', 'into', 'is', 'it',
+    'its', 'of', 'on', 'or', 'that', 'the', 'their', 'them', 'then', 'they', 'this', 'to', 'will', 'with', 'your',
+    'you', 'child', 'children', 'kid', 'kids', 'student', 'students', 'activity',
+}
+
+
+def classifier_text(title, description, supplies, instructions):
+    """The text an activity is classified by; the same text the vector index embeds."""
+    return activity_text(title, description, supplies, instructions)
+
+
+def tokens(text):
+    words = []
+    for word in re.findall(r'[a-z]+', text.lower()):
+        if len(word) < 3 or word in STOPWORDS:
+            continue
+        if word.endswith('s') and len(word) > 4:
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+class TfidfFeatures:
+    """Sublinear TF-IDF over the training vocabulary, L2-normalized rows."""
+
+    def __init__(self, min_df=2):
+        self.min_df = min_df
+        self.vocabulary = {}
+        self.idf = None
+
+    def fit(self, texts):
+        document_frequency = Counter()
+        for text in texts:
+            document_frequency.update(set(tokens(text)))
+        terms = sorted(term for term, count in document_frequency.items() if count >= self.min_df)
+        self.vocabulary = {term: index for index, term in enumerate(terms)}
+        self.idf = np.array([math.log((1 + len(texts)) / (1 + document_frequency[term])) + 1 for term in terms],
+                            dtype=np.float32)
+        return self
+
+    def transform(self, texts):
+        matrix = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term, count in Counter(tokens(text)).items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    matrix[row, column] = 1 + math.log(count)
+        return normalize_rows(matrix * self.idf)
+
+
+class EmbeddingFeatures:
+    """Activity embeddings from the shared client, so texts already indexed come from the embedding cache."""
+
+    def __init__(self, client=None):
+        self.client = client
+
+    def fit(self, texts):
+        return self
+
+    def transform(self, texts):
+        if self.client is None:
+            from embeddings import get_embedding_client
+            self.client = get_embedding_client()
+        return normalize_rows(self.client.embed_many(texts))
+
+
+def make_features(kind=None):
+    kind = kind or TYPE_CLASSIFIER_FEATURES
+    if kind == 'tfidf':
+        return TfidfFeatures()
+    if kind == 'embedding':
+        return EmbeddingFeatures()
+    raise ValueError(f"Unknown TYPE_CLASSIFIER_FEATURES: {kind}")
+
+
+class TypeClassifier:
+    """Nearest-centroid activity type classifier.
+
+    Each label's centroid is the normalized mean of its examples' feature
+    rows; ``prototypes`` adds hand-written example texts, which lets a label
+    with few or no labeled activities (Field Trip) still get a centroid. A
+    prediction's margin is how much closer the text is to the winning centroid
+    than to the runner-up; small margins are the ones worth asking an LLM.
+    """
+
+    def __init__(self, features=None):
+        self.features = features if features is not None else make_features()
+        self.labels = []
+        self.centroids = None
+
+    def fit(self, texts, labels, prototypes=None):
+        texts, labels = list(texts), list(labels)
+        self._example_count = len(texts)
+        for label, examples in (prototypes or {}).items():
+            texts.extend(examples)
+            labels.extend([label] * len(examples))
+        self.features.fit(texts)
+        self._matrix = self.features.transform(texts)
+        self.labels = sorted(set(labels))
+        self._label_rows = np.array([self.labels.index(label) for label in labels])
+        self._sums = np.stack([self._matrix[self._label_rows == index].sum(axis=0)
+                               for index in range(len(self.labels))])
+        self.centroids = normalize_rows(self._sums)
+        return self
+
+    def scores(self, texts):
+        """Cosine similarity of each text to each centroid, columns in ``labels`` order."""
+        return self.features.transform(list(texts)) @ self.centroids.T
+
+    def leave_one_out_scores(self):
+        """scores() for the labeled texts passed to fit, each against its own label's centroid without it.
+
+        Scoring a training row against a centroid it helped build overstates
+        how sure the classifier is; this is the honest score for rows that are
+        classified and trained on at the same time. Prototypes are not scored.
+        """
+        matrix = self._matrix[:self._example_count]
+        label_rows = self._label_rows[:self._example_count]
+        scores = matrix @ self.centroids.T
+        own = normalize_rows(self._sums[label_rows] - matrix)
+        scores[np.arange(len(matrix)), label_rows] = (matrix * own).sum(axis=1)
+        return scores
+
+    def rank(self, scores):
+        """[(label, margin)] for each row of a scores() matrix."""
+        order = np.argsort(-scores, axis=1)
+        predictions = []
+        for row, ranked in zip(scores, order):
+            runner_up = row[ranked[1]] if len(ranked) > 1 else 0.0
+            predictions.append((self.labels[ranked[0]], float(row[ranked[0]] - runner_up)))
+        return predictions
+
+    def predict(self, texts):
+        """[(label, margin)] for each text."""
+        if not texts:
+            return []
+        return self.rank(self.scores(texts))
+
+
+def labeled_activities(labels):
+    """(ids, texts, labels) for the activities whose type is one of ``labels``."""
+    placeholders = ', '.join('?' for _ in labels)
+    rows = fetch_all(f'''
+        SELECT id, title, description, supplies, instructions, type FROM activities WHERE type IN ({placeholders})
+    ''', list(labels))
+    return ([row[0] for row in rows], [classifier_text(*row[1:5]) for row in rows], [row[5] for row in rows])
+
+
+def train_type_classifier(labels, prototypes=None, features=None):
+    """Fit a TypeClassifier on the catalog's activities already typed as one of ``labels``."""
+    _, texts, row_labels = labeled_activities(labels)
+    return TypeClassifier(features).fit(texts, row_labels, prototypes)
+
+
+def split_by_confidence(predictions, margin=TYPE_CLASSIFIER_MARGIN):
+    """Split [(key, (label, margin))] into ({key: label} decided locally, [keys] to escalate)."""
+    decided, uncertain = {}, []
+    for key, (label, label_margin) in predictions:
+        if label_margin >= margin:
+            decided[key] = label
+        else:
+            uncertain.append(key)
+    return decided, uncertain
@@ -1,20 +1,24 @@
 import streamlit as st
-import sqlite3
 import os
+import sys
 from openai import OpenAI
 from pinecone import Pinecone
 from dotenv import load_dotenv
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import execute, fetch_one
+from migrations import migrate
+from vector_index import PineconeVectorStore
+from vector_sync import drain_outbox
+
 # Load environment variables
 load_dotenv()
 
 # Initialize Pinecone client
 pinecone_client = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
 pinecone_index = pinecone_client.Index(os.getenv('PINECONE_INDEX_NAME'))
-
-# Connect to the SQLite database
-conn = sqlite3.connect('activities.db')
-cursor = conn.cursor()
+migrate()
 
 # Streamlit app
 st.title('Delete Activity by ID')
@@ -26,8 +30,7 @@ if st.button('Search'):
     if activity_id:
         # Query the database
         query = "SELECT * FROM activities WHERE id = ?"
-        cursor.execute(query, (activity_id,))
-        result = cursor.fetchone()
+        result = fetch_one(query, (activity_id,))
 
         # If result is found, display it
         if result:
@@ -39,19 +42,18 @@ if st.button('Search'):
 
             # Button to delete the activity
             if st.button('Delete Activity'):
-                # Delete from SQLite database
+                # Delete from SQLite database; the delete trigger queues the Pinecone delete
                 delete_query = "DELETE FROM activities WHERE id = ?"
-                cursor.execute(delete_query, (activity_id,))
-                conn.commit()
+                execute(delete_query, (activity_id,))
 
                 # Delete from Pinecone
-                pinecone_index.delete(ids=[activity_id])
-
-                st.success('Activity and its corresponding vector store deleted successfully!')
+                try:
+                    drain_outbox(PineconeVectorStore(pinecone_index))
+                    st.success('Activity and its corresponding vector store deleted successfully!')
+                except Exception as e:
+                    st.success('Activity deleted from the database.')
+                    st.warning(f"Pinecone is not updated yet; the delete stays queued and will be retried: {str(e)}")
         else:
             st.write('No activity found with the given ID.')
     else:
         st.write('Please enter an activity ID.')
-
-# Close the database connection
-conn.close()
\ No newline at end of file
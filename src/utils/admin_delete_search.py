@@ -1,21 +1,25 @@
+import os
+import sys
 import streamlit as st
 import pandas as pd
-import sqlite3
 
-# Connect to the SQLite database to fetch records
-def fetch_records():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM activities")
-    records = cursor.fetchall()
-    conn.close()
-    return records
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import executemany, fetch_all
+from activity_search import keyword_search
+from migrations import migrate
 
-# Fetch all records from the activities table
-records = fetch_records()
+migrate()
 
-# Convert the fetched records into a DataFrame for display
-records_df = pd.DataFrame(records, columns=['ID', 'Title', 'Type', 'Description', 'Supplies', 'Instructions', 'Source', 'Related_IDs', 'Duplicate_Status'])
+# Look up only the records whose title contains one of the keywords, through the FTS index
+def fetch_records(keyword_list):
+    ids = []
+    for keyword in keyword_list:
+        ids.extend(id for id, _, _ in keyword_search(keyword, top_k=None, columns=('title',)))
+    if not ids:
+        return []
+    placeholders = ', '.join('?' for _ in ids)
+    return fetch_all(f"SELECT id, title, description FROM activities WHERE id IN ({placeholders})", ids)
 
 # Streamlit app
 st.title("Delete Records by Title Keyword")
@@ -24,10 +28,10 @@ st.title("Delete Records by Title Keyword")
 keywords = st.text_input("Enter keywords to search in titles (comma-separated):")
 
 if keywords:
-    keyword_list = [kw.strip().lower() for kw in keywords.split(',')]
+    keyword_list = [kw.strip().lower() for kw in keywords.split(',') if kw.strip()]
     
-    # Filter records based on keywords
-    filtered_records_df = records_df[records_df['Title'].str.lower().str.contains('|'.join(keyword_list))]
+    # Fetch the matching records and sort them by title
+    filtered_records_df = pd.DataFrame(fetch_records(keyword_list), columns=['ID', 'Title', 'Description'])
     filtered_records_df = filtered_records_df.sort_values(by='Title')
     
     if not filtered_records_df.empty:
@@ -40,16 +44,8 @@ if keywords:
         
         # Button to delete selected records
         if st.button("Delete Selected Records"):
-            conn = sqlite3.connect('activities.db')
-            cursor = conn.cursor()
-            
-            # Delete selected records
-            for record_id in selected_ids:
-                cursor.execute("DELETE FROM activities WHERE id = ?", (record_id,))
-            
-            # Commit the changes and close the database connection
-            conn.commit()
-            conn.close()
+            # Delete selected records in a single transaction
+            executemany("DELETE FROM activities WHERE id = ?", [(record_id,) for record_id in selected_ids])
             
             st.success("Selected records have been deleted.")
             st.rerun()
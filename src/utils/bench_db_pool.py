@@ -0,0 +1,73 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import ConnectionPool
+
+# Queries issued by a typical Home + Weekly Planner rerun of streamlit_app.py
+RERUN_QUERIES = [
+    ('SELECT * FROM activities WHERE type = ? ORDER BY RANDOM() LIMIT 2', (activity_type,))
+    for activity_type in ["Art", "Cooking", "Craft", "Group Game", "Physical", "Puzzle", "Science"]
+] + [
+    ('SELECT week_start, week_theme FROM weekly_meta ORDER BY week_start', ()),
+    ('SELECT week_theme FROM weekly_meta WHERE week_start = ?', ('2025-06-16',)),
+    ('''SELECT s.id, s.scheduled_date, a.id, a.title, a.type, a.description
+        FROM activity_schedule s
+        JOIN activities a ON s.activity_id = a.id
+        WHERE s.scheduled_date BETWEEN ? AND ?
+        ORDER BY s.scheduled_date''', ('2025-06-16', '2025-06-22')),
+    ('SELECT * FROM activities WHERE to_do = 1', ()),
+] + [('SELECT * FROM activities WHERE id = ?', (activity_id,)) for activity_id in range(1, 21)]
+
+
+def rerun_per_call_connect(db_path):
+    for query, params in RERUN_QUERIES:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        conn.close()
+
+
+def rerun_pooled(pool):
+    for query, params in RERUN_QUERIES:
+        with pool.connection() as conn:
+            conn.execute(query, params).fetchall()
+
+
+def time_reruns(fn, reruns):
+    start = time.perf_counter()
+    for _ in range(reruns):
+        fn()
+    return (time.perf_counter() - start) / reruns * 1000
+
+
+def main(reruns=200):
+    source = sys.argv[1] if len(sys.argv) > 1 else 'activities.db'
+    if not os.path.exists(source):
+        print(f"Error: Database file not found at {source}")
+        return
+
+    # Work on a copy so the benchmark never touches the real database
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'activities.db')
+        shutil.copy(source, db_path)
+        pool = ConnectionPool(db_path)
+
+        print(f"Simulating {reruns} reruns of {len(RERUN_QUERIES)} queries each...")
+        before = time_reruns(lambda: rerun_per_call_connect(db_path), reruns)
+        after = time_reruns(lambda: rerun_pooled(pool), reruns)
+        pool.close()
+
+    print(f"Per-call sqlite3.connect: {before:.2f} ms per rerun")
+    print(f"Pooled connections:       {after:.2f} ms per rerun")
+    print(f"Speedup:                  {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
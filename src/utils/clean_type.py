@@ -1,13 +1,27 @@
+import argparse
 import os
-import sqlite3
+import sys
 from openai import OpenAI
 from dotenv import load_dotenv
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import execute, executemany, fetch_all
+from jobs import run_job
+from llm_cache import cached_completion
+from migrations import migrate
+from type_classifier import classifier_text, split_by_confidence, train_type_classifier
+
 load_dotenv()
 
-client = OpenAI(
-    api_key=os.getenv('OPENAI_API_KEY')
-)
+_client = None
+
+# Created on first use, so runs that never escalate to the LLM need no API key
+def get_client():
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return _client
 
 def analyze_activity(title, description, supplies):
     prompt = f"""
@@ -20,55 +34,80 @@ def analyze_activity(title, description, supplies):
     What is the most accurate category for this activity? Choose from 'Art', 'Craft', 'Science', 'Cooking', or 'Physical'. Respond only with the word of the type chosen. Do not provide any reasoning or added text.
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        n=1,
-        stop=None,
-        temperature=0.7,
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a helpful assistant."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-    )
-
-    api_response_content = response.choices[0].message.content.strip()
+    def call():
+        response = get_client().chat.completions.create(
+            model="gpt-4o",
+            n=1,
+            stop=None,
+            temperature=0.7,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a helpful assistant."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+        )
+        return response.choices[0].message.content
+
+    # Re-runs over unchanged activities are answered from the LLM cache; answers that are not one of TYPES are not cached
+    api_response_content = cached_completion(
+        "openai", "gpt-4o", prompt, call, system="You are a helpful assistant.",
+        validate=lambda answer: answer.strip() in TYPES).strip()
     print("API Response Content:", api_response_content)
 
     return api_response_content
 
-def update_activity_type(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, title, description, supplies FROM activities WHERE type NOT IN ('Art', 'Craft', 'Science', 'Cooking', 'Physical')")
-    activities = cursor.fetchall()
+TYPES = ['Art', 'Craft', 'Science', 'Cooking', 'Physical']
 
-    for activity in activities:
-        activity_id, title, description, supplies = activity
+def retype(activities, batch):
+    for activity_id in batch:
+        title, description, supplies, _ = activities[activity_id]
         print(f"Processing Activity ID: {activity_id}, Title: {title}")
         new_type = analyze_activity(title, description, supplies)
         print(f"Activity ID: {activity_id}, Title: {title}, Proposed New Type: {new_type}")
-        if new_type in ['Art', 'Craft', 'Science', 'Cooking', 'Physical']:
-            cursor.execute("UPDATE activities SET type = ? WHERE id = ?", (new_type, activity_id))
-            conn.commit()  # Commit changes immediately to ensure data integrity
+        if new_type in TYPES:
+            execute("UPDATE activities SET type = ? WHERE id = ?", (new_type, activity_id))
             print(f"Updated Activity ID: {activity_id}, Title: {title}, New Type: {new_type}")
         else:
             print(f"No update needed for Activity ID: {activity_id}, Title: {title}, as the proposed type '{new_type}' is not valid.")
 
+def classify_locally(activities):
+    """Type what the local classifier is sure about in one statement; returns the ids left for the LLM."""
+    # Trained on the activities that already carry one of the standard types
+    classifier = train_type_classifier(TYPES)
+    predictions = classifier.predict([classifier_text(*fields) for fields in activities.values()])
+    decided, uncertain = split_by_confidence(zip(activities, predictions))
+    executemany("UPDATE activities SET type = ? WHERE id = ?",
+                [(new_type, activity_id) for activity_id, new_type in decided.items()])
+    for activity_id, new_type in decided.items():
+        print(f"Updated Activity ID: {activity_id}, Title: {activities[activity_id][0]}, New Type: {new_type}")
+    print(f"{len(decided)} activities typed locally, {len(uncertain)} uncertain.")
+    return uncertain
+
+def update_activity_type(resume=True, use_llm=True):
+    rows = fetch_all(f"SELECT id, title, description, supplies, instructions FROM activities WHERE type NOT IN ({', '.join('?' for _ in TYPES)})", TYPES)
+    activities = {row[0]: row[1:] for row in rows}
+    uncertain = classify_locally(activities)
+    if not use_llm:
+        print(f"Left {len(uncertain)} uncertain activities unchanged: {uncertain}")
+        return None
+    # Each activity is checkpointed once its type is written, so a rerun picks up where a crash left off
+    return run_job('clean_type', uncertain, lambda batch: retype(activities, batch), resume=resume)
+
 def main():
-    # Connect to the database
-    conn = sqlite3.connect('activities.db')
-    
-    # Update activity types
-    update_activity_type(conn)
-    
-    # Close the database connection
-    conn.close()
+    parser = argparse.ArgumentParser(description="Re-type activities whose type is not one of the standard types.")
+    parser.add_argument('--restart', action='store_true', help="Start over instead of resuming an unfinished run")
+    parser.add_argument('--no-llm', action='store_true', help="Only apply the local classifier; leave uncertain activities as they are")
+    args = parser.parse_args()
+
+    # Creates the jobs tables if this database predates them
+    migrate()
+    update_activity_type(resume=not args.restart, use_llm=not args.no_llm)
     print("Activity types updated successfully.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
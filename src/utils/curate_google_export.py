@@ -1,8 +1,13 @@
 import os
+import sys
 import json
 from openai import OpenAI
 from dotenv import load_dotenv
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_cache import cached_completion
+
 load_dotenv()
 
 client = OpenAI(
@@ -27,24 +32,28 @@ def generate_activities(text_content, filename):
     Output the result as a JSON array, with each activity as a separate object in the array.
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        n=1,
-        stop=None,
-        temperature=0.7,
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a helpful assistant."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-    )
-
-    api_response_content = response.choices[0].message.content
+    def call():
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            n=1,
+            stop=None,
+            temperature=0.7,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a helpful assistant."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+        )
+        return response.choices[0].message.content
+
+    # Re-processing the same export file is answered from the LLM cache; answers without a JSON array are not cached
+    api_response_content = cached_completion("openai", "gpt-4o", prompt, call, system="You are a helpful assistant.",
+                                             validate=lambda answer: extract_activities(answer) is not None)
     print("API Response Content:", api_response_content)
 
     # Save the API response to a JSON file
@@ -55,21 +64,28 @@ def generate_activities(text_content, filename):
         json.dump(api_response_content, json_file, indent=4)
 
     if api_response_content:
-        try:
-            # Extract the valid JSON part from the response content
-            json_start = api_response_content.find("[")
-            json_end = api_response_content.rfind("]") + 1
-            json_content = api_response_content[json_start:json_end]
-
-            return json.loads(json_content)
-        except (json.JSONDecodeError, ValueError) as e:
-            print("Failed to decode JSON from API response:", e)
+        activities = extract_activities(api_response_content)
+        if activities is None:
+            print("Failed to decode JSON from API response.")
             print("API Response Content:", api_response_content)  # Log the actual response content
-            return None
+        return activities
     else:
         print("API response is empty.")
         return None
 
+def extract_activities(api_response_content):
+    """The JSON array in the API response, or None when there is no valid one."""
+    # Extract the valid JSON part from the response content
+    json_start = api_response_content.find("[")
+    json_end = api_response_content.rfind("]") + 1
+    if json_start == -1 or json_end <= json_start:
+        return None
+    try:
+        activities = json.loads(api_response_content[json_start:json_end])
+    except (json.JSONDecodeError, ValueError):
+        return None
+    return activities if isinstance(activities, list) else None
+
 def process_files():
     all_activities = []
     not_applicable_files = []
@@ -1,187 +1,83 @@
-import sqlite3
-import spacy
-import logging
-import numpy as np
-import pickle
+import argparse
 import csv
 import os
+import sys
+import spacy
+
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import fetch_all
+from dedup import SIMILARITY_THRESHOLD, find_similar_pairs, normalize_texts, text_vectors
+from dedup_index import (SPACY_TITLE_KIND, current_change_seq, dirty_activity_ids, load_vectors, refresh_vectors,
+                         set_watermark)
+from migrations import migrate
+
+# Watermark name in dedup_watermarks
+CONSUMER = 'dedupe_sqlite_python'
 
 # Load the spaCy English model with word embeddings
 print("Loading spaCy English model...")
 nlp = spacy.load("en_core_web_lg")
 
-def normalize_text(text):
-    # Process the text using spaCy
-    doc = nlp(text)
-    # Normalize the text by converting to lowercase and removing punctuation
-    normalized_text = " ".join([token.text.lower() for token in doc if not token.is_punct])
-    return normalized_text
+def print_progress(done, total):
+    print(f"Progress: {done / total * 100:.2f}% ({done}/{total})")
 
-def precompute_vectors(texts):
-    vectors = []
-    for text in texts:
-        doc = nlp(text)
-        if doc.vector_norm > 0:
-            vectors.append(doc.vector)
-        else:
-            vectors.append(None)
-    return vectors
+def title_vectors(titles):
+    return text_vectors(nlp, normalize_texts(nlp, titles))
 
-def serialize_vector(vector):
-    return pickle.dumps(vector) if vector is not None else None
-
-def deserialize_vector(blob):
-    return pickle.loads(blob) if blob is not None else None
-
-def semantic_similarity(vec1_blob, vec2_blob):
-    try:
-        vec1 = deserialize_vector(vec1_blob)
-        vec2 = deserialize_vector(vec2_blob)
-        if vec1 is None or vec2 is None:
-            return 0.0
-        vec1 = np.array(vec1)
-        vec2 = np.array(vec2)
-        cosine_sim = np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
-        return float(cosine_sim)
-    except Exception as e:
-        print(f"Error in semantic_similarity function: {str(e)}")
-        print(f"vec1: {vec1}")
-        print(f"vec2: {vec2}")
-        raise e
+def fetch_activities(activity_ids):
+    activities = []
+    for start in range(0, len(activity_ids), 500):
+        chunk = activity_ids[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        activities.extend(fetch_all(
+            f"SELECT id, title, description, supplies, instructions FROM activities WHERE id IN ({placeholders})",
+            chunk))
+    return activities
 
 def main():
-    # Connect to the SQLite database
-    print("Connecting to the SQLite database...")
-    conn = sqlite3.connect("activities.db")
-    cursor = conn.cursor()
-
-    # Normalize the text in each field
-    print("Normalizing text in each field...")
-    cursor.execute(
-        """
-        SELECT id, title, description, supplies, instructions
-        FROM activities
-    """
-    )
-    activities = cursor.fetchall()
+    parser = argparse.ArgumentParser(description="Write potential duplicate activities to a CSV file.")
+    parser.add_argument('--full', action='store_true', help="Recompute every title vector instead of only changed ones")
+    args = parser.parse_args()
 
-    normalized_activities = []
-    titles = []
-    for activity in activities:
-        normalized_activity = [activity[0]]  # ID
-        normalized_title = normalize_text(activity[1])
-        normalized_description = normalize_text(activity[2])
-        normalized_supplies = normalize_text(activity[3])
-        normalized_instructions = normalize_text(activity[4])
-        normalized_activity.extend([normalized_title, normalized_description, normalized_supplies, normalized_instructions])
-        titles.append(normalized_title)
-        normalized_activities.append(normalized_activity)
+    # Only activities added or edited since the last run need new vectors
+    migrate()
+    change_seq = current_change_seq()
+    dirty_ids = dirty_activity_ids(CONSUMER, SPACY_TITLE_KIND, full=args.full)
+    print(f"{len(dirty_ids)} activities changed since the last run.")
+    titles = {activity[0]: activity[1] for activity in fetch_activities(dirty_ids)}
 
-    # Precompute vectors for titles
     print("Precomputing vectors...")
-    title_vectors = precompute_vectors(titles)
-
-    # Create temporary tables for normalized data and vectors
-    print("Creating temporary tables...")
-    cursor.execute(
-        """
-        CREATE TEMPORARY TABLE temp_activities (
-            id INTEGER PRIMARY KEY,
-            title TEXT,
-            description TEXT,
-            supplies TEXT,
-            instructions TEXT,
-            title_vector BLOB
-        )
-    """
-    )
-
-    # Create an index on the temp_activities table
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_temp_activities_id ON temp_activities (id)")
-
-    data = []
-    for i, activity in enumerate(normalized_activities):
-        data.append(activity + [serialize_vector(title_vectors[i])])
-
-    cursor.executemany(
-        """
-        INSERT INTO temp_activities (id, title, description, supplies, instructions, title_vector)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """,
-        data,
-    )
-
-    # Create a custom function for semantic similarity
-    conn.create_function("semantic_similarity", 2, semantic_similarity)
+    recomputed = refresh_vectors(SPACY_TITLE_KIND, titles, title_vectors)
+    print(f"{len(recomputed)} title vector(s) recomputed.")
 
-    # Compare fields using semantic similarity
+    # The CSV is rewritten every run, so compare all stored vectors; only the changed ones were recomputed above
+    ids, vectors = load_vectors(SPACY_TITLE_KIND)
     print("Comparing fields using semantic similarity...")
-    similarity_threshold = 0.8
-
-    # Get the total number of activities
-    cursor.execute("SELECT COUNT(*) FROM temp_activities")
-    total_activities = cursor.fetchone()[0]
-
-    # Set the batch size
-    batch_size = 25
-
-    # Initialize variables for progress tracking
-    processed_activities = 0
-    potential_duplicates = []
-
-    while processed_activities < total_activities:
-        cursor.execute(
-            """
-            SELECT t1.id AS id1, t2.id AS id2,
-                   t1.title AS title1, t1.description AS description1, t1.supplies AS supplies1, t1.instructions AS instructions1,
-                   t2.title AS title2, t2.description AS description2, t2.supplies AS supplies2, t2.instructions AS instructions2,
-                   semantic_similarity(t1.title_vector, t2.title_vector) AS title_similarity
-            FROM temp_activities t1
-            JOIN temp_activities t2 ON t1.id < t2.id
-            WHERE t1.id BETWEEN ? AND ?
-              AND semantic_similarity(t1.title_vector, t2.title_vector) >= ?
-        """,
-            (
-                processed_activities + 1,
-                processed_activities + batch_size,
-                similarity_threshold,
-            ),
-        )
-
-        batch_duplicates = cursor.fetchall()
-        potential_duplicates.extend(batch_duplicates)
-
-        processed_activities += batch_size
-        progress_percentage = (processed_activities / total_activities) * 100
-        print(f"Progress: {progress_percentage:.2f}% ({processed_activities}/{total_activities})")
+    potential_duplicates = find_similar_pairs(ids, vectors, SIMILARITY_THRESHOLD, progress=print_progress)
 
     # Display the number of potential duplicates found
-    num_duplicates = len(potential_duplicates)
-    print(f"Found {num_duplicates} potential duplicate(s).")
+    print(f"Found {len(potential_duplicates)} potential duplicate(s).")
 
-    # Check if the CSV file already exists in the data/ directory and delete if present
-    csv_file_path = "data/potential_duplicates.csv"
-    if os.path.exists(csv_file_path):
-        os.remove(csv_file_path)
+    # Normalize the text of the activities that appear in a pair
+    print("Normalizing text in each field...")
+    paired_ids = sorted({activity_id for pair in potential_duplicates for activity_id in pair[:2]})
+    activities = fetch_activities(paired_ids)
+    # One column per field: titles, descriptions, supplies, instructions
+    fields = [normalize_texts(nlp, [activity[column] for activity in activities]) for column in range(1, 5)]
+    normalized_activities = {activity[0]: values for activity, values in zip(activities, zip(*fields))}
 
+    csv_file_path = "data/potential_duplicates.csv"
     print("Writing potential duplicates to CSV file...")
     with open(csv_file_path, "w", newline='') as csvfile:
-        fieldnames = ['ID1', 'Title1', 'Description1', 'Supplies1', 'Instructions1', 
-                      'ID2', 'Title2', 'Description2', 'Supplies2', 'Instructions2', 'Title Similarity']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-        writer.writeheader()
-        for duplicate in potential_duplicates:
-            id1, id2, title1, description1, supplies1, instructions1, title2, description2, supplies2, instructions2, title_similarity = duplicate
-            writer.writerow({
-                'ID1': id1, 'Title1': title1, 'Description1': description1, 'Supplies1': supplies1, 'Instructions1': instructions1,
-                'ID2': id2, 'Title2': title2, 'Description2': description2, 'Supplies2': supplies2, 'Instructions2': instructions2,
-                'Title Similarity': f"{title_similarity:.2f}"
-            })
-
-    # Close the database connection
-    print("Closing the database connection...")
-    conn.close()
+        writer = csv.writer(csvfile)
+        writer.writerow(['ID1', 'Title1', 'Description1', 'Supplies1', 'Instructions1',
+                         'ID2', 'Title2', 'Description2', 'Supplies2', 'Instructions2', 'Title Similarity'])
+        writer.writerows(
+            [id1, *normalized_activities[id1], id2, *normalized_activities[id2], f"{title_similarity:.2f}"]
+            for id1, id2, title_similarity in potential_duplicates
+        )
+    set_watermark(CONSUMER, change_seq)
 
     print("Deduplication complete.")
 
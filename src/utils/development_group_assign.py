@@ -1,38 +1,62 @@
-import sqlite3
+import argparse
 import os
+import sys
 from dotenv import load_dotenv
 from anthropic import Anthropic
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import executemany, fetch_all
+from jobs import PartialBatchError, RateLimiter, run_job
+from json_stream import parse_json_objects
+from llm import PROVIDER_CONCURRENCY
+from llm_cache import cached_completion
+from migrations import migrate
+
 # Load environment variables
 load_dotenv()
 
 # Initialize Anthropic client
 anthropic_client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-
-def get_activities():
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, title, description, supplies, instructions FROM activities')
-    activities = cursor.fetchall()
-    conn.close()
-    return activities
-
-def update_activity(id, age_group, justification, adaptations):
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('''
+MODEL = "claude-3-5-sonnet-20240620"
+
+# Activities analyzed per request, and the response budget for each of them
+ACTIVITIES_PER_PROMPT = int(os.getenv('DEVELOPMENT_GROUP_BATCH_SIZE', '8'))
+TOKENS_PER_ACTIVITY = 400
+# Requests started per minute across all workers (Anthropic's lowest tier allows 50)
+rate_limiter = RateLimiter(int(os.getenv('ANTHROPIC_REQUESTS_PER_MINUTE', '50')))
+
+# The label stored for each answer, in the format the existing rows use; keyed by how the answer starts
+AGE_GROUPS = {
+    'toddler': 'Toddlers (2-3 years old)',
+    'preschool': 'Preschoolers (3-5 years old)',
+    'school': 'School-age (6-13 years old)',
+}
+
+def get_activities(include_classified=False):
+    query = 'SELECT id, title, description, supplies, instructions FROM activities'
+    if not include_classified:
+        # New activities are saved as 'Not specified' until they are classified
+        query += " WHERE development_age_group IS NULL OR TRIM(development_age_group) IN ('', 'Not specified')"
+    return fetch_all(query)
+
+def update_activities(results):
+    """Write a batch of (age_group, justification, adaptations, id) rows in one statement."""
+    executemany('''
     UPDATE activities
     SET development_age_group = ?, development_group_justification = ?, adaptations = ?
     WHERE id = ?
-    ''', (age_group, justification, adaptations, id))
-    conn.commit()
-    conn.close()
+    ''', results)
 
-def analyze_activity(activity):
-    prompt = f"""
-    You are an AI assistant specializing in early childhood education and development. Your task is to analyze child care activities and categorize them into the most appropriate developmental group. For each activity, you will be given its title, description, list of supplies, and instructions.
+def build_prompt(activities):
+    listed = "\n\n".join(
+        f'ID: {activity[0]}\nActivity: "{activity[1]}"\nDescription: {activity[2]}\nSupplies: {activity[3]}\nInstructions: {activity[4]}'
+        for activity in activities
+    )
+    return f"""
+    You are an AI assistant specializing in early childhood education and development. Your task is to analyze child care activities and categorize them into the most appropriate developmental group. For each activity, you will be given its ID, title, description, list of supplies, and instructions.
 
-    Analyze each component of the activity and categorize it into one of the following groups:
+    Analyze each component of each activity and categorize it into one of the following groups:
     1. Toddlers (2-3 years old)
     2. Preschoolers (3-5 years old)
     3. School-age (6-13 years old)
@@ -47,73 +71,83 @@ def analyze_activity(activity):
     7. Attention span needed
     8. Relevance to developmental milestones
 
-    For the activity, provide:
+    For each activity, provide:
     1. The chosen developmental group (Toddlers, Preschoolers, or School-age)
     2. A brief explanation (2-3 sentences) justifying your choice
     3. Any adaptations that could make the activity suitable for younger or older groups
 
     If an activity seems to span multiple age groups, choose the most appropriate primary group and explain why, noting which elements might be suitable for other age ranges.
 
-    Activity: "{activity[1]}"
-    Description: {activity[2]}
-    Supplies: {activity[3]}
-    Instructions: {activity[4]}
+    {listed}
 
-    Please provide your analysis in the following format:
-    Categorization: [Age Group]
-    Justification: [Your justification]
-    Adaptations: [Your adaptations]
+    Respond with only a JSON array containing one object per activity, in the same order, with these keys:
+    [{{"id": <activity ID>, "age_group": "Toddlers" | "Preschoolers" | "School-age", "justification": "...", "adaptations": "..."}}]
     """
 
-    response = anthropic_client.messages.create(
-        model="claude-3-5-sonnet-20240620",
-        max_tokens=500,
-        temperature=0.7,
-        messages=[{"role": "user", "content": prompt}]
-    )
-
-    return parse_response(response.content[0].text)
-
-def parse_response(response):
-    age_group = "Unknown"
-    justification = "No justification provided"
-    adaptations = "No adaptations provided"
-
-    current_section = None
-    sections = {"Categorization": "", "Justification": "", "Adaptations": ""}
-
-    for line in response.split('\n'):
-        line = line.strip()
-        if line.startswith("Categorization:"):
-            current_section = "Categorization"
-            sections[current_section] = line.split(":", 1)[1].strip()
-        elif line.startswith("Justification:"):
-            current_section = "Justification"
-            sections[current_section] = line.split(":", 1)[1].strip()
-        elif line.startswith("Adaptations:"):
-            current_section = "Adaptations"
-            sections[current_section] = line.split(":", 1)[1].strip()
-        elif current_section:
-            sections[current_section] += " " + line
-
-    age_group = sections["Categorization"]
-    justification = sections["Justification"]
-    adaptations = sections["Adaptations"]
-
-    return age_group, justification, adaptations
+def normalize_age_group(age_group):
+    """The stored label for an answer such as "Preschoolers", or None when it names none of the groups."""
+    for prefix, label in AGE_GROUPS.items():
+        if age_group.strip().lower().startswith(prefix):
+            return label
+    return None
+
+def parse_response(response, activity_ids):
+    """Return ({id: (age_group, justification, adaptations)}, [requested ids left out or given no known age group])."""
+    objects, _ = parse_json_objects(response)
+    results = {}
+    for obj in objects:
+        try:
+            activity_id = int(obj.get('id'))
+        except (TypeError, ValueError):
+            continue
+        age_group = normalize_age_group(str(obj.get('age_group') or ''))
+        if activity_id in activity_ids and age_group:
+            results[activity_id] = (age_group, str(obj.get('justification') or ''), str(obj.get('adaptations') or ''))
+    missing = [activity_id for activity_id in activity_ids if activity_id not in results]
+    return results, missing
+
+def analyze_activities(activities):
+    prompt = build_prompt(activities)
+    activity_ids = [activity[0] for activity in activities]
+
+    def call():
+        rate_limiter.acquire()
+        response = anthropic_client.messages.create(
+            model=MODEL,
+            max_tokens=TOKENS_PER_ACTIVITY * len(activities),
+            temperature=0.7,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.content[0].text
+
+    # Re-runs over unchanged activities are answered from the LLM cache; answers that leave some out are used but not cached
+    text = cached_completion("anthropic", MODEL, prompt, call,
+                             validate=lambda answer: not parse_response(answer, activity_ids)[1])
+    return parse_response(text, activity_ids)
+
+def classify(activities, batch):
+    results, missing = analyze_activities([activities[activity_id] for activity_id in batch])
+    update_activities([(age_group, justification, adaptations, activity_id)
+                       for activity_id, (age_group, justification, adaptations) in results.items()])
+    for activity_id, (age_group, _, _) in results.items():
+        print(f"Updated activity: {activities[activity_id][1]} - {age_group}")
+    if missing:
+        # The job checkpoints the activities written above and asks again about only these
+        raise PartialBatchError(missing, f"No classification returned for activities {missing}")
 
 def main():
-    activities = get_activities()
-    total_activities = len(activities)
-    for index, activity in enumerate(activities, 1):
-        print(f"Analyzing activity {index}/{total_activities}: {activity[1]}")
-        try:
-            age_group, justification, adaptations = analyze_activity(activity)
-            update_activity(activity[0], age_group, justification, adaptations)
-            print(f"Updated activity: {activity[1]} - {age_group}")
-            print(f"Adaptations: {adaptations}")
-        except Exception as e:
-            print(f"Error processing activity {activity[1]}: {str(e)}")
+    parser = argparse.ArgumentParser(description="Assign a developmental age group to activities that have none.")
+    parser.add_argument('--all', action='store_true', help="Reclassify activities that already have an age group")
+    parser.add_argument('--restart', action='store_true', help="Start over instead of resuming an unfinished run")
+    args = parser.parse_args()
+
+    # Creates the jobs tables if this database predates them
+    migrate()
+    activities = {activity[0]: activity for activity in get_activities(include_classified=args.all)}
+    print(f"{len(activities)} activities to classify.")
+    # Several activities per prompt, several prompts in flight; a rerun after a crash skips finished batches
+    run_job('development_group_assign', list(activities), lambda batch: classify(activities, batch),
+            batch_size=ACTIVITIES_PER_PROMPT, workers=PROVIDER_CONCURRENCY['anthropic'], resume=not args.restart)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
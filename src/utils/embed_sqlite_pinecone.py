@@ -1,48 +1,37 @@
+import argparse
 import os
-import sqlite3
-from openai import OpenAI
+import sys
 
-from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import connection, transaction
+from embeddings import activity_text, content_hash, get_embedding_client
+from jobs import run_job
+from migrations import migrate
+from vector_index import get_vector_store
+from vector_sync import record_content_hashes
+
 # Load environment variables from .env file
 load_dotenv()
 
-client = OpenAI(
-    api_key=os.getenv('OPENAI_API_KEY')
-)
-
 # Get API keys and index name from environment variables
-openai_api_key = os.getenv('OPENAI_API_KEY')
 pinecone_api_key = os.getenv('PINECONE_API_KEY')
 pinecone_index_name = os.getenv('PINECONE_INDEX_NAME')
 
-if not openai_api_key or not pinecone_api_key or not pinecone_index_name:
-    raise ValueError("OPENAI_API_KEY, PINECONE_API_KEY, and PINECONE_INDEX_NAME must be set in the environment variables.")
-
-# Initialize OpenAI
+if os.getenv('VECTOR_BACKEND') != 'local' and (not pinecone_api_key or not pinecone_index_name):
+    raise ValueError("PINECONE_API_KEY and PINECONE_INDEX_NAME must be set in the environment variables, or set VECTOR_BACKEND=local to build the local index.")
 
-# Initialize Pinecone
-pc = Pinecone(api_key=pinecone_api_key)
+# Connect to Pinecone, or to the local index next to activities.db when VECTOR_BACKEND=local
+index = get_vector_store()
 
-# Create the Pinecone index if it doesn't exist
-# if pinecone_index_name not in pc.list_indexes().names():
-    # pc.create_index(
-        # name=pinecone_index_name,
-        # dimension=3072,  # Assuming the embedding dimension is 3072
-        # metric="cosine",
-        # spec=ServerlessSpec(
-            # cloud='aws',
-            # region='us-east-1'
-        # )
-    # )
-
-# Connect to the Pinecone index
-index = pc.Index(pinecone_index_name)
+# Pinecone recommends upserting in batches of up to 100 vectors
+UPSERT_BATCH_SIZE = 100
 
 def fetch_activities(conn):
     cursor = conn.cursor()
-    cursor.execute("SELECT id, title, type, description, supplies, instructions, source FROM activities")
+    cursor.execute("SELECT id, title, type, description, supplies, instructions, source, to_do FROM activities")
     activities = cursor.fetchall()
     return [
         {
@@ -52,47 +41,56 @@ def fetch_activities(conn):
             'description': activity[3],
             'supplies': activity[4],
             'instructions': activity[5],
-            'source': activity[6]
+            'source': activity[6],
+            'to_do': bool(activity[7])
         }
         for activity in activities
     ]
 
-def get_embedding(text):
-    response = client.embeddings.create(input=text,
-    model="text-embedding-3-large")
-    return response.data[0].embedding
-
-def embed_activities(conn):
-    activities = fetch_activities(conn)
-    for activity in activities:
-        # Create a combined text from title, description, supplies, and instructions
-        text = (
-            f"Title: {activity['title']}\n"
-            f"Description: {activity['description']}\n"
-            f"Supplies: {activity['supplies']}\n"
-            f"Instructions: {activity['instructions']}"
-        )
-        # Generate embedding for the combined text
-        embedding = get_embedding(text)
-        # Upsert the embedding into Pinecone with the type as metadata
-        index.upsert(vectors=[{
+def embed_batch(activities):
+    # Create a combined text from title, description, supplies, and instructions
+    texts = [
+        activity_text(activity['title'], activity['description'], activity['supplies'], activity['instructions'])
+        for activity in activities
+    ]
+    # Generate the batch's embeddings with a few batched, concurrent requests
+    embeddings = get_embedding_client().embed_many(texts)
+    # Upsert the embeddings into the vector store with the type and to_do flag as metadata
+    index.upsert([
+        {
             "id": str(activity['id']),
             "values": embedding,
-            "metadata": {"type": activity['type']}
-        }])
-        print(f"Embedded and upserted activity ID {activity['id']} with type {activity['type']}")
-    print(f"Total activities embedded and upserted: {len(activities)}")
+            "metadata": {"type": activity['type'], "to_do": activity['to_do']}
+        }
+        for activity, embedding in zip(activities, embeddings)
+    ])
+    # Remember what each vector was built from so later edits that keep the text only update metadata
+    with transaction() as conn:
+        record_content_hashes(conn, [(activity['id'], content_hash(text)) for activity, text in zip(activities, texts)])
+
+def embed_activities(activities, resume=True):
+    activities = {activity['id']: activity for activity in activities}
+    print(f"Embedding {len(activities)} activities...")
+    # One upsert-sized batch per checkpoint; a rerun after a crash skips the batches already upserted
+    job = run_job('embed_sqlite_pinecone', list(activities),
+                  lambda batch: embed_batch([activities[activity_id] for activity_id in batch]),
+                  batch_size=UPSERT_BATCH_SIZE, resume=resume)
+    print(f"Total activities embedded and upserted: {job['done']}")
 
 def main():
-    # Connect to the database
-    conn = sqlite3.connect('activities.db')
+    parser = argparse.ArgumentParser(description="Embed every activity into the vector store.")
+    parser.add_argument('--restart', action='store_true', help="Start over instead of resuming an unfinished run")
+    args = parser.parse_args()
 
-    # Embed activities and store in Pinecone
-    embed_activities(conn)
+    # Creates the content hash and jobs tables if this database predates them
+    migrate()
+    # Connect to the database
+    with connection() as conn:
+        activities = fetch_activities(conn)
+    # Embed activities and store them in the vector store
+    embed_activities(activities, resume=not args.restart)
 
-    # Close the database connection
-    conn.close()
-    print("Activities embedded and stored in Pinecone successfully.")
+    print("Activities embedded and stored in the vector store successfully.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,27 @@
+import argparse
 import os
-import sqlite3
+import sys
 from openai import OpenAI
 from dotenv import load_dotenv
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import execute, fetch_all
+from jobs import run_job
+from llm_cache import cached_completion
+from migrations import migrate
+from type_classifier import TypeClassifier, labeled_activities
+
 load_dotenv()
 
-client = OpenAI(
-    api_key=os.getenv('OPENAI_API_KEY')
-)
+_client = None
+
+# Created on first use, so runs that never escalate to the LLM need no API key
+def get_client():
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return _client
 
 def analyze_activity(title, description):
     prompt = f"""
@@ -20,52 +34,97 @@ def analyze_activity(title, description):
     Respond with 'Field Trip' if it is more accurate, otherwise respond with 'Physical'.
     """
 
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        n=1,
-        stop=None,
-        temperature=0.7,
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a helpful assistant."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-    )
-
-    api_response_content = response.choices[0].message.content.strip()
+    def call():
+        response = get_client().chat.completions.create(
+            model="gpt-3.5-turbo",
+            n=1,
+            stop=None,
+            temperature=0.7,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a helpful assistant."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+        )
+        return response.choices[0].message.content
+
+    # Re-runs over unchanged activities are answered from the LLM cache; anything but the two labels is not cached
+    api_response_content = cached_completion(
+        "openai", "gpt-3.5-turbo", prompt, call, system="You are a helpful assistant.",
+        validate=lambda answer: answer.strip() in ('Field Trip', 'Physical')).strip()
     print("API Response Content:", api_response_content)
 
     return api_response_content
 
-def update_activity_type(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, title, description FROM activities WHERE type = 'Physical'")
-    activities = cursor.fetchall()
+# No activity is typed 'Field Trip' yet, so the local classifier learns the class from these descriptions
+FIELD_TRIP_PROTOTYPES = [
+    "Field trip to the zoo to see and learn about the animals.",
+    "Visit a museum and tour the exhibits with a guide.",
+    "Walk to the public library for story time and to check out books.",
+    "Take a bus to a farm or pumpkin patch and meet the farmer.",
+    "Tour the fire station and meet the firefighters.",
+    "Trip to the aquarium, planetarium or science center.",
+    "Outing to a local park, nature center or botanical garden; bring permission slips and chaperones.",
+    "Visit a bakery, grocery store or post office in the community to see how it works.",
+]
+
+# A Physical activity is kept without asking the LLM only when it scores under FIELD_TRIP_MIN_SCORE against the
+# Field Trip centroid and its Physical score beats that by FIELD_TRIP_MARGIN. Calibrated with the default TF-IDF
+# features on the 170 Physical activities: 24 (14%) go to the LLM, including both real field trips among them
+# (Field Trip scores 0.20 and 0.14); the median score is 0.015.
+FIELD_TRIP_MIN_SCORE = float(os.getenv('FIELD_TRIP_MIN_SCORE', '0.05'))
+FIELD_TRIP_MARGIN = float(os.getenv('FIELD_TRIP_MARGIN', '0.05'))
 
-    for activity in activities:
-        activity_id, title, description = activity
+def retype(activities, batch):
+    for activity_id in batch:
+        title, description = activities[activity_id]
         new_type = analyze_activity(title, description)
         if new_type == 'Field Trip':
-            cursor.execute("UPDATE activities SET type = ? WHERE id = ?", (new_type, activity_id))
+            execute("UPDATE activities SET type = ? WHERE id = ?", (new_type, activity_id))
             print(f"Updated activity ID {activity_id} to 'Field Trip'")
 
-    conn.commit()
+def possible_field_trips():
+    """Ids of the Physical activities that look enough like a field trip to ask the LLM about.
+
+    The rest are clearly Physical and stay as they are. Anything that might be
+    a field trip is escalated rather than moved locally.
+    """
+    ids, texts, labels = labeled_activities(['Physical'])
+    classifier = TypeClassifier().fit(texts, labels, prototypes={'Field Trip': FIELD_TRIP_PROTOTYPES})
+    # The rows being judged are the Physical training set, so each is scored against a centroid built without it
+    scores = classifier.leave_one_out_scores()
+    physical = scores[:, classifier.labels.index('Physical')]
+    field_trip = scores[:, classifier.labels.index('Field Trip')]
+    escalate = [activity_id for activity_id, physical_score, field_trip_score in zip(ids, physical, field_trip)
+                if field_trip_score >= FIELD_TRIP_MIN_SCORE or physical_score - field_trip_score < FIELD_TRIP_MARGIN]
+    print(f"{len(ids) - len(escalate)} activities kept as Physical locally, {len(escalate)} may be field trips.")
+    return escalate
+
+def update_activity_type(resume=True, use_llm=True):
+    rows = fetch_all("SELECT id, title, description FROM activities WHERE type = 'Physical'")
+    activities = {row[0]: row[1:] for row in rows}
+    uncertain = possible_field_trips()
+    if not use_llm:
+        print(f"Left {len(uncertain)} possible field trips unchanged: {uncertain}")
+        return None
+    # Activities that stay Physical still match the query, so checkpoints keep a rerun from asking about them again
+    return run_job('field_trip_type', uncertain, lambda batch: retype(activities, batch), resume=resume)
 
 def main():
-    # Connect to the database
-    conn = sqlite3.connect('activities.db')
-    
-    # Update activity types
-    update_activity_type(conn)
-    
-    # Close the database connection
-    conn.close()
+    parser = argparse.ArgumentParser(description="Move Physical activities that are really field trips to 'Field Trip'.")
+    parser.add_argument('--restart', action='store_true', help="Start over instead of resuming an unfinished run")
+    parser.add_argument('--no-llm', action='store_true', help="Only list the possible field trips; change nothing")
+    args = parser.parse_args()
+
+    # Creates the jobs tables if this database predates them
+    migrate()
+    update_activity_type(resume=not args.restart, use_llm=not args.no_llm)
     print("Activity types updated successfully.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from migrations import migrate
+from vector_sync import drain_outbox, parked_entries, pending_count, reconcile, retry_parked
+
+# Load environment variables from .env file
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the vector index with the activities table.")
+    parser.add_argument('--dry-run', action='store_true', help="Report the differences without repairing them")
+    parser.add_argument('--retry-parked', action='store_true', help="Retry queued changes that ran out of attempts")
+    args = parser.parse_args()
+
+    migrate()
+    for activity_id, operation, attempts, last_error in parked_entries():
+        print(f"Parked {operation} for activity {activity_id} after {attempts} attempts: {last_error}")
+    if args.retry_parked and not args.dry_run:
+        print(f"{retry_parked()} parked change(s) queued again.")
+    if not args.dry_run:
+        print(f"Draining {pending_count()} queued change(s)...")
+        print(f"{drain_outbox()} change(s) applied.")
+
+    print("Comparing activity ids with the vector index...")
+    missing, orphaned = reconcile(dry_run=args.dry_run)
+    print(f"{len(missing)} activities missing from the index, {len(orphaned)} orphaned vector(s).")
+    if args.dry_run:
+        print(f"Missing: {', '.join(missing[:50])}{' ...' if len(missing) > 50 else ''}")
+        print(f"Orphaned: {', '.join(orphaned[:50])}{' ...' if len(orphaned) > 50 else ''}")
+    else:
+        print("Index repaired.")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
 import os
-import sqlite3
+import sys
 from openai import OpenAI
 from pinecone import Pinecone
 from dotenv import load_dotenv
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import connection
+
 # Load environment variables from .env file
 load_dotenv()
 load_dotenv(override=True)
@@ -83,17 +87,12 @@ def main():
     # Perform similarity search and get activity IDs
     activity_ids = search_activities(keyword)
 
-    # Connect to the database
-    conn = sqlite3.connect('activities.db')
-
     # Retrieve activity data from the database
-    activity_data = get_activity_data(conn, activity_ids)
+    with connection() as conn:
+        activity_data = get_activity_data(conn, activity_ids)
 
     # Print the activity data
     print_activity_data(activity_data)
 
-    # Close the database connection
-    conn.close()
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,16 +1,17 @@
 import streamlit as st
-import sqlite3
 import os
-from openai import OpenAI
+import sys
 from pinecone import Pinecone
 from dotenv import load_dotenv
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_ingest import activity_row, ingest_rows
+from vector_index import PineconeVectorStore
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
 # Get API keys and index name from environment variables
 pinecone_api_key = os.getenv('PINECONE_API_KEY')
 pinecone_index_name = os.getenv('PINECONE_INDEX_NAME')
@@ -23,10 +24,7 @@ pc = Pinecone(api_key=pinecone_api_key)
 
 # Connect to the Pinecone index
 index = pc.Index(pinecone_index_name)
-
-def get_embedding(text):
-    response = client.embeddings.create(input=text, model="text-embedding-3-large")
-    return response.data[0].embedding
+vector_store = PineconeVectorStore(index)
 
 def parse_activities(text):
     activities = []
@@ -60,54 +58,6 @@ def parse_activities(text):
 
     return activities
 
-def add_activity(conn, cursor, index, activity):
-    required_fields = ['title', 'type', 'description', 'supplies', 'instructions']
-    
-    # Check if all required fields are present
-    missing_fields = [field for field in required_fields if field not in activity]
-    if missing_fields:
-        raise ValueError(f"Activity is missing required fields: {', '.join(missing_fields)}")
-
-    # Insert the new activity into the database
-    insert_query = """
-    INSERT INTO activities (title, type, description, supplies, instructions, to_do, source)
-    VALUES (?, ?, ?, ?, ?, ?, ?)
-    """
-    cursor.execute(insert_query, (
-        activity['title'],
-        activity.get('type', ''),
-        activity.get('description', ''),
-        activity.get('supplies', ''),
-        activity.get('instructions', ''),
-        True,  # Set to_do to True by default
-        "AI"   # Set source to "AI"
-    ))
-    conn.commit()
-    
-    # Fetch the last inserted activity ID
-    activity_id = cursor.lastrowid
-    
-    # Create a combined text from title, description, supplies, and instructions
-    text = (
-        f"Title: {activity['title']}\n"
-        f"Description: {activity.get('description', '')}\n"
-        f"Supplies: {activity.get('supplies', '')}\n"
-        f"Instructions: {activity.get('instructions', '')}"
-    )
-    
-    # Generate embedding for the combined text
-    embedding = get_embedding(text)
-    
-    # Upsert the embedding into Pinecone with the type as metadata
-    index.upsert(vectors=[{
-        "id": str(activity_id),
-        "values": embedding,
-        "metadata": {
-            "type": activity.get('type', ''),
-            "to_do": True  # Include to_do in metadata
-        }
-    }])
-
 # Streamlit app
 st.title('Bulk Add Activities')
 
@@ -119,23 +69,20 @@ if st.button('Add Activities'):
         # Parse the input into individual activities
         activities = parse_activities(activities_input)
         
-        # Connect to the SQLite database
-        conn = sqlite3.connect('activities.db')
-        cursor = conn.cursor()
-        
-        # Add each activity to the database and Pinecone index
-        success_count = 0
+        # Validate everything, then insert, embed and upsert the valid ones in one batch
+        rows = []
         for activity in activities:
             try:
-                add_activity(conn, cursor, index, activity)
-                success_count += 1
+                rows.append(activity_row(activity))
             except ValueError as e:
                 st.error(f"Error adding activity: {str(e)}")
+
+        success_count = 0
+        if rows:
+            try:
+                success_count = len(ingest_rows(rows, vector_store))
             except Exception as e:
-                st.error(f"Unexpected error adding activity: {str(e)}")
-        
-        # Close the database connection
-        conn.close()
+                st.error(f"Unexpected error adding activities, nothing was saved: {str(e)}")
         
         if success_count > 0:
             st.success(f'{success_count} activities added and embedded successfully!')
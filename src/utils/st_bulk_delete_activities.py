@@ -1,16 +1,21 @@
 import streamlit as st
-import sqlite3
 import os
+import sys
 from typing import List
 from pinecone import Pinecone
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import execute
+from migrations import migrate
+from vector_index import PineconeVectorStore
+from vector_sync import drain_outbox
+
 # Initialize Pinecone
 pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
 index = pc.Index(os.getenv("PINECONE_INDEX_NAME"))
-
-# Connect to SQLite database
-conn = sqlite3.connect('activities.db')
-cursor = conn.cursor()
+vector_store = PineconeVectorStore(index)
+migrate()
 
 def parse_input(input_string: str) -> List[int]:
     """Parse user input and return a list of activity IDs."""
@@ -27,21 +32,12 @@ def parse_input(input_string: str) -> List[int]:
 def delete_from_sqlite(activity_ids: List[int]) -> int:
     """Delete activities from SQLite database."""
     placeholders = ','.join('?' * len(activity_ids))
-    cursor.execute(f"DELETE FROM activities WHERE id IN ({placeholders})", activity_ids)
-    deleted_count = cursor.rowcount
-    conn.commit()
-    return deleted_count
+    cursor = execute(f"DELETE FROM activities WHERE id IN ({placeholders})", activity_ids)
+    return cursor.rowcount
 
-def delete_from_pinecone(activity_ids: List[int]) -> int:
-    """Delete activities from Pinecone vector database."""
-    deleted_count = 0
-    for id in activity_ids:
-        try:
-            index.delete(ids=[str(id)])
-            deleted_count += 1
-        except Exception as e:
-            st.error(f"Error deleting ID {id} from Pinecone: {str(e)}")
-    return deleted_count
+def delete_from_pinecone() -> int:
+    """Apply the vector deletes the SQLite delete queued, in one batched call."""
+    return drain_outbox(vector_store)
 
 st.title("Bulk Delete Activities")
 
@@ -52,15 +48,11 @@ if st.button("Delete Activities"):
         activity_ids = parse_input(input_ids)
         
         sqlite_deleted = delete_from_sqlite(activity_ids)
-        pinecone_deleted = delete_from_pinecone(activity_ids)
-        
         st.success(f"Deleted {sqlite_deleted} records from SQLite database.")
-        st.success(f"Deleted {pinecone_deleted} records from Pinecone vector database.")
-        
-        if sqlite_deleted != pinecone_deleted:
-            st.warning("The number of deleted records in SQLite and Pinecone doesn't match. Some records may not exist in both databases.")
+        try:
+            synced = delete_from_pinecone()
+            st.success(f"Applied {synced} queued changes to the Pinecone vector database.")
+        except Exception as e:
+            st.warning(f"Pinecone is not updated yet; the deletes stay queued and will be retried: {str(e)}")
     else:
         st.warning("Please enter activity IDs to delete.")
-
-# Close the database connection when the app is done
-conn.close()
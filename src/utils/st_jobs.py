@@ -0,0 +1,83 @@
+import streamlit as st
+import datetime
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jobs import failed_items, list_jobs, request_cancel
+from migrations import migrate
+
+# Batch utilities that run through jobs.run_job; the job name is the script name
+JOB_SCRIPTS = ['development_group_assign', 'clean_type', 'field_trip_type', 'embed_sqlite_pinecone', 'find_duplicates']
+REFRESH_SECONDS = 2
+
+migrate()
+
+def log_path(name):
+    return os.path.join(tempfile.gettempdir(), f"{name}.log")
+
+def start_script(name, restart):
+    """Launch a utility in its own process; it keeps running if this page is closed."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{name}.py")
+    args = [sys.executable, script] + (['--restart'] if restart else [])
+    with open(log_path(name), 'w') as log:
+        subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else '-'
+
+st.title("Batch Jobs")
+
+st.subheader("Start a job")
+col1, col2, col3 = st.columns([3, 2, 1])
+with col1:
+    script_name = st.selectbox("Utility", JOB_SCRIPTS)
+with col2:
+    restart = st.checkbox("Start over instead of resuming", value=False)
+with col3:
+    if st.button("Start"):
+        start_script(script_name, restart)
+        st.success(f"Started {script_name}")
+        time.sleep(REFRESH_SECONDS)
+        st.rerun()
+
+jobs = list_jobs()
+running = any(job['status'] in ('running', 'cancelling') for job in jobs)
+
+st.subheader("Jobs")
+auto_refresh = st.checkbox("Auto-refresh while jobs are running", value=True)
+if not jobs:
+    st.info("No jobs have run yet.")
+
+for job in jobs:
+    total = job['total'] or 0
+    finished = job['done'] + job['failed']
+    with st.container():
+        st.markdown(f"**{job['name']}** (job {job['id']}) — *{job['status']}*")
+        st.progress(finished / total if total else 1.0,
+                    text=f"{job['done']}/{total} done, {job['failed']} failed")
+        st.caption(f"Started {format_time(job['created_at'])} · last update {format_time(job['updated_at'])}"
+                   f" · finished {format_time(job['finished_at'])}")
+        if job['status'] == 'running' and st.button("Cancel", key=f"cancel_{job['id']}"):
+            request_cancel(job['id'])
+            st.rerun()
+        if job['failed']:
+            with st.expander(f"Failed items ({job['failed']})"):
+                st.write(f"Last error: {job['last_error']}")
+                for item_key, attempts, last_error in failed_items(job['id']):
+                    st.write(f"• {item_key} — {attempts} attempts — {last_error}")
+        if job['status'] in ('interrupted', 'failed', 'cancelled'):
+            st.caption("Starting this utility again resumes the job from its last checkpoint.")
+        if os.path.exists(log_path(job['name'])) and job is next(j for j in jobs if j['name'] == job['name']):
+            with st.expander("Output"):
+                with open(log_path(job['name'])) as log:
+                    st.code(''.join(log.readlines()[-40:]))
+        st.markdown("---")
+
+if running and auto_refresh:
+    time.sleep(REFRESH_SECONDS)
+    st.rerun()
@@ -1,21 +1,22 @@
 import os
+import sys
 import json
 import streamlit as st
 from anthropic import Anthropic
 from dotenv import load_dotenv
-import sqlite3
-from openai import OpenAI
 from pinecone import Pinecone
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_ingest import ingest_activities
+from vector_index import PineconeVectorStore
+
 # Load environment variables
 load_dotenv()
 
 # Initialize Anthropic client
 client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
 # Initialize Pinecone
 pinecone_api_key = os.getenv('PINECONE_API_KEY')
 pinecone_index_name = os.getenv('PINECONE_INDEX_NAME')
@@ -25,6 +26,7 @@ if not pinecone_api_key or not pinecone_index_name:
 
 pc = Pinecone(api_key=pinecone_api_key)
 index = pc.Index(pinecone_index_name)
+vector_store = PineconeVectorStore(index)
 
 # Initialize session state
 if 'activities' not in st.session_state:
@@ -68,46 +70,6 @@ def generate_activities(theme):
         st.error(f"Error: {e}")
         return None
 
-def get_embedding(text):
-    response = openai_client.embeddings.create(input=text, model="text-embedding-3-large")
-    return response.data[0].embedding
-
-def add_activity(conn, cursor, index, activity):
-    insert_query = """
-    INSERT INTO activities (title, type, description, supplies, instructions, to_do, source)
-    VALUES (?, ?, ?, ?, ?, ?, ?)
-    """
-    cursor.execute(insert_query, (
-        activity['Activity Title'],
-        activity['Type'],
-        activity['Description'],
-        ', '.join(activity['Supplies']),
-        '\n'.join(activity['Instructions']),
-        True,  # Set to_do to True by default
-        "AI"   # Set source to "AI"
-    ))
-    conn.commit()
-    
-    activity_id = cursor.lastrowid
-    
-    text = (
-        f"Title: {activity['Activity Title']}\n"
-        f"Description: {activity['Description']}\n"
-        f"Supplies: {', '.join(activity['Supplies'])}\n"
-        f"Instructions: {' '.join(activity['Instructions'])}"
-    )
-    
-    embedding = get_embedding(text)
-    
-    index.upsert(vectors=[{
-        "id": str(activity_id),
-        "values": embedding,
-        "metadata": {
-            "type": activity['Type'],
-            "to_do": True
-        }
-    }])
-
 # Streamlit interface
 st.title("Activity Generator")
 theme = st.text_input("Enter a theme for the activities:")
@@ -140,18 +102,11 @@ if st.session_state.activities:
 if st.button("Add Selected Activities"):
     selected_activities = [activity for activity in st.session_state.activities if activity.get('selected', False)]
     if selected_activities:
-        conn = sqlite3.connect('activities.db')
-        cursor = conn.cursor()
-        
         success_count = 0
-        for activity in selected_activities:
-            try:
-                add_activity(conn, cursor, index, activity)
-                success_count += 1
-            except Exception as e:
-                st.error(f"Error adding activity '{activity['Activity Title']}': {str(e)}")
-        
-        conn.close()
+        try:
+            success_count = len(ingest_activities(selected_activities, vector_store))
+        except Exception as e:
+            st.error(f"Error adding activities, nothing was saved: {str(e)}")
         
         if success_count > 0:
             st.success(f'{success_count} activities added and embedded successfully!')
@@ -1,70 +1,53 @@
 import streamlit as st
-import sqlite3
 import os
-from openai import OpenAI
-from pinecone import Pinecone
+import sys
 from dotenv import load_dotenv
 
+# Shared modules live one directory up in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from activity_db import execute, fetch_all
+from activity_search import get_activity_types, hybrid_search, keyword_search
+from migrations import migrate
+
 # Load environment variables
 load_dotenv()
-
-# Initialize OpenAI and Pinecone clients
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-pinecone_client = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
-pinecone_index = pinecone_client.Index(os.getenv('PINECONE_INDEX_NAME'))
-
-def get_embedding(text):
-    """Generate embedding for the given text using OpenAI."""
-    response = openai_client.embeddings.create(input=text, model="text-embedding-3-large")
-    return response.data[0].embedding
+migrate()
 
 def fetch_activities_by_ids(activity_ids):
-    """Fetch activities from SQLite database by IDs."""
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
+    """Fetch activities from SQLite database by IDs, in the order given."""
     placeholders = ', '.join('?' for _ in activity_ids)
     query = f"SELECT * FROM activities WHERE id IN ({placeholders})"
-    cursor.execute(query, activity_ids)
-    activities = cursor.fetchall()
-    conn.close()
-    return activities
+    rank = {str(id): position for position, id in enumerate(activity_ids)}
+    return sorted(fetch_all(query, activity_ids), key=lambda activity: rank[str(activity[0])])
 
-def search_activities(keyword, activity_type, top_k=20):
+def search_activities(keyword, activity_type, top_k=20, keyword_only=False):
     """Search for activities based on keyword and optionally filter by type."""
-    embedding = get_embedding(keyword)
-    query_results = pinecone_index.query(vector=embedding, top_k=top_k, include_metadata=True)
-    if activity_type == "All":
-        filtered_results = query_results['matches']
-    else:
-        filtered_results = [result for result in query_results['matches'] if result['metadata']['type'] == activity_type]
-    return filtered_results
+    filter = None if activity_type == "All" else {"type": activity_type}
+    if keyword_only:
+        return [str(id) for id, _, _ in keyword_search(keyword, top_k, filter=filter)]
+    return hybrid_search(keyword, top_k, filter=filter)
 
 def update_activity(id, title, type, description, supplies, instructions, source, to_do):
     """Update an activity in the database."""
-    conn = sqlite3.connect('activities.db')
-    cursor = conn.cursor()
-    cursor.execute('''
+    execute('''
     UPDATE activities
     SET title = ?, type = ?, description = ?, supplies = ?, instructions = ?, source = ?, to_do = ?
     WHERE id = ?
     ''', (title, type, description, supplies, instructions, source, to_do, id))
-    conn.commit()
-    conn.close()
 
 # Streamlit UI
 st.title('Activity Search')
 keyword = st.text_input('Enter a keyword or phrase:')
-activity_type = st.selectbox('Select Activity Type:', options=['All', 'Art', 'Craft', 'Science', 'Cooking', 'Physical'])
+activity_type = st.selectbox('Select Activity Type:', options=['All'] + get_activity_types())
+keyword_only = st.checkbox('Exact words only (skips the semantic search)')
 
 if st.button('Search'):
     if keyword:
-        results = search_activities(keyword, activity_type)
-        if results:
-            activity_ids = [result['id'] for result in results]
+        activity_ids = search_activities(keyword, activity_type, keyword_only=keyword_only)
+        if activity_ids:
             activities = fetch_activities_by_ids(activity_ids)
             if activities:
-                for activity, result in zip(activities, results):
-                    st.write(f"Pinecone ID: {result['id']}")
+                for activity in activities:
                     st.write(f"ID: {activity[0]}, Title: {activity[1]}, Type: {activity[2]}")
                     st.write(f"Description: {activity[3]}")
                     st.write(f"Supplies: {activity[4]}")
@@ -79,6 +62,6 @@ if st.button('Search'):
             else:
                 st.write("No matching activities found in the database.")
         else:
-            st.write("No matching activities found in Pinecone.")
+            st.write("No matching activities found.")
     else:
         st.write("Please enter a keyword to search.")
\ No newline at end of file
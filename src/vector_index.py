@@ -0,0 +1,414 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+from activity_db import DB_PATH
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no lock between processes, but each one still reloads files another has saved
+    fcntl = None
+
+# Local index files live next to activities.db: activities.vectors.npy / activities.vectors.json
+VECTOR_INDEX_PATH = os.getenv('VECTOR_INDEX_PATH', os.path.splitext(DB_PATH)[0] + '.vectors')
+
+# Above this many vectors the local store switches to an HNSW index (when hnswlib is installed)
+ANN_THRESHOLD = int(os.getenv('VECTOR_ANN_THRESHOLD', '20000'))
+
+
+def matches_filter(metadata, filter):
+    """Evaluate a Pinecone-style metadata filter such as {"type": "Art"} or {"type": {"$in": [...]}}."""
+    if not filter:
+        return True
+    for field, condition in filter.items():
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        for operator, expected in condition.items():
+            if operator == '$eq' and value != expected:
+                return False
+            if operator == '$ne' and value == expected:
+                return False
+            if operator == '$in' and value not in expected:
+                return False
+            if operator == '$nin' and value in expected:
+                return False
+    return True
+
+
+class VectorStore(ABC):
+    """Interface shared by the vector backends.
+
+    Vectors are dicts with "id", "values" and "metadata"; query results are
+    dicts with "id", "score" and "metadata", best match first.
+    """
+
+    @abstractmethod
+    def upsert(self, vectors):
+        pass
+
+    @abstractmethod
+    def query(self, vector, top_k=10, filter=None):
+        pass
+
+    @abstractmethod
+    def delete(self, ids):
+        pass
+
+    @abstractmethod
+    def list_ids(self):
+        """Return every id in the index as a string."""
+
+    @abstractmethod
+    def update_metadata(self, updates):
+        """Merge {id: metadata} into the stored metadata without touching the vectors."""
+
+    @contextmanager
+    def batch(self):
+        """Group several writes; backends that persist to local files save once at the end."""
+        yield self
+
+    def query_by_group(self, vector, field, groups, top_k=10, filter=None):
+        """Return {group: matches} with the top_k matches for each value of metadata ``field``.
+
+        Backends without a grouped search run one filtered query per group concurrently.
+        """
+        groups = list(groups)
+        if not groups:
+            return {}
+
+        def query_group(group):
+            group_filter = dict(filter or {})
+            group_filter[field] = group
+            return self.query(vector, top_k=top_k, filter=group_filter)
+
+        with ThreadPoolExecutor(max_workers=min(8, len(groups))) as executor:
+            return dict(zip(groups, executor.map(query_group, groups)))
+
+
+class PineconeVectorStore(VectorStore):
+    """Hosted Pinecone index."""
+
+    def __init__(self, index=None):
+        if index is None:
+            from pinecone import Pinecone
+            index = Pinecone(api_key=os.getenv('PINECONE_API_KEY')).Index(os.getenv('PINECONE_INDEX_NAME'))
+        self.index = index
+
+    def upsert(self, vectors):
+        self.index.upsert(vectors=vectors)
+
+    def query(self, vector, top_k=10, filter=None):
+        results = self.index.query(vector=vector, top_k=top_k, filter=filter, include_metadata=True)
+        return [
+            {'id': match['id'], 'score': match['score'], 'metadata': match.get('metadata') or {}}
+            for match in results['matches']
+        ]
+
+    def delete(self, ids):
+        self.index.delete(ids=[str(id) for id in ids])
+
+    def list_ids(self):
+        # index.list() pages through the ids of a serverless index
+        return [id for page in self.index.list() for id in page]
+
+    def update_metadata(self, updates):
+        # Pinecone updates one id per request, so send them concurrently
+        def update(item):
+            self.index.update(id=str(item[0]), set_metadata=item[1])
+
+        if updates:
+            with ThreadPoolExecutor(max_workers=min(8, len(updates))) as executor:
+                list(executor.map(update, updates.items()))
+
+
+class LocalVectorStore(VectorStore):
+    """In-process index over a normalized float32 matrix persisted next to activities.db.
+
+    The matrix is memory-mapped on load and searched exactly with one matrix-vector
+    product. Once the corpus passes ``ann_threshold`` and hnswlib is installed, an
+    HNSW graph is built lazily and used instead.
+
+    Several processes (the app's outbox worker, reconcile_vectors.py,
+    embed_sqlite_pinecone.py) can share the files. Every call takes a lock
+    file next to them and reloads the index if another process saved it since,
+    and writes are saved when the outermost write or ``batch()`` ends.
+    """
+
+    def __init__(self, path=VECTOR_INDEX_PATH, ann_threshold=ANN_THRESHOLD):
+        self.path = path
+        self.ann_threshold = ann_threshold
+        self._lock = threading.RLock()
+        self._held = False
+        self._unsaved = set()
+        # Loaded on first use, under the lock
+        self._matrix = None
+        self._signature = None
+
+    @property
+    def matrix_path(self):
+        return self.path + '.npy'
+
+    @property
+    def meta_path(self):
+        return self.path + '.json'
+
+    @property
+    def lock_path(self):
+        return self.path + '.lock'
+
+    def _disk_signature(self):
+        # The sidecar is replaced last on every save, so its inode and mtime identify the saved version
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        """Hold the thread lock and the lock file, reloading first if the index changed on disk.
+
+        Re-entrant within a thread: nested calls run under the outermost one,
+        which saves any writes once when it ends. A write that raises leaves
+        the files alone and the in-memory index is reloaded from them.
+        """
+        with self._lock:
+            if self._held:
+                yield
+                return
+            lock_file = None
+            if fcntl is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                lock_file = open(self.lock_path, 'a')
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._held = True
+            try:
+                if self._matrix is None or self._disk_signature() != self._signature:
+                    self._load()
+                yield
+                if exclusive and self._unsaved:
+                    self._save()
+            except BaseException:
+                if self._unsaved:
+                    self._load()
+                raise
+            finally:
+                self._held = False
+                if lock_file is not None:
+                    lock_file.close()
+
+    def batch(self):
+        """Apply several writes under one lock and save them once at the end."""
+        return self._locked(exclusive=True)
+
+    def _load(self):
+        self._signature = self._disk_signature()
+        if os.path.exists(self.matrix_path) and os.path.exists(self.meta_path):
+            self._matrix = np.load(self.matrix_path, mmap_mode='r')
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self._ids = meta['ids']
+            self._metadata = meta['metadata']
+        else:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+            self._ids = []
+            self._metadata = []
+        self._positions = {id: row for row, id in enumerate(self._ids)}
+        self._hnsw = None
+        self._unsaved.clear()
+
+    def _save(self):
+        """Persist the index; the matrix is rewritten only when vectors changed, not just metadata."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        matrix = 'matrix' in self._unsaved
+        # Write to temporary files first so readers never see a half-written index
+        if matrix:
+            tmp_matrix = self.matrix_path + '.tmp'
+            with open(tmp_matrix, 'wb') as f:
+                np.save(f, np.ascontiguousarray(self._matrix, dtype=np.float32))
+        tmp_meta = self.meta_path + '.tmp'
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({'ids': self._ids, 'metadata': self._metadata}, f)
+        if matrix:
+            os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_meta, self.meta_path)
+        self._signature = self._disk_signature()
+        self._unsaved.clear()
+
+    def __len__(self):
+        with self._locked():
+            return len(self._ids)
+
+    def _writable_matrix(self, dimension):
+        if isinstance(self._matrix, np.memmap) or not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix, dtype=np.float32)
+        if self._matrix.shape[0] == 0:
+            self._matrix = np.zeros((0, dimension), dtype=np.float32)
+        return self._matrix
+
+    @staticmethod
+    def _normalize(values):
+        values = np.asarray(values, dtype=np.float32)
+        norms = np.linalg.norm(values, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return values / norms
+
+    def upsert(self, vectors):
+        if not vectors:
+            return
+        with self._locked(exclusive=True):
+            values = self._normalize([vector['values'] for vector in vectors])
+            matrix = self._writable_matrix(values.shape[1])
+            new_rows = []
+            for vector, row_values in zip(vectors, values):
+                id = str(vector['id'])
+                metadata = dict(vector.get('metadata') or {})
+                row = self._positions.get(id)
+                if row is None:
+                    self._positions[id] = len(self._ids)
+                    new_rows.append(row_values)
+                    self._ids.append(id)
+                    self._metadata.append(metadata)
+                else:
+                    matrix[row] = row_values
+                    self._metadata[row] = metadata
+            if new_rows:
+                matrix = np.vstack([matrix, np.stack(new_rows)])
+            self._matrix = matrix
+            self._hnsw = None
+            self._unsaved.add('matrix')
+
+    def delete(self, ids):
+        with self._locked(exclusive=True):
+            rows = [self._positions[str(id)] for id in ids if str(id) in self._positions]
+            if not rows:
+                return
+            keep = np.ones(len(self._ids), dtype=bool)
+            keep[rows] = False
+            self._matrix = np.asarray(self._matrix)[keep]
+            self._ids = [id for id, kept in zip(self._ids, keep) if kept]
+            self._metadata = [metadata for metadata, kept in zip(self._metadata, keep) if kept]
+            self._positions = {id: row for row, id in enumerate(self._ids)}
+            self._hnsw = None
+            self._unsaved.add('matrix')
+
+    def list_ids(self):
+        with self._locked():
+            return list(self._ids)
+
+    def update_metadata(self, updates):
+        with self._locked(exclusive=True):
+            for id, metadata in updates.items():
+                row = self._positions.get(str(id))
+                if row is not None:
+                    self._metadata[row] = {**self._metadata[row], **metadata}
+                    self._unsaved.add('metadata')
+
+    def _allowed_rows(self, filter):
+        if not filter:
+            return None
+        return np.fromiter(
+            (matches_filter(metadata, filter) for metadata in self._metadata), dtype=bool, count=len(self._metadata))
+
+    def _hnsw_index(self):
+        if self._hnsw is None:
+            index = hnswlib.Index(space='ip', dim=self._matrix.shape[1])
+            index.init_index(max_elements=len(self._ids), ef_construction=200, M=16)
+            index.add_items(np.asarray(self._matrix), np.arange(len(self._ids)))
+            index.set_ef(128)
+            self._hnsw = index
+        return self._hnsw
+
+    def query(self, vector, top_k=10, filter=None):
+        with self._locked():
+            if not self._ids:
+                return []
+            query = self._normalize(vector)
+            allowed = self._allowed_rows(filter)
+            if hnswlib is not None and len(self._ids) >= self.ann_threshold:
+                rows, scores = self._query_hnsw(query, top_k, allowed)
+            else:
+                rows, scores = self._query_exact(query, top_k, allowed)
+            return self._matches(rows, scores)
+
+    def _matches(self, rows, scores):
+        return [
+            {'id': self._ids[row], 'score': float(score), 'metadata': self._metadata[row]}
+            for row, score in zip(rows, scores)
+        ]
+
+    def query_by_group(self, vector, field, groups, top_k=10, filter=None):
+        if hnswlib is not None and len(self) >= self.ann_threshold:
+            return super().query_by_group(vector, field, groups, top_k=top_k, filter=filter)
+        with self._locked():
+            results = {group: [] for group in groups}
+            if not self._ids:
+                return results
+            # One matrix-vector product scores every row; each group then takes its own top_k
+            scores = self._matrix @ self._normalize(vector)
+            allowed = self._allowed_rows(filter)
+            values = np.array([metadata.get(field) for metadata in self._metadata], dtype=object)
+            for group in results:
+                in_group = values == group
+                if allowed is not None:
+                    in_group &= allowed
+                rows, group_scores = self._top_rows(scores, top_k, in_group)
+                results[group] = self._matches(rows, group_scores)
+            return results
+
+    def _query_exact(self, query, top_k, allowed):
+        return self._top_rows(self._matrix @ query, top_k, allowed)
+
+    @staticmethod
+    def _top_rows(scores, top_k, allowed):
+        if allowed is not None:
+            scores = np.where(allowed, scores, -np.inf)
+            top_k = min(top_k, int(allowed.sum()))
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return [], []
+        rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        rows = rows[np.argsort(-scores[rows])]
+        return rows.tolist(), scores[rows].tolist()
+
+    def _query_hnsw(self, query, top_k, allowed):
+        index = self._hnsw_index()
+        if allowed is not None:
+            top_k = min(top_k, int(allowed.sum()))
+            if top_k <= 0:
+                return [], []
+            labels, distances = index.knn_query(query, k=top_k, filter=lambda row: bool(allowed[row]))
+        else:
+            labels, distances = index.knn_query(query, k=min(top_k, len(self._ids)))
+        # hnswlib reports inner-product distance as 1 - similarity
+        return labels[0].tolist(), (1.0 - distances[0]).tolist()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_vector_store():
+    """Return the shared store: VECTOR_BACKEND=local|pinecone, defaulting to Pinecone when configured."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            default_backend = 'pinecone' if os.getenv('PINECONE_API_KEY') else 'local'
+            if os.getenv('VECTOR_BACKEND', default_backend) == 'local':
+                _default_store = LocalVectorStore()
+            else:
+                _default_store = PineconeVectorStore()
+        return _default_store
@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+
+from activity_db import fetch_all, fetch_one, transaction
+from embeddings import activity_text, content_hash, get_embedding_client
+from vector_index import get_vector_store
+
+# Entries handled per drain pass, and vectors per upsert request
+DRAIN_BATCH_SIZE = int(os.getenv('VECTOR_SYNC_BATCH_SIZE', '500'))
+UPSERT_BATCH_SIZE = 100
+
+# Failed tries before an entry is parked and skipped, so it cannot block the rest of the queue
+VECTOR_SYNC_MAX_ATTEMPTS = int(os.getenv('VECTOR_SYNC_MAX_ATTEMPTS', '5'))
+
+# Seconds the background worker sleeps between passes when nobody wakes it
+VECTOR_SYNC_INTERVAL = float(os.getenv('VECTOR_SYNC_INTERVAL', '30'))
+
+
+def enqueue(conn, operation, activity_ids):
+    """Queue ``operation`` for ``activity_ids`` on ``conn``, inside the caller's transaction."""
+    conn.executemany('''
+        INSERT OR REPLACE INTO vector_outbox (activity_id, operation, seq, queued_at)
+        VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM vector_outbox), ?)
+    ''', [(activity_id, operation, time.time()) for activity_id in activity_ids])
+
+
+def acknowledge(conn, activity_ids):
+    """Drop the entries for ``activity_ids`` because the caller already synced them itself."""
+    conn.executemany('DELETE FROM vector_outbox WHERE activity_id = ?', [(activity_id,) for activity_id in activity_ids])
+
+
+def record_content_hashes(conn, hashes):
+    """Remember the content hash of each (activity_id, content_hash) just embedded and upserted."""
+    conn.executemany('INSERT OR REPLACE INTO vector_content_hashes (activity_id, content_hash) VALUES (?, ?)',
+                     list(hashes))
+
+
+def forget_content_hashes(conn, activity_ids):
+    conn.executemany('DELETE FROM vector_content_hashes WHERE activity_id = ?',
+                     [(activity_id,) for activity_id in activity_ids])
+
+
+def _stored_hashes(activity_ids):
+    hashes = {}
+    for start in range(0, len(activity_ids), 500):
+        chunk = activity_ids[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        hashes.update(fetch_all(
+            f'SELECT activity_id, content_hash FROM vector_content_hashes WHERE activity_id IN ({placeholders})',
+            chunk))
+    return hashes
+
+
+def pending_count():
+    """Queued entries, not counting parked ones."""
+    return fetch_one('SELECT COUNT(*) FROM vector_outbox WHERE attempts < ?', (VECTOR_SYNC_MAX_ATTEMPTS,))[0]
+
+
+def _fetch_activities(activity_ids):
+    activities = {}
+    for start in range(0, len(activity_ids), 500):
+        chunk = activity_ids[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        for row in fetch_all(f'''
+            SELECT id, title, type, description, supplies, instructions, to_do
+            FROM activities WHERE id IN ({placeholders})
+        ''', chunk):
+            activities[row[0]] = row
+    return activities
+
+
+def _apply(entries, vector_store, embedding_client):
+    """Push ``entries`` to the index; returns ((activity_id, content_hash) upserted, ids deleted)."""
+    activities = _fetch_activities([activity_id for activity_id, operation, _ in entries if operation == 'upsert'])
+    # A row deleted after its upsert was queued only needs its vector removed
+    upserts = [activities[activity_id] for activity_id, operation, _ in entries
+               if operation == 'upsert' and activity_id in activities]
+    deletes = [activity_id for activity_id, operation, _ in entries
+               if operation == 'delete' or activity_id not in activities]
+    stored = _stored_hashes([row[0] for row in upserts])
+    changed = []
+    metadata_only = {}
+    for row in upserts:
+        activity_id, title, type, description, supplies, instructions, to_do = row
+        text = activity_text(title, description, supplies, instructions)
+        metadata = {"type": type, "to_do": bool(to_do)}
+        text_hash = content_hash(text)
+        if stored.get(activity_id) == text_hash:
+            metadata_only[str(activity_id)] = metadata
+        else:
+            changed.append((activity_id, text, text_hash, metadata))
+    vectors = []
+    if changed:
+        embeddings = embedding_client.embed_many([text for _, text, _, _ in changed])
+        vectors = [
+            {"id": str(activity_id), "values": embedding, "metadata": metadata}
+            for (activity_id, _, _, metadata), embedding in zip(changed, embeddings)
+        ]
+    # A local index is saved once for the whole pass
+    with vector_store.batch():
+        for start in range(0, len(vectors), UPSERT_BATCH_SIZE):
+            vector_store.upsert(vectors[start:start + UPSERT_BATCH_SIZE])
+        if metadata_only:
+            vector_store.update_metadata(metadata_only)
+        if deletes:
+            vector_store.delete([str(activity_id) for activity_id in deletes])
+    return [(activity_id, text_hash) for activity_id, _, text_hash, _ in changed], deletes
+
+
+def _acknowledge_applied(entries, hashes, deletes):
+    with transaction() as conn:
+        record_content_hashes(conn, hashes)
+        forget_content_hashes(conn, deletes)
+        conn.executemany('DELETE FROM vector_outbox WHERE activity_id = ? AND seq = ?',
+                         [(activity_id, seq) for activity_id, _, seq in entries])
+
+
+def _record_failure(entries, error, max_attempts):
+    with transaction() as conn:
+        conn.executemany(
+            'UPDATE vector_outbox SET attempts = attempts + 1, last_error = ? WHERE activity_id = ? AND seq = ?',
+            [(str(error), activity_id, seq) for activity_id, _, seq in entries])
+        parked = conn.execute(f'''
+            SELECT activity_id FROM vector_outbox
+            WHERE attempts >= ? AND activity_id IN ({', '.join('?' for _ in entries)})
+        ''', [max_attempts] + [activity_id for activity_id, _, _ in entries]).fetchall()
+    for (activity_id,) in parked:
+        print(f"Vector outbox: parked activity {activity_id} after {max_attempts} failed attempts: {error}")
+
+
+def drain_once(vector_store=None, embedding_client=None, batch_size=DRAIN_BATCH_SIZE,
+               max_attempts=VECTOR_SYNC_MAX_ATTEMPTS):
+    """Apply up to ``batch_size`` queued entries; returns how many were applied.
+
+    Upserts re-read the current row and hash its embedding text. Rows whose
+    hash matches the indexed one (a to_do toggle or a type change) only get
+    their metadata updated; the rest are embedded in one batched call and
+    upserted in chunks of UPSERT_BATCH_SIZE. Deletes go out in one call.
+    Entries are removed only if they were not replaced while the batch was in
+    flight.
+
+    If the batch fails, its entries are retried one at a time so one bad
+    entry cannot hold back the others. Each failure bumps the entry's attempt
+    count; after ``max_attempts`` the entry is parked, i.e. skipped until the
+    activity changes again or retry_parked() is called. Raises the last error
+    when nothing could be applied.
+    """
+    if vector_store is None:
+        vector_store = get_vector_store()
+    if embedding_client is None:
+        embedding_client = get_embedding_client()
+    entries = fetch_all('SELECT activity_id, operation, seq FROM vector_outbox WHERE attempts < ? ORDER BY seq LIMIT ?',
+                        (max_attempts, batch_size))
+    if not entries:
+        return 0
+
+    try:
+        _acknowledge_applied(entries, *_apply(entries, vector_store, embedding_client))
+        return len(entries)
+    except Exception as e:
+        if len(entries) == 1:
+            _record_failure(entries, e, max_attempts)
+            raise
+
+    applied = 0
+    error = None
+    for entry in entries:
+        try:
+            _acknowledge_applied([entry], *_apply([entry], vector_store, embedding_client))
+            applied += 1
+        except Exception as e:
+            _record_failure([entry], e, max_attempts)
+            error = e
+    if not applied:
+        raise error
+    return applied
+
+
+def parked_entries():
+    """Entries that ran out of attempts, as (activity_id, operation, attempts, last_error)."""
+    return fetch_all('''
+        SELECT activity_id, operation, attempts, last_error FROM vector_outbox WHERE attempts >= ? ORDER BY seq
+    ''', (VECTOR_SYNC_MAX_ATTEMPTS,))
+
+
+def retry_parked():
+    """Give parked entries a fresh set of attempts; returns how many."""
+    with transaction() as conn:
+        return conn.execute('UPDATE vector_outbox SET attempts = 0 WHERE attempts >= ?',
+                            (VECTOR_SYNC_MAX_ATTEMPTS,)).rowcount
+
+
+def drain_outbox(vector_store=None, embedding_client=None, batch_size=DRAIN_BATCH_SIZE):
+    """Apply queued entries until the outbox is empty; returns how many were applied."""
+    total = 0
+    while True:
+        applied = drain_once(vector_store, embedding_client, batch_size)
+        if not applied:
+            return total
+        total += applied
+
+
+def reconcile(vector_store=None, embedding_client=None, dry_run=False):
+    """Diff SQLite ids against the index and repair both directions in bulk.
+
+    Activities missing from the index are queued for upsert and drained;
+    vectors whose activity no longer exists are deleted. Returns the sorted
+    (missing, orphaned) id lists found before any repair.
+    """
+    if vector_store is None:
+        vector_store = get_vector_store()
+    activity_ids = {str(row[0]) for row in fetch_all('SELECT id FROM activities')}
+    indexed_ids = set(vector_store.list_ids())
+    missing = sorted(activity_ids - indexed_ids, key=int)
+    orphaned = sorted(indexed_ids - activity_ids)
+    if dry_run:
+        return missing, orphaned
+    if missing:
+        missing_ids = [int(activity_id) for activity_id in missing]
+        with transaction() as conn:
+            # The stored hashes describe vectors that are gone, so force a re-embed
+            forget_content_hashes(conn, missing_ids)
+            enqueue(conn, 'upsert', missing_ids)
+    with vector_store.batch():
+        for start in range(0, len(orphaned), 1000):
+            vector_store.delete(orphaned[start:start + 1000])
+    drain_outbox(vector_store, embedding_client)
+    return missing, orphaned
+
+
+class OutboxWorker:
+    """Daemon thread that drains the outbox every ``interval`` seconds or as soon as ``notify`` is called."""
+
+    def __init__(self, vector_store=None, embedding_client=None, interval=VECTOR_SYNC_INTERVAL):
+        self.vector_store = vector_store
+        self.embedding_client = embedding_client
+        self.interval = interval
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='vector-outbox', daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        failures = 0
+        while True:
+            # Back off while the index or the embedding API keeps failing
+            self._wake.wait(self.interval * min(2 ** failures, 16))
+            self._wake.clear()
+            try:
+                drain_outbox(self.vector_store, self.embedding_client)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"Vector outbox drain failed (attempt {failures}): {e}")
+
+
+_default_worker = None
+_default_worker_lock = threading.Lock()
+
+
+def get_outbox_worker():
+    global _default_worker
+    with _default_worker_lock:
+        if _default_worker is None:
+            _default_worker = OutboxWorker()
+            # Pick up whatever earlier sessions left queued
+            _default_worker.notify()
+        return _default_worker
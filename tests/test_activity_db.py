@@ -0,0 +1,55 @@
+import os
+import tempfile
+import threading
+import unittest
+from activity_db import ConnectionPool
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp_dir.name, 'test.db'), size=2)
+        with self.pool.transaction() as conn:
+            conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmp_dir.cleanup()
+
+    def test_pragmas_applied(self):
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+    def test_transaction_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.pool.transaction() as conn:
+                conn.execute("INSERT INTO items (name) VALUES ('lost')")
+                raise RuntimeError('boom')
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM items').fetchone()[0], 0)
+
+    def test_nested_use_reuses_connection(self):
+        with self.pool.transaction() as outer:
+            with self.pool.transaction() as inner:
+                self.assertIs(outer, inner)
+                inner.execute("INSERT INTO items (name) VALUES ('nested')")
+            # The inner block must not commit the outer transaction early
+            self.assertTrue(outer.in_transaction)
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM items').fetchone()[0], 1)
+
+    def test_concurrent_writers(self):
+        def worker(n):
+            for i in range(20):
+                with self.pool.transaction() as conn:
+                    conn.execute('INSERT INTO items (name) VALUES (?)', (f'{n}-{i}',))
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM items').fetchone()[0], 80)
+
+if __name__ == '__main__':
+    unittest.main()
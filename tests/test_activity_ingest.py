@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import activity_db
+import activity_ingest
+from activity_ingest import activity_row, ingest_activities
+from embeddings import EmbeddingClient, FakeEmbeddingBackend
+from migrations import migrate
+from vector_index import LocalVectorStore
+from vector_sync import pending_count
+
+class FailingStore(LocalVectorStore):
+    """Accepts the first upsert and fails on the second."""
+    def __init__(self, path):
+        super().__init__(path)
+        self.upserts = 0
+
+    def upsert(self, vectors):
+        self.upserts += 1
+        if self.upserts > 1:
+            raise ConnectionError("index unavailable")
+        super().upsert(vectors)
+
+class TestIngestActivities(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'activities.db')
+        self.patcher = mock.patch.object(activity_db, 'DB_PATH', self.db_path)
+        self.patcher.start()
+        activity_db.execute('''
+        CREATE TABLE activities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, type TEXT, description TEXT, supplies TEXT,
+            instructions TEXT, source TEXT, to_do BOOLEAN, development_age_group TEXT,
+            development_group_justification TEXT, adaptations TEXT
+        )
+        ''')
+        activity_db.execute("INSERT INTO activities (title) VALUES ('Existing')")
+        migrate()
+        self.embedding_client = EmbeddingClient(FakeEmbeddingBackend(dimension=8))
+        self.vector_path = os.path.join(self.tmp_dir.name, 'activities.vectors')
+
+    def tearDown(self):
+        activity_db.get_pool(self.db_path).close()
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def activities(self, count):
+        return [{
+            "Activity Title": f"Activity {i}", "Type": "Craft", "Description": "Make something",
+            "Supplies": ["Paper", "Glue"], "Instructions": ["Cut", "Glue"],
+        } for i in range(count)]
+
+    def test_generated_and_parsed_activities_normalize_alike(self):
+        generated = activity_row({"Activity Title": "Kites", "Type": "Craft", "Description": "Fly",
+                                  "Supplies": ["Paper", "String"], "Instructions": ["Fold", "Tie"]})
+        parsed = activity_row({"title": "Kites", "type": "Craft", "description": "Fly",
+                               "supplies": "Paper, String", "instructions": "Fold\nTie"})
+        self.assertEqual(generated['supplies'], parsed['supplies'])
+        self.assertEqual(generated['instructions'], parsed['instructions'])
+        with self.assertRaises(ValueError):
+            activity_row({"title": "Kites"})
+
+    def test_batch_is_inserted_and_indexed_together(self):
+        store = LocalVectorStore(self.vector_path)
+        with mock.patch.object(activity_ingest, 'UPSERT_BATCH_SIZE', 2):
+            ids = ingest_activities(self.activities(5), store, self.embedding_client)
+        self.assertEqual(ids, [2, 3, 4, 5, 6])
+        self.assertEqual(store._ids, [str(id) for id in ids])
+        rows = activity_db.fetch_all("SELECT title, supplies, instructions, source FROM activities WHERE id > 1")
+        self.assertEqual(rows[0], ("Activity 0", "Paper, Glue", "Cut\nGlue", "AI"))
+        # The batch was indexed synchronously, so nothing is left for the outbox worker
+        self.assertEqual(pending_count(), 0)
+
+    def test_failed_upsert_rolls_back_and_removes_vectors(self):
+        store = FailingStore(self.vector_path)
+        with mock.patch.object(activity_ingest, 'UPSERT_BATCH_SIZE', 2), self.assertRaises(ConnectionError):
+            ingest_activities(self.activities(5), store, self.embedding_client)
+        self.assertEqual(activity_db.fetch_one("SELECT COUNT(*) FROM activities")[0], 1)
+        self.assertEqual(len(store), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import activity_db
+from activity_search import fts_query, keyword_search, keyword_search_by_type, reciprocal_rank_fusion
+from migrations import migrate
+
+class TestKeywordSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'activities.db')
+        self.patcher = mock.patch.object(activity_db, 'DB_PATH', self.db_path)
+        self.patcher.start()
+        activity_db.execute('''
+        CREATE TABLE activities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, type TEXT, description TEXT, supplies TEXT,
+            instructions TEXT, to_do BOOLEAN
+        )
+        ''')
+        activity_db.executemany(
+            "INSERT INTO activities (title, type, description, supplies, instructions, to_do) VALUES (?, ?, ?, ?, ?, 0)",
+            [("Paper Plate Masks", "Craft", "Decorate masks", "Paper plates, feathers", "Cut and glue"),
+             ("Ocean Slime", "Science", "Stretchy blue slime", "Glue, borax", "Mix"),
+             ("Feather Relay", "Physical", "Carry a feather on a plate", "Feathers, plates", "Run")])
+        # Rows that exist before the index is created are picked up by the initial rebuild
+        migrate()
+
+    def tearDown(self):
+        activity_db.get_pool(self.db_path).close()
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_query_is_quoted_and_stemmed(self):
+        self.assertEqual(fts_query('paper "plates"'), '"paper" AND "plates"')
+        self.assertIsNone(fts_query('  --  '))
+        # The porter stemmer matches "plate" against "plates"
+        self.assertEqual([id for id, _, _ in keyword_search("plate")], [1, 3])
+        self.assertEqual([id for id, _, _ in keyword_search("paper plate")], [1])
+        self.assertEqual([id for id, _, _ in keyword_search("feather", columns=('title',))], [3])
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        activity_db.execute("INSERT INTO activities (title, type, to_do) VALUES ('Volcano', 'Science', 1)")
+        activity_db.execute("UPDATE activities SET title = 'Ocean Goo' WHERE id = 2")
+        activity_db.execute("DELETE FROM activities WHERE id = 1")
+        self.assertEqual([id for id, _, _ in keyword_search("volcano")], [4])
+        self.assertEqual([id for id, _, _ in keyword_search("goo")], [2])
+        self.assertEqual([id for id, _, _ in keyword_search("masks")], [])
+        self.assertEqual([id for id, _, _ in keyword_search("volcano", filter={"to_do": False})], [])
+
+    def test_grouped_keyword_search_and_fusion(self):
+        groups = keyword_search_by_type("feather plates", ["Craft", "Physical", "Science"], top_k=1)
+        self.assertEqual(groups, {"Craft": ["1"], "Physical": ["3"], "Science": []})
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]])
+        self.assertEqual(fused, ["a", "c", "b", "d"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import activity_db
+from dedup import (MinHasher, find_similar_pairs, find_similar_pairs_for, lsh_candidates, merge_related_ids,
+                   related_ids_by_activity, shingles)
+from dedup_index import current_change_seq, dirty_activity_ids, load_vectors, refresh_vectors, set_watermark
+from duplicate_finder import LLMAdjudicator
+from llm_cache import LLMCache
+from migrations import migrate
+
+class TestFindSimilarPairs(unittest.TestCase):
+    def test_blocked_search_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        base = rng.normal(size=(40, 16))
+        # Near copies of the first ten rows plus one empty vector
+        vectors = np.vstack([base, base[:10] + rng.normal(scale=0.05, size=(10, 16)), np.zeros((1, 16))])
+        ids = [i * 3 + 7 for i in range(len(vectors))]
+
+        pairs = find_similar_pairs(ids, vectors, threshold=0.8, row_block_size=7, column_block_size=5)
+
+        normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scores = normalized @ normalized.T
+        expected = [(ids[i], ids[j]) for i in range(len(ids)) for j in range(i + 1, len(ids)) if scores[i, j] >= 0.8]
+        self.assertEqual([(id1, id2) for id1, id2, _ in pairs], expected)
+        self.assertGreaterEqual(len(pairs), 10)
+        for id1, id2, score in pairs:
+            self.assertAlmostEqual(score, scores[ids.index(id1), ids.index(id2)], places=5)
+
+    def test_changed_rows_against_all_matches_full_search(self):
+        rng = np.random.default_rng(1)
+        base = rng.normal(size=(30, 8))
+        vectors = np.vstack([base, base[:6] + rng.normal(scale=0.05, size=(6, 8))])
+        ids = list(range(100, 100 + len(vectors)))
+        changed = [101, 103, 131, 132]
+
+        pairs = find_similar_pairs_for(changed, ids, vectors, threshold=0.8, row_block_size=3, column_block_size=4)
+
+        expected = [pair for pair in find_similar_pairs(ids, vectors, threshold=0.8)
+                    if pair[0] in changed or pair[1] in changed]
+        self.assertEqual([pair[:2] for pair in pairs], [pair[:2] for pair in expected])
+
+    def test_merge_related_ids_replaces_relations_of_changed_rows(self):
+        existing = {1: "2,3", 2: "4", 3: None, 4: None}
+        updates = merge_related_ids(existing, [3, 4], [(3, 4, 0.9)])
+        self.assertEqual(updates, {1: "2", 2: "", 3: "4"})
+
+    def test_merge_related_ids_drops_deleted_activities(self):
+        # 5 was deleted: it is neither in the table nor reported as changed
+        existing = {1: "2,5", 2: "5"}
+        self.assertEqual(merge_related_ids(existing, [], []), {1: "2", 2: ""})
+
+    def test_related_ids_grouping(self):
+        pairs = [(1, 5, 0.9), (1, 9, 0.85), (5, 9, 0.95)]
+        self.assertEqual(related_ids_by_activity(pairs), {1: "5,9", 5: "9"})
+
+class TestMinHashCandidates(unittest.TestCase):
+    def test_near_identical_texts_share_a_band(self):
+        hasher = MinHasher()
+        texts = [
+            "Cut paper plates into masks and decorate them with feathers and glitter",
+            "Cut paper plates into masks and decorate them with feathers and sequins",
+            "Launch baking soda and vinegar rockets on the playground",
+        ]
+        candidates = lsh_candidates([hasher.signature(shingles(text)) for text in texts])
+        self.assertIn((0, 1), candidates)
+        self.assertNotIn((0, 2), candidates)
+        self.assertNotIn((1, 2), candidates)
+
+class TestIncrementalDedup(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'activities.db')
+        self.patcher = mock.patch.object(activity_db, 'DB_PATH', self.db_path)
+        self.patcher.start()
+        migrate()
+        activity_db.executemany("INSERT INTO activities (title, to_do) VALUES (?, 0)",
+                                [("Paper kites",), ("Salt dough",), ("Bottle rockets",)])
+        self.vectorize = lambda texts: [[len(text), 1.0] for text in texts]
+
+    def tearDown(self):
+        activity_db.get_pool(self.db_path).close()
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def titles(self, ids):
+        return {row[0]: row[1] for row in activity_db.fetch_all('SELECT id, title FROM activities') if row[0] in ids}
+
+    def test_only_edited_rows_are_dirty(self):
+        dirty = dirty_activity_ids('test', 'kind')
+        self.assertEqual(dirty, [1, 2, 3])
+        self.assertEqual(refresh_vectors('kind', self.titles(dirty), self.vectorize), [1, 2, 3])
+        set_watermark('test', current_change_seq())
+        self.assertEqual(dirty_activity_ids('test', 'kind'), [])
+
+        activity_db.execute("UPDATE activities SET to_do = 1 WHERE id = 1")
+        activity_db.execute("UPDATE activities SET title = 'Salt dough ornaments' WHERE id = 2")
+        activity_db.execute("INSERT INTO activities (title) VALUES ('Paper kites')")
+        dirty = dirty_activity_ids('test', 'kind')
+        self.assertEqual(dirty, [2, 4])
+        # Another consumer has its own watermark and still sees everything
+        self.assertEqual(dirty_activity_ids('other', 'kind'), [1, 2, 3, 4])
+
+        self.assertEqual(refresh_vectors('kind', self.titles(dirty), self.vectorize), [2, 4])
+        activity_db.execute("DELETE FROM activities WHERE id = 3")
+        ids, vectors = load_vectors('kind')
+        self.assertEqual(ids, [1, 2, 4])
+        self.assertEqual(vectors.shape, (3, 2))
+
+class FakeChatClient:
+    """Stands in for the OpenAI client, answering with the queued contents in turn."""
+
+    def __init__(self, contents):
+        self.contents = list(contents)
+        self.chat = self.completions = self
+
+    def create(self, **kwargs):
+        message = mock.Mock(content=self.contents.pop(0))
+        return mock.Mock(choices=[mock.Mock(message=message)])
+
+class TestLLMAdjudicator(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = LLMCache(os.path.join(self.tmp_dir.name, 'llm_cache.db'))
+        self.patcher = mock.patch('llm_cache.get_llm_cache', return_value=self.cache)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.cache.pool.close()
+        self.tmp_dir.cleanup()
+
+    def test_unusable_answer_is_asked_again(self):
+        client = FakeChatClient(['["Duplicate"]', '["Duplicate", "Unique"]'])
+        activity = {'title': 'Kites', 'description': 'Fly kites', 'supplies': 'Paper'}
+        pairs = [(activity, activity), (activity, dict(activity, title='Boats'))]
+        self.assertEqual(LLMAdjudicator(client).adjudicate(pairs), ['ambiguous', 'ambiguous'])
+        self.assertEqual(LLMAdjudicator(client).adjudicate(pairs), ['duplicate', 'unique'])
+        # The good answer is cached
+        self.assertEqual(LLMAdjudicator(client).adjudicate(pairs), ['duplicate', 'unique'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from embedding_cache import EmbeddingCache
+from embeddings import EmbeddingClient, FakeEmbeddingBackend
+
+class FlakyBackend(FakeEmbeddingBackend):
+    """Fails with a rate-limit error the first few times it is called."""
+
+    def __init__(self, failures):
+        super().__init__(dimension=8)
+        self.failures = failures
+
+    def embed_batch(self, texts):
+        if self.failures:
+            self.failures -= 1
+            error = Exception('rate limited')
+            error.status_code = 429
+            raise error
+        return super().embed_batch(texts)
+
+class TestEmbeddingClient(unittest.TestCase):
+    def test_batches_preserve_order(self):
+        backend = FakeEmbeddingBackend(dimension=16)
+        client = EmbeddingClient(backend, max_inputs_per_request=10)
+        texts = [f"activity number {i}" for i in range(95)]
+
+        embeddings = client.embed_many(texts)
+
+        self.assertEqual(backend.requests, 10)
+        self.assertEqual(embeddings, [backend._embed(text) for text in texts])
+
+    def test_token_limit_splits_batches(self):
+        client = EmbeddingClient(FakeEmbeddingBackend(dimension=8), max_tokens_per_request=100)
+        texts = ["glue stick " * 20 for _ in range(10)]
+        batches = client._make_batches(texts)
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(sum(len(batch) for batch in batches), len(texts))
+        for batch in batches:
+            self.assertLessEqual(sum(client.tokens.count(text) for _, text in batch), 100)
+
+    def test_similar_texts_are_close(self):
+        backend = FakeEmbeddingBackend(dimension=256)
+        paint, paint_again, rocket = backend.embed_batch(
+            ["finger paint rainbow", "rainbow finger paint art", "baking soda rocket launch"])
+        dot = lambda a, b: sum(x * y for x, y in zip(a, b))
+        self.assertGreater(dot(paint, paint_again), dot(paint, rocket))
+
+    def test_retries_rate_limits(self):
+        backend = FlakyBackend(failures=2)
+        client = EmbeddingClient(backend, base_delay=0)
+        self.assertEqual(len(client.embed("pipe cleaner spiders")), 8)
+
+    def test_gives_up_on_non_retryable_errors(self):
+        class BrokenBackend(FakeEmbeddingBackend):
+            def embed_batch(self, texts):
+                raise ValueError("bad request")
+
+        client = EmbeddingClient(BrokenBackend(dimension=8), base_delay=0)
+        with self.assertRaises(ValueError):
+            client.embed("anything")
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cached_texts_skip_the_backend(self):
+        backend = FakeEmbeddingBackend(dimension=8)
+        client = EmbeddingClient(backend, cache=EmbeddingCache(self.cache_path))
+
+        first = client.embed_many(["paper plate masks", "slime", "slime"])
+        self.assertEqual(backend.requests, 1)
+
+        second = client.embed_many(["slime", "paper plate masks"])
+        self.assertEqual(backend.requests, 1)
+        for a, b in zip(second, [first[1], first[0]]):
+            self.assertEqual(len(a), len(b))
+            for x, y in zip(a, b):
+                self.assertAlmostEqual(x, y, places=6)
+
+    def test_model_is_part_of_the_key(self):
+        cache = EmbeddingCache(self.cache_path)
+        cache.put_many('model-a', ["kites"], [[1.0, 0.0]])
+        self.assertEqual(cache.get_many('model-a', ["kites"]), {"kites": [1.0, 0.0]})
+        self.assertEqual(cache.get_many('model-b', ["kites"]), {})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = EmbeddingCache(self.cache_path, max_entries=2, touch_interval=0)
+        cache.put_many('m', ["a"], [[1.0]])
+        cache.put_many('m', ["b"], [[2.0]])
+        cache.get_many('m', ["a"])
+        cache.put_many('m', ["c"], [[3.0]])
+        self.assertEqual(sorted(cache.get_many('m', ["a", "b", "c"])), ["a", "c"])
+
+    def test_recent_hits_are_not_rewritten(self):
+        cache = EmbeddingCache(self.cache_path)
+        cache.put_many('m', ["a"], [[1.0]])
+        with cache.pool.connection() as conn:
+            before = conn.execute('SELECT last_used FROM embedding_cache').fetchone()
+        self.assertEqual(cache.get_many('m', ["a"]), {"a": [1.0]})
+        with cache.pool.connection() as conn:
+            self.assertEqual(conn.execute('SELECT last_used FROM embedding_cache').fetchone(), before)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import activity_db
+from jobs import PartialBatchError, RateLimiter, failed_items, request_cancel, run_job
+from migrations import migrate
+
+class TestJobs(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'activities.db')
+        self.patcher = mock.patch.object(activity_db, 'DB_PATH', self.db_path)
+        self.patcher.start()
+        migrate()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        activity_db.get_pool(self.db_path).close()
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def process(self, broken):
+        def process(batch):
+            with self.lock:
+                self.calls.append(list(batch))
+            if any(item in broken for item in batch):
+                raise ValueError(f'broken {batch}')
+        return process
+
+    def test_retries_then_resumes_only_unfinished_items(self):
+        job = run_job('demo', range(10), self.process({7}), batch_size=3, workers=2, max_attempts=2, backoff=0)
+        self.assertEqual((job['status'], job['done'], job['failed']), ('failed', 7, 3))
+        # The failing batch was tried twice
+        self.assertEqual(self.calls.count([6, 7, 8]), 2)
+        self.assertEqual(sorted(key for key, _, _ in failed_items(job['id'])), ['6', '7', '8'])
+
+        self.calls = []
+        resumed = run_job('demo', range(10), self.process(set()), batch_size=3, backoff=0)
+        self.assertEqual(resumed['id'], job['id'])
+        self.assertEqual(self.calls, [[6, 7, 8]])
+        self.assertEqual((resumed['status'], resumed['done'], resumed['failed']), ('completed', 10, 0))
+
+        # A completed job is not resumed
+        self.calls = []
+        fresh = run_job('demo', range(2), self.process(set()), backoff=0)
+        self.assertNotEqual(fresh['id'], job['id'])
+        self.assertEqual(self.calls, [[0], [1]])
+
+    def test_partial_failures_retry_only_the_failed_items(self):
+        def process(batch):
+            self.calls.append(list(batch))
+            if 4 in batch or 5 in batch:
+                raise PartialBatchError([item for item in batch if item in (4, 5)], 'left out')
+        job = run_job('demo', range(6), process, batch_size=3, workers=1, max_attempts=2, backoff=0)
+        self.assertEqual((job['status'], job['done'], job['failed']), ('failed', 4, 2))
+        self.assertEqual(self.calls, [[0, 1, 2], [3, 4, 5], [4, 5]])
+        self.assertEqual(sorted(key for key, _, _ in failed_items(job['id'])), ['4', '5'])
+
+    def test_cancel_stops_submitting_batches(self):
+        def process(batch):
+            self.calls.append(batch)
+            request_cancel(1)
+        job = run_job('demo', range(5), process, workers=1, backoff=0)
+        self.assertEqual((job['status'], job['done']), ('cancelled', 1))
+        resumed = run_job('demo', range(5), self.process(set()), workers=1, backoff=0)
+        self.assertEqual((resumed['id'], resumed['status'], resumed['done']), (1, 'completed', 5))
+
+    def test_rate_limiter_spaces_calls_across_threads(self):
+        limiter = RateLimiter(per_minute=3000)
+        started = time.monotonic()
+        threads = [threading.Thread(target=limiter.acquire) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Six calls at one per 20 ms: the last one waits for five intervals
+        self.assertGreaterEqual(time.monotonic() - started, 0.095)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import json
+import unittest
+from json_stream import JSONArrayStreamParser, parse_json_objects
+
+ACTIVITIES = [
+    {"Activity Title": "Moon {Sand}", "Type": "Science", "Description": "Mix \"moon\" sand, then ]play[.",
+     "Supplies": ["Flour", "Baby oil"], "Instructions": ["Mix", "Mould"]},
+    {"Activity Title": "Rocket Relay", "Type": "Physical", "Description": "Relay race.",
+     "Supplies": [], "Instructions": ["Run"]},
+]
+
+class TestJSONArrayStreamParser(unittest.TestCase):
+    def test_objects_are_emitted_as_they_close(self):
+        text = "Here are your activities:\n" + json.dumps(ACTIVITIES, indent=2) + "\nEnjoy!"
+        parser = JSONArrayStreamParser()
+        emitted_at = []
+        for position, char in enumerate(text):
+            for activity in parser.feed(char):
+                emitted_at.append((position, activity))
+        self.assertEqual([activity for _, activity in emitted_at], ACTIVITIES)
+        # The first activity is available before the second one starts arriving
+        self.assertLess(emitted_at[0][0], text.index("Rocket"))
+        self.assertFalse(parser.truncated)
+
+    def test_truncated_response_keeps_complete_objects(self):
+        text = json.dumps(ACTIVITIES)
+        activities, parser = parse_json_objects(text[:text.index("Rocket") + 10])
+        self.assertEqual(activities, ACTIVITIES[:1])
+        self.assertTrue(parser.truncated)
+
+    def test_trailing_commas_are_tolerated(self):
+        activities, parser = parse_json_objects('[{"Type": "Art", "Supplies": ["Glue",],},]')
+        self.assertEqual(activities, [{"Type": "Art", "Supplies": ["Glue"]}])
+        self.assertEqual(parser.errors, [])
+
+    def test_no_array(self):
+        activities, parser = parse_json_objects("Sorry, I can't help with that.")
+        self.assertEqual(activities, [])
+        self.assertFalse(parser.started)
+
+if __name__ == '__main__':
+    unittest.main()
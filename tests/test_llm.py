@@ -0,0 +1,148 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from llm import AsyncGenerationEngine
+from llm_cache import LLMCache
+
+MODELS = {
+    "Claude 4.5 Haiku": {"id": "claude-haiku-4-5", "provider": "anthropic", "max_tokens": 100, "description": ""},
+    "GPT-5-nano": {"id": "gpt-5-nano", "provider": "openai", "max_tokens": 100, "description": ""},
+}
+
+class RateLimitError(Exception):
+    def __init__(self, retry_after):
+        super().__init__('rate limited')
+        self.status_code = 429
+        self.response = SimpleNamespace(headers={'retry-after': str(retry_after)})
+
+class FakeAnthropic:
+    def __init__(self, delay, failures=0, stop_reason='end_turn'):
+        self.delay = delay
+        self.failures = failures
+        self.stop_reason = stop_reason
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.messages = self
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures:
+                self.failures -= 1
+                raise RateLimitError(0.05)
+            return SimpleNamespace(content=[SimpleNamespace(text=f"anthropic:{kwargs['messages'][0]['content']}")],
+                                   stop_reason=self.stop_reason)
+        finally:
+            self.active -= 1
+
+class FakeOpenAI:
+    def __init__(self, delay, finish_reason='stop'):
+        self.delay = delay
+        self.finish_reason = finish_reason
+        self.kwargs = None
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        self.kwargs = kwargs
+        await asyncio.sleep(self.delay)
+        if kwargs.get('stream'):
+            return self._chunks(kwargs['messages'][0]['content'])
+        message = SimpleNamespace(content=f"openai:{kwargs['messages'][0]['content']}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=self.finish_reason)])
+
+    async def _chunks(self, prompt):
+        for piece in ["open", "ai:", prompt]:
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None),
+                                                       finish_reason=self.finish_reason)])
+
+class TestAsyncGenerationEngine(unittest.TestCase):
+    def setUp(self):
+        self.engines = []
+
+    def tearDown(self):
+        for engine in self.engines:
+            engine.close()
+
+    def engine(self, **kwargs):
+        engine = AsyncGenerationEngine(models=MODELS, **kwargs)
+        self.engines.append(engine)
+        return engine
+
+    def test_fan_out_takes_the_slowest_call(self):
+        openai = FakeOpenAI(0.3)
+        engine = self.engine(clients={'anthropic': FakeAnthropic(0.2), 'openai': openai})
+        start = time.perf_counter()
+        results = engine.generate_many(list(MODELS), "space")
+        elapsed = time.perf_counter() - start
+        self.assertEqual(results, {"Claude 4.5 Haiku": "anthropic:space", "GPT-5-nano": "openai:space"})
+        self.assertLess(elapsed, 0.45)
+        # gpt-5-nano takes max_completion_tokens
+        self.assertIn('max_completion_tokens', openai.kwargs)
+
+    def test_provider_concurrency_limit(self):
+        anthropic = FakeAnthropic(0.05)
+        engine = self.engine(clients={'anthropic': anthropic}, concurrency={'anthropic': 2})
+        async def burst():
+            return await asyncio.gather(*(engine.complete("Claude 4.5 Haiku", str(i)) for i in range(6)))
+        self.assertEqual(len(engine._run(burst())), 6)
+        self.assertEqual(anthropic.max_active, 2)
+
+    def test_retries_honour_retry_after(self):
+        engine = self.engine(clients={'anthropic': FakeAnthropic(0, failures=2)}, base_delay=0)
+        start = time.perf_counter()
+        self.assertEqual(engine.generate("Claude 4.5 Haiku", "ocean"), "anthropic:ocean")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.1)
+
+    def test_errors_are_returned_per_model(self):
+        class Broken(FakeOpenAI):
+            async def create(self, **kwargs):
+                raise ValueError("bad request")
+        engine = self.engine(clients={'anthropic': FakeAnthropic(0), 'openai': Broken(0)})
+        results = engine.generate_many(list(MODELS), "farm")
+        self.assertEqual(results["Claude 4.5 Haiku"], "anthropic:farm")
+        self.assertIsInstance(results["GPT-5-nano"], ValueError)
+
+    def test_stream_yields_pieces(self):
+        engine = self.engine(clients={'openai': FakeOpenAI(0)})
+        self.assertEqual(list(engine.generate_stream("GPT-5-nano", "bugs")), ["open", "ai:", "bugs"])
+
+    def test_cache_answers_repeated_prompts(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            anthropic = FakeAnthropic(0.2)
+            cache = LLMCache(os.path.join(tmp_dir, 'llm_cache.db'))
+            engine = self.engine(clients={'anthropic': anthropic}, cache=cache)
+            engine.generate("Claude 4.5 Haiku", "dinosaurs")
+            start = time.perf_counter()
+            self.assertEqual(engine.generate("Claude 4.5 Haiku", "dinosaurs"), "anthropic:dinosaurs")
+            self.assertEqual(list(engine.generate_stream("Claude 4.5 Haiku", "dinosaurs")), ["anthropic:dinosaurs"])
+            self.assertLess(time.perf_counter() - start, 0.1)
+            self.assertEqual(anthropic.calls, 1)
+            engine.generate("Claude 4.5 Haiku", "dinosaurs", regenerate=True)
+            self.assertEqual(anthropic.calls, 2)
+
+    def test_truncated_responses_are_not_cached(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            anthropic = FakeAnthropic(0, stop_reason='max_tokens')
+            cache = LLMCache(os.path.join(tmp_dir, 'llm_cache.db'))
+            engine = self.engine(clients={'anthropic': anthropic, 'openai': FakeOpenAI(0, finish_reason='length')},
+                                 cache=cache)
+            engine.generate("Claude 4.5 Haiku", "volcanoes")
+            engine.generate("Claude 4.5 Haiku", "volcanoes")
+            self.assertEqual(anthropic.calls, 2)
+            list(engine.generate_stream("GPT-5-nano", "volcanoes"))
+            self.assertIsNone(cache.get(engine._cache_key(MODELS["GPT-5-nano"], "volcanoes", 0.7)))
+            engine.clients['openai'].finish_reason = 'stop'
+            list(engine.generate_stream("GPT-5-nano", "volcanoes"))
+            self.assertEqual(cache.get(engine._cache_key(MODELS["GPT-5-nano"], "volcanoes", 0.7)), "openai:volcanoes")
+
+if __name__ == '__main__':
+    unittest.main()
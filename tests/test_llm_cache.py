@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from llm_cache import LLMCache, cache_key, cached_completion
+
+class TestLLMCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = LLMCache(os.path.join(self.tmp_dir.name, 'llm_cache.db'), ttl=60, max_entries=2)
+        self.calls = 0
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def call(self):
+        self.calls += 1
+        return f"response {self.calls}"
+
+    def test_repeated_prompt_is_served_from_cache(self):
+        first = cached_completion("openai", "gpt-4o", "ocean theme", self.call, cache=self.cache)
+        second = cached_completion("openai", "gpt-4o", "ocean theme", self.call, cache=self.cache)
+        self.assertEqual((first, second, self.calls), ("response 1", "response 1", 1))
+
+    def test_regenerate_bypasses_and_refreshes(self):
+        cached_completion("openai", "gpt-4o", "ocean theme", self.call, cache=self.cache)
+        fresh = cached_completion("openai", "gpt-4o", "ocean theme", self.call, regenerate=True, cache=self.cache)
+        self.assertEqual(fresh, "response 2")
+        self.assertEqual(cached_completion("openai", "gpt-4o", "ocean theme", self.call, cache=self.cache), "response 2")
+
+    def test_rejected_responses_are_not_cached(self):
+        valid = lambda response: response != "response 1"
+        first = cached_completion("openai", "gpt-4o", "ocean theme", self.call, cache=self.cache, validate=valid)
+        second = cached_completion("openai", "gpt-4o", "ocean theme", self.call, cache=self.cache, validate=valid)
+        third = cached_completion("openai", "gpt-4o", "ocean theme", self.call, cache=self.cache, validate=valid)
+        self.assertEqual((first, second, third, self.calls), ("response 1", "response 2", "response 2", 2))
+        # A bad answer cached before the caller validated is asked for again
+        self.cache.put(cache_key("openai", "gpt-4o", "sea theme", 0.7), "openai", "gpt-4o", "response 1")
+        self.assertEqual(cached_completion("openai", "gpt-4o", "sea theme", self.call, cache=self.cache, validate=valid),
+                         "response 3")
+
+    def test_key_covers_model_and_temperature(self):
+        keys = {
+            cache_key("openai", "gpt-4o", "p", 0.7),
+            cache_key("openai", "gpt-4o-mini", "p", 0.7),
+            cache_key("openai", "gpt-4o", "p", 0),
+            cache_key("anthropic", "gpt-4o", "p", 0.7),
+        }
+        self.assertEqual(len(keys), 4)
+
+    def test_entries_expire_and_are_evicted(self):
+        self.cache.put("a", "openai", "m", "A")
+        with mock.patch('llm_cache.time.time', return_value=os.path.getmtime(self.tmp_dir.name) + 10 ** 6):
+            self.assertIsNone(self.cache.get("a"))
+        self.cache.put("b", "openai", "m", "B")
+        self.cache.put("c", "openai", "m", "C")
+        self.cache.get("b")
+        self.cache.put("d", "openai", "m", "D")
+        self.assertEqual([self.cache.get(key) for key in "bcd"], ["B", None, "D"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import activity_db
+from migrations import MIGRATIONS, migrate, schema_version
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'activities.db')
+        self.patcher = mock.patch.object(activity_db, 'DB_PATH', self.db_path)
+        self.patcher.start()
+        # The original schema, before columns were bolted on
+        activity_db.execute('''
+        CREATE TABLE activities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, type TEXT, description TEXT, supplies TEXT,
+            instructions TEXT, source TEXT
+        )
+        ''')
+        activity_db.execute("INSERT INTO activities (title, type) VALUES ('Paper kites', 'Craft')")
+
+    def tearDown(self):
+        activity_db.get_pool(self.db_path).close()
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_upgrades_legacy_database_once(self):
+        self.assertEqual(migrate(), [migration.__name__ for migration in MIGRATIONS])
+        self.assertEqual(schema_version(), len(MIGRATIONS))
+        self.assertEqual(migrate(), [])
+
+        columns = {row[1] for row in activity_db.fetch_all("PRAGMA table_info('activities')")}
+        self.assertTrue({'to_do', 'adaptations', 'related_ids', 'duplicate_status'} <= columns)
+        # Existing rows are searchable through the new FTS index
+        self.assertEqual(activity_db.fetch_all("SELECT rowid FROM activities_fts WHERE activities_fts MATCH 'kites'"),
+                         [(1,)])
+
+    def test_week_range_scan_uses_index(self):
+        migrate()
+        plan = ' '.join(row[3] for row in activity_db.fetch_all('''
+            EXPLAIN QUERY PLAN
+            SELECT a.title FROM activity_schedule s JOIN activities a ON a.id = s.activity_id
+            WHERE s.scheduled_date BETWEEN '2024-01-01' AND '2024-01-07'
+        '''))
+        self.assertIn('idx_activity_schedule_date', plan)
+        plan = ' '.join(row[3] for row in activity_db.fetch_all(
+            "EXPLAIN QUERY PLAN SELECT * FROM activities WHERE type = 'Craft'"))
+        self.assertIn('idx_activities_type', plan)
+
+if __name__ == '__main__':
+    unittest.main()
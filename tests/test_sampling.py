@@ -0,0 +1,44 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+import activity_db
+from sampling import ActivitySampler, fetch_sample
+
+class TestActivitySampler(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'activities.db')
+        self.patcher = mock.patch.object(activity_db, 'DB_PATH', self.db_path)
+        self.patcher.start()
+        activity_db.execute('CREATE TABLE activities (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, type TEXT)')
+        activity_db.executemany("INSERT INTO activities (title, type) VALUES (?, ?)",
+                                [(f"Art {i}", "Art") for i in range(5)] + [("Tag", "Group Game"), ("Blank", "")])
+
+    def tearDown(self):
+        activity_db.get_pool(self.db_path).close()
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_sample_per_type_and_fetch_in_one_query(self):
+        sampler = ActivitySampler()
+        sample = sampler.sample(per_type=2, rng=random.Random(3))
+        self.assertEqual(sorted(sample), ["Art", "Group Game"])
+        self.assertEqual(len(sample["Art"]), 2)
+        self.assertEqual(sample["Group Game"], [6])
+
+        rows = fetch_sample(sample)
+        self.assertEqual([row[0] for row in rows["Art"]], sample["Art"])
+        # Deleted rows drop out of a session's sample instead of failing
+        activity_db.execute("DELETE FROM activities WHERE id = 6")
+        self.assertEqual(fetch_sample(sample)["Group Game"], [])
+
+    def test_id_lists_reload_when_rows_change(self):
+        sampler = ActivitySampler()
+        self.assertEqual(len(sampler.ids_by_type()["Art"]), 5)
+        activity_db.execute("INSERT INTO activities (title, type) VALUES ('Puzzle box', 'Puzzle')")
+        self.assertEqual(sampler.ids_by_type()["Puzzle"], [8])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import activity_db
+from migrations import migrate
+from schedule import activity_exists, get_week_schedule, week_schedule_by_date
+
+class TestWeekSchedule(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'activities.db')
+        self.patcher = mock.patch.object(activity_db, 'DB_PATH', self.db_path)
+        self.patcher.start()
+        migrate()
+        activity_db.executemany("INSERT INTO activities (title, type, supplies) VALUES (?, ?, ?)",
+                                [('Paper kites', 'Craft', 'Paper, string'), ('Ocean slime', 'Science', 'Glue')])
+        activity_db.executemany("INSERT INTO activity_schedule (activity_id, scheduled_date) VALUES (?, ?)",
+                                [(2, '2024-01-04'), (1, '2024-01-01'), (1, '2024-01-08'), (3, '2024-01-02')])
+
+    def tearDown(self):
+        activity_db.get_pool(self.db_path).close()
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_week_rows_carry_full_activity(self):
+        rows = get_week_schedule('2024-01-01')
+        self.assertEqual([(row[0], row[1], row[2]) for row in rows],
+                         [(2, '2024-01-01', 1), (4, '2024-01-02', 3), (1, '2024-01-04', 2)])
+        self.assertEqual(rows[0][3][:5], (1, 'Paper kites', 'Craft', None, 'Paper, string'))
+        # A schedule entry whose activity was deleted comes back without details so it can be removed
+        self.assertIsNone(rows[1][3])
+
+        by_date = week_schedule_by_date('2024-01-01', ['2024-01-01', '2024-01-04'])
+        self.assertEqual({date: [entry[1] for entry in entries] for date, entries in by_date.items()},
+                         {'2024-01-01': [1], '2024-01-04': [2]})
+
+    def test_activity_exists(self):
+        self.assertTrue(activity_exists(2))
+        self.assertFalse(activity_exists(3))
+
+if __name__ == '__main__':
+    unittest.main()
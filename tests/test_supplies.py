@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import activity_db
+from migrations import migrate
+from supplies import (SupplyMatcher, SupplyMatcherCache, aggregate_supplies, forecast_csv, parse_supply_items,
+                      supplies_by_activity, supply_forecast)
+
+INVENTORY = [('Art', 'Glue'), ('Art', 'Washable markers'), ('Paper', 'Construction paper'),
+             ('Kitchen', 'Paper plates'), ('Science', 'Baking soda')]
+
+class TestSupplyMatcher(unittest.TestCase):
+    def test_exact_and_token_matches(self):
+        matcher = SupplyMatcher(INVENTORY)
+        self.assertEqual(matcher.match('Paper Plates'), 'Kitchen')
+        # Inventory item inside the supply, and the supply inside an inventory item
+        self.assertEqual(matcher.match('glue sticks'), 'Art')
+        self.assertEqual(matcher.match('markers'), 'Art')
+        # "construction paper" and "paper plates" score the same; the earlier inventory row wins
+        self.assertEqual(matcher.match('paper'), 'Paper')
+        # Sharing a word is not enough when neither side contains the other
+        self.assertEqual(matcher.match('paper towels'), 'Uncategorized')
+        self.assertEqual(matcher.match('yarn'), 'Uncategorized')
+
+    def test_parse_splits_on_every_separator(self):
+        self.assertEqual(parse_supply_items("Glue, paint (red, blue); 2 paper plates\n- Tape (1 roll)\n1. Yarn"),
+                         [('Glue', 'Glue', None), ('paint', 'paint (red, blue)', None),
+                          ('paper plates', '2 paper plates', '2'), ('Tape', 'Tape (1 roll)', '1 roll'),
+                          ('Yarn', 'Yarn', None)])
+        self.assertEqual(parse_supply_items(None), [])
+
+class TestActivitySupplies(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'activities.db')
+        self.patcher = mock.patch.object(activity_db, 'DB_PATH', self.db_path)
+        self.patcher.start()
+        migrate()
+        activity_db.executemany('INSERT INTO available_supplies (category, item) VALUES (?, ?)', INVENTORY)
+
+    def tearDown(self):
+        activity_db.get_pool(self.db_path).close()
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_rebuilt_only_when_inventory_changes(self):
+        cache = SupplyMatcherCache()
+        matcher = cache.matcher()
+        self.assertIs(cache.matcher(), matcher)
+        activity_db.execute("INSERT INTO available_supplies (category, item) VALUES ('Yarn', 'Yarn')")
+        self.assertIsNot(cache.matcher(), matcher)
+        self.assertEqual(cache.matcher().match('yarn balls'), 'Yarn')
+
+    def test_table_follows_activity_changes_and_aggregates(self):
+        activity_db.executemany("INSERT INTO activities (title, type, supplies) VALUES (?, ?, ?)",
+                                [('Masks', 'Craft', 'Paper plates, glue sticks'),
+                                 ('Volcano', 'Science', 'Baking soda, paper plate, yarn')])
+        activity_db.executemany("INSERT INTO activity_schedule (activity_id, scheduled_date) VALUES (?, ?)",
+                                [(1, '2024-01-01'), (2, '2024-01-02'), (1, '2024-01-09')])
+        categorized = aggregate_supplies('2024-01-01', '2024-01-07')
+        self.assertEqual(list(categorized), ['Art', 'Kitchen', 'Science', 'Uncategorized'])
+        self.assertEqual(categorized['Kitchen'][0]['count'], 2)
+        self.assertEqual(sorted(categorized['Kitchen'][0]['activities']), ['Masks', 'Volcano'])
+
+        activity_db.execute("UPDATE activities SET supplies = 'Yarn' WHERE id = 1")
+        activity_db.execute("DELETE FROM activities WHERE id = 2")
+        self.assertEqual(supplies_by_activity([1, 2]), {1: ['Yarn'], 2: []})
+        self.assertEqual(activity_db.fetch_all('SELECT activity_id, supply_key FROM activity_supplies'), [(1, 'yarn')])
+
+    def test_forecast_breaks_counts_down_by_week(self):
+        activity_db.executemany("INSERT INTO activities (title, type, supplies) VALUES (?, ?, ?)",
+                                [('Masks', 'Craft', 'Paper plates, glue'), ('Knitting', 'Craft', 'Yarn')])
+        activity_db.executemany("INSERT INTO activity_schedule (activity_id, scheduled_date) VALUES (?, ?)",
+                                [(1, '2024-01-03'), (1, '2024-01-05'), (2, '2024-01-15'), (1, '2024-02-01')])
+        weeks, forecast = supply_forecast('2024-01-03', '2024-01-21')
+        self.assertEqual(weeks, ['2024-01-01', '2024-01-08', '2024-01-15'])
+        self.assertEqual({category: [(item['original'], item['count'], item['weeks']) for item in items]
+                          for category, items in forecast.items()},
+                         {'Art': [('glue', 2, [2, 0, 0])], 'Kitchen': [('Paper plates', 2, [2, 0, 0])],
+                          'Uncategorized': [('Yarn', 1, [0, 0, 1])]})
+        self.assertEqual(forecast_csv(weeks, forecast).splitlines()[:2],
+                         ['Category,Supply,Total,Week of 2024-01-01,Week of 2024-01-08,Week of 2024-01-15',
+                          'Art,glue,2,2,0,0'])
+
+if __name__ == '__main__':
+    unittest.main()
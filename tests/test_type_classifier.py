@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import activity_db
+from migrations import migrate
+from type_classifier import TfidfFeatures, TypeClassifier, split_by_confidence, train_type_classifier
+
+class TestTypeClassifier(unittest.TestCase):
+    def test_nearest_centroid_with_margins(self):
+        classifier = TypeClassifier(TfidfFeatures()).fit(
+            ['Paint a sunset with watercolor paint', 'Finger paint with bright paint colors',
+             'Bake cookies and measure the flour', 'Mix flour and bake banana bread'],
+            ['Art', 'Art', 'Cooking', 'Cooking'])
+        (paint, paint_margin), (bake, _), (unknown, unknown_margin) = classifier.predict(
+            ['Paint a rainbow', 'Bake muffins with flour', 'Sing a song'])
+        self.assertEqual((paint, bake), ('Art', 'Cooking'))
+        self.assertGreater(paint_margin, 0.5)
+        # Nothing in the vocabulary: a tie, which is never confident
+        self.assertEqual(unknown_margin, 0.0)
+        self.assertEqual(classifier.predict([]), [])
+
+    def test_leave_one_out_scores_leave_each_row_out_of_its_centroid(self):
+        texts = ['paint with a brush', 'paint a brush picture', 'bake bread']
+        classifier = TypeClassifier(TfidfFeatures(min_df=1)).fit(texts, ['Art', 'Art', 'Cooking'],
+                                                                 prototypes={'Cooking': ['bake muffins']})
+        cooking = classifier.labels.index('Cooking')
+        scores = classifier.leave_one_out_scores()
+        self.assertEqual(scores.shape, (3, 2))
+        # Without itself the Cooking centroid is just the prototype, which shares one word with the row
+        self.assertLess(scores[2, cooking], classifier.scores(texts)[2, cooking])
+        self.assertGreater(scores[2, cooking], 0)
+        self.assertEqual([label for label, _ in classifier.rank(scores)], ['Art', 'Art', 'Cooking'])
+
+    def test_split_by_confidence(self):
+        decided, uncertain = split_by_confidence([(1, ('Art', 0.3)), (2, ('Craft', 0.01)), (3, ('Science', 0.05))],
+                                                 margin=0.05)
+        self.assertEqual(decided, {1: 'Art', 3: 'Science'})
+        self.assertEqual(uncertain, [2])
+
+class TestTrainTypeClassifier(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'activities.db')
+        self.patcher = mock.patch.object(activity_db, 'DB_PATH', self.db_path)
+        self.patcher.start()
+        migrate()
+
+    def tearDown(self):
+        activity_db.get_pool(self.db_path).close()
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_prototypes_stand_in_for_missing_labels(self):
+        activity_db.executemany("INSERT INTO activities (title, type, description) VALUES (?, ?, ?)",
+                                [('Relay race', 'Physical', 'Run a relay race outside'),
+                                 ('Obstacle course', 'Physical', 'Race through an obstacle course'),
+                                 ('Volcano', 'Science', 'Run an experiment with baking soda')])
+        classifier = train_type_classifier(['Physical', 'Field Trip'], prototypes={
+            'Field Trip': ['Visit the zoo and see the animals', 'Bus trip to the zoo']})
+        self.assertEqual(classifier.labels, ['Field Trip', 'Physical'])
+        predictions = classifier.predict(['Trip to the zoo', 'Jump rope race'])
+        self.assertEqual([label for label, _ in predictions], ['Field Trip', 'Physical'])
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from vector_index import LocalVectorStore, VectorStore, matches_filter
+
+class TestLocalVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'activities.vectors')
+        self.store = LocalVectorStore(self.path)
+        self.store.upsert([
+            {"id": "1", "values": [1.0, 0.0, 0.0], "metadata": {"type": "Art", "to_do": True}},
+            {"id": "2", "values": [0.9, 0.1, 0.0], "metadata": {"type": "Craft", "to_do": False}},
+            {"id": "3", "values": [0.0, 1.0, 0.0], "metadata": {"type": "Art", "to_do": False}},
+        ])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_query_orders_by_cosine_similarity(self):
+        results = self.store.query([1.0, 0.0, 0.0], top_k=2)
+        self.assertEqual([result['id'] for result in results], ["1", "2"])
+        self.assertAlmostEqual(results[0]['score'], 1.0, places=5)
+
+    def test_metadata_filter(self):
+        results = self.store.query([1.0, 0.0, 0.0], top_k=5, filter={"type": "Art"})
+        self.assertEqual([result['id'] for result in results], ["1", "3"])
+        results = self.store.query([1.0, 0.0, 0.0], top_k=5, filter={"to_do": True, "type": {"$in": ["Art", "Craft"]}})
+        self.assertEqual([result['id'] for result in results], ["1"])
+
+    def test_upsert_replaces_existing_vector(self):
+        self.store.upsert([{"id": "3", "values": [1.0, 0.0, 0.0], "metadata": {"type": "Science"}}])
+        self.assertEqual(len(self.store), 3)
+        results = self.store.query([1.0, 0.0, 0.0], top_k=1, filter={"type": "Science"})
+        self.assertEqual(results[0]['id'], "3")
+
+    def test_query_by_group_matches_per_type_queries(self):
+        grouped = self.store.query_by_group([1.0, 0.0, 0.0], 'type', ['Art', 'Craft', 'Puzzle'], top_k=1)
+        self.assertEqual([match['id'] for match in grouped['Art']], ["1"])
+        self.assertEqual([match['id'] for match in grouped['Craft']], ["2"])
+        self.assertEqual(grouped['Puzzle'], [])
+        fallback = VectorStore.query_by_group(self.store, [1.0, 0.0, 0.0], 'type', ['Art', 'Craft', 'Puzzle'], top_k=1)
+        self.assertEqual(fallback, grouped)
+
+    def test_delete_and_reload_from_disk(self):
+        self.store.delete(["1"])
+        reloaded = LocalVectorStore(self.path)
+        self.assertEqual(len(reloaded), 2)
+        self.assertEqual(reloaded.query([1.0, 0.0, 0.0], top_k=1)[0]['id'], "2")
+
+    def test_writers_sharing_the_files_keep_each_others_vectors(self):
+        other = LocalVectorStore(self.path)
+        self.assertEqual(len(other), 3)
+        self.store.upsert([{"id": "4", "values": [0.0, 0.0, 1.0], "metadata": {}}])
+        other.upsert([{"id": "5", "values": [0.0, 1.0, 1.0], "metadata": {}}])
+        self.store.update_metadata({"5": {"type": "Science"}})
+        self.assertEqual(sorted(LocalVectorStore(self.path).list_ids()), ["1", "2", "3", "4", "5"])
+        self.assertEqual(other.query([0.0, 1.0, 1.0], top_k=1)[0]['metadata'], {"type": "Science"})
+
+    def test_batch_saves_once_and_failed_batches_are_dropped(self):
+        with mock.patch.object(LocalVectorStore, '_save', autospec=True, side_effect=LocalVectorStore._save) as save:
+            with self.store.batch():
+                self.store.upsert([{"id": "4", "values": [0.0, 0.0, 1.0], "metadata": {}}])
+                self.store.delete(["1"])
+            self.assertEqual(save.call_count, 1)
+        with self.assertRaises(RuntimeError):
+            with self.store.batch():
+                self.store.delete(["2"])
+                raise RuntimeError("embedding failed")
+        self.assertEqual(sorted(self.store.list_ids()), ["2", "3", "4"])
+
+    def test_matches_filter_operators(self):
+        self.assertTrue(matches_filter({"type": "Art"}, None))
+        self.assertTrue(matches_filter({"type": "Art"}, {"type": {"$ne": "Craft"}}))
+        self.assertFalse(matches_filter({"type": "Art"}, {"type": {"$nin": ["Art"]}}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import activity_db
+from embeddings import EmbeddingClient, FakeEmbeddingBackend
+from migrations import migrate
+from vector_index import LocalVectorStore
+from vector_sync import (VECTOR_SYNC_MAX_ATTEMPTS, drain_outbox, parked_entries, pending_count,
+                         reconcile, retry_parked)
+
+class BrokenStore(LocalVectorStore):
+    def upsert(self, vectors):
+        raise ConnectionError("index unavailable")
+
+class RejectingStore(LocalVectorStore):
+    def upsert(self, vectors):
+        if any(vector["id"] == "2" for vector in vectors):
+            raise ValueError("metadata rejected")
+        super().upsert(vectors)
+
+class CountingBackend(FakeEmbeddingBackend):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.texts = []
+
+    def embed_batch(self, texts):
+        self.texts.extend(texts)
+        return super().embed_batch(texts)
+
+class TestVectorOutbox(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'activities.db')
+        self.patcher = mock.patch.object(activity_db, 'DB_PATH', self.db_path)
+        self.patcher.start()
+        activity_db.execute('''
+        CREATE TABLE activities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, type TEXT, description TEXT, supplies TEXT,
+            instructions TEXT, to_do BOOLEAN
+        )
+        ''')
+        migrate()
+        activity_db.executemany("INSERT INTO activities (title, type, to_do) VALUES (?, 'Craft', 1)",
+                                [("Paper kites",), ("Salt dough",), ("Bottle rockets",)])
+        self.embedding_client = EmbeddingClient(FakeEmbeddingBackend(dimension=8))
+        self.vector_path = os.path.join(self.tmp_dir.name, 'activities.vectors')
+        self.store = LocalVectorStore(self.vector_path)
+
+    def tearDown(self):
+        activity_db.get_pool(self.db_path).close()
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_mutations_are_queued_and_drained(self):
+        self.assertEqual(pending_count(), 3)
+        self.assertEqual(drain_outbox(self.store, self.embedding_client), 3)
+        self.assertEqual(sorted(self.store.list_ids()), ["1", "2", "3"])
+
+        activity_db.execute("UPDATE activities SET type = 'Art' WHERE id = 1")
+        activity_db.execute("DELETE FROM activities WHERE id = 2")
+        self.assertEqual(pending_count(), 2)
+        drain_outbox(self.store, self.embedding_client)
+        self.assertEqual(sorted(self.store.list_ids()), ["1", "3"])
+        self.assertEqual(self.store.query([1.0] * 8, top_k=5, filter={"type": "Art"})[0]['id'], "1")
+        self.assertEqual(pending_count(), 0)
+
+    def test_metadata_only_edits_skip_embedding(self):
+        backend = CountingBackend(dimension=8)
+        client = EmbeddingClient(backend)
+        drain_outbox(self.store, client)
+        self.assertEqual(len(backend.texts), 3)
+
+        activity_db.execute("UPDATE activities SET to_do = 0, type = 'Art' WHERE id = 1")
+        drain_outbox(self.store, client)
+        self.assertEqual(len(backend.texts), 3)
+        self.assertEqual(self.store.query([1.0] * 8, top_k=5, filter={"to_do": False})[0]['metadata'],
+                         {"type": "Art", "to_do": False})
+
+        activity_db.execute("UPDATE activities SET title = 'Box kites' WHERE id = 1")
+        drain_outbox(self.store, client)
+        self.assertEqual(len(backend.texts), 4)
+        self.assertIn("Box kites", backend.texts[-1])
+
+    def test_failed_drain_keeps_entries_queued(self):
+        with self.assertRaises(ConnectionError):
+            drain_outbox(BrokenStore(self.vector_path), self.embedding_client)
+        self.assertEqual(activity_db.fetch_all("SELECT attempts FROM vector_outbox"), [(1,), (1,), (1,)])
+        self.assertEqual(drain_outbox(self.store, self.embedding_client), 3)
+
+    def test_bad_entry_is_parked_without_blocking_the_rest(self):
+        store = RejectingStore(self.vector_path)
+        with self.assertRaises(ValueError):
+            drain_outbox(store, self.embedding_client)
+        self.assertEqual(sorted(store.list_ids()), ["1", "3"])
+        for _ in range(VECTOR_SYNC_MAX_ATTEMPTS):
+            try:
+                drain_outbox(store, self.embedding_client)
+            except ValueError:
+                pass
+        self.assertEqual(pending_count(), 0)
+        self.assertEqual([(activity_id, attempts) for activity_id, _, attempts, _ in parked_entries()],
+                         [(2, VECTOR_SYNC_MAX_ATTEMPTS)])
+        # Parked entries no longer hold up new changes
+        activity_db.execute("UPDATE activities SET title = 'Kites' WHERE id = 1")
+        self.assertEqual(drain_outbox(store, self.embedding_client), 1)
+        self.assertEqual(retry_parked(), 1)
+        self.assertEqual(pending_count(), 1)
+
+    def test_reconcile_repairs_both_directions(self):
+        activity_db.execute("DELETE FROM vector_outbox")
+        self.store.upsert([{"id": "2", "values": [1.0] * 8}, {"id": "99", "values": [1.0] * 8}])
+        self.assertEqual(reconcile(self.store, self.embedding_client, dry_run=True), (["1", "3"], ["99"]))
+        reconcile(self.store, self.embedding_client)
+        self.assertEqual(sorted(self.store.list_ids()), ["1", "2", "3"])
+
+if __name__ == '__main__':
+    unittest.main()